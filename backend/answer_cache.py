@@ -0,0 +1,148 @@
+# 답변 캐시
+# CPU 생성은 답변 하나에 수 초가 걸리고, 같은 설명서에 같은 질문이 반복되므로
+# (컬렉션, 코퍼스 버전, 요청 종류, 문맥 청크 ID, 생성 파라미터, 정규화 질의)가 같으면 저장된 답변을 바로 돌려준다.
+# - 컬렉션의 코퍼스가 바뀌면(업로드/삭제) 버전이 달라져 그 컬렉션의 이전 답변은 모두 버린다
+# - TTL이 지난 항목과 max_entries를 넘는 오래된 항목(LRU)은 삭제
+# - similarity_threshold를 주면 문맥 청크와 파라미터가 같고 질의 임베딩의
+#   코사인 유사도가 임계값 이상인 비슷한 질문도 적중으로 본다
+
+import json
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from embedding_cache import normalize_text
+
+
+class AnswerCache:
+    """
+    생성 답변 LRU + TTL 캐시
+
+    Args:
+        max_entries: 최대 항목 수
+        ttl: 항목 유효 시간(초)
+        similarity_threshold: 비슷한 질문 적중 기준 코사인 유사도 (None이면 정확히 같은 질문만)
+    """
+
+    def __init__(self, max_entries=1000, ttl=3600.0, similarity_threshold=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (그룹 키, 정규화 질의) -> 항목
+        self.groups = {}              # 그룹 키 -> 그 그룹의 항목 키 집합 (비슷한 질문 탐색용)
+        self.versions = {}            # 컬렉션 -> 현재 항목들을 만든 코퍼스 버전
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _group_key(collection, kind, chunk_ids, params):
+        return (collection, kind, tuple(int(i) for i in chunk_ids), json.dumps(params, sort_keys=True, ensure_ascii=False))
+
+    @staticmethod
+    def _unit(embedding):
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype='float32').ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _check_version(self, collection, version):
+        """컬렉션의 코퍼스가 바뀌었으면 그 컬렉션 항목만 삭제 (lock 안에서 호출)"""
+        if version != self.versions.get(collection, version):
+            stale = [key for key in self.entries if key[0][0] == collection]
+            if stale:
+                self.invalidations += 1
+            for key in stale:
+                self._remove(key)
+        self.versions[collection] = version
+
+    def _remove(self, key):
+        self.entries.pop(key, None)
+        members = self.groups.get(key[0])
+        if members is not None:
+            members.discard(key)
+            if not members:
+                del self.groups[key[0]]
+
+    def _expired(self, entry, now):
+        return self.ttl is not None and now - entry['created'] > self.ttl
+
+    def get(self, collection, version, kind, query, chunk_ids, params, embedding=None):
+        """
+        저장된 답변 조회
+
+        Returns:
+            None 또는 {'answer', 'sources', 'similarity'} (정확히 같은 질문이면 similarity 1.0)
+        """
+        group = self._group_key(collection, kind, chunk_ids, params)
+        key = (group, normalize_text(query))
+        now = time.time()
+        with self.lock:
+            self._check_version(collection, version)
+            entry = self.entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return {'answer': entry['answer'], 'sources': entry['sources'], 'similarity': 1.0}
+
+            unit = self._unit(embedding)
+            if self.similarity_threshold is not None and unit is not None:
+                best_key, best_sim = None, self.similarity_threshold
+                for other_key in list(self.groups.get(group, ())):
+                    other = self.entries[other_key]
+                    if self._expired(other, now):
+                        self._remove(other_key)
+                        continue
+                    if other['embedding'] is None:
+                        continue
+                    sim = float(np.dot(unit, other['embedding']))
+                    if sim >= best_sim:
+                        best_key, best_sim = other_key, sim
+                if best_key is not None:
+                    self.entries.move_to_end(best_key)
+                    self.similar_hits += 1
+                    entry = self.entries[best_key]
+                    return {'answer': entry['answer'], 'sources': entry['sources'], 'similarity': best_sim}
+
+            self.misses += 1
+            return None
+
+    def put(self, collection, version, kind, query, chunk_ids, params, answer, sources, embedding=None):
+        group = self._group_key(collection, kind, chunk_ids, params)
+        key = (group, normalize_text(query))
+        with self.lock:
+            # 생성하는 동안 코퍼스가 바뀌었으면 (이미 새 버전으로 조회됨) 저장하지 않는다
+            if self.versions.get(collection, version) != version:
+                return
+            self._check_version(collection, version)
+            self.entries[key] = {
+                'answer': answer,
+                'sources': sources,
+                'embedding': self._unit(embedding),
+                'created': time.time()
+            }
+            self.entries.move_to_end(key)
+            self.groups.setdefault(group, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.similar_hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'similarity_threshold': self.similarity_threshold,
+                'hits': self.hits,
+                'similar_hits': self.similar_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.similar_hits) / total if total else 0.0,
+                'invalidations': self.invalidations
+            }
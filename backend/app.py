@@ -1,17 +1,41 @@
 # app_hf.py
 from fastapi import FastAPI, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from sentence_transformers import SentenceTransformer
+from typing import Optional
+from sentence_transformers import CrossEncoder
 from llama_cpp import Llama
 import faiss
-import numpy as np
 import pickle
 import os
+import json
+import asyncio
+import hashlib
 import shutil
+import threading
+from contextlib import asynccontextmanager
+from functools import partial
 from dotenv import load_dotenv
 import uvicorn
 import rag_pipeline
+import prompts
+import context_packer
+from index_manager import IndexManager
+from collection_registry import CollectionRegistry, DEFAULT_COLLECTION, validate_name
+from extraction_cache import ExtractionCache, save_upload
+from embedding_cache import EmbeddingCache
+from embedding_backend import load_embedding_model, backend_model_name
+from query_encoder import QueryEncoder, QueryEncoderTimeout
+from reranker import Reranker
+from ingest_jobs import JobManager
+from ingest_pipeline import pipeline, batched, DocumentSpool
+from llm_streaming import stream_answer, stream_cached_answer
+from llm_scheduler import LLMScheduler, SchedulerBusy
+from llm_prefix_cache import PromptPrefixCache
+from answer_cache import AnswerCache
+from startup_status import StartupStatus
 from app_tripprep import router as tripprep_router
 
 # 프로젝트 루트 경로 설정
@@ -22,7 +46,15 @@ PROJECT_ROOT = os.path.dirname(BASE_DIR)
 load_dotenv(os.path.join(BASE_DIR, '.env'))
 load_dotenv(os.path.join(PROJECT_ROOT, '.env'))
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # PDF 추출 프로세스(spawn)는 이 모듈을 다시 import하므로, 파일 정리는 import 시점이 아니라 여기서 한다
+    shutil.rmtree(INGEST_SPOOL_DIR, ignore_errors=True)
+    # 모델은 백그라운드에서 로드하고 서버는 바로 요청을 받는다 (/ready로 준비 상태 확인)
+    start_background_initialization()
+    yield
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -34,79 +66,104 @@ app.add_middleware(
 # TripPrep 라우터 추가
 app.include_router(tripprep_router)
 
+EMBEDDING_MODEL_NAME = 'jhgan/ko-sroberta-multitask'
+# 모델 리비전 (임베딩 캐시 키에 포함되므로 바꾸면 캐시가 자동으로 분리됨)
+EMBEDDING_MODEL_REVISION = os.getenv('RAG_EMBEDDING_MODEL_REVISION', 'main')
+# 임베딩 백엔드: torch (fp32) / int8 (동적 양자화) / onnx (ONNX Runtime)
+EMBEDDING_BACKEND = os.getenv('RAG_EMBEDDING_BACKEND', 'torch')
+# 캐시 키용 모델 이름 (백엔드마다 벡터가 조금씩 다르므로 캐시를 나눈다)
+EMBEDDING_MODEL_KEY = backend_model_name(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND)
+
 # 전역 변수
 embedding_model = None
-llm_model = None
-index = None
-chunks = []
-current_pdf_text = ""
-
-def initialize_models():
-    global embedding_model, llm_model, index, chunks, current_pdf_text
-    
-    print("=" * 60)
-    print("모델 로딩 중...")
-    print("=" * 60)
-
-    # 1. 검색용 임베딩 모델
-    print("1/3 임베딩 모델 로딩...")
-    embedding_model = SentenceTransformer('jhgan/ko-sroberta-multitask')
-
-    # 2. 초기 데이터 로딩 (기존 데이터가 있다면)
-    print("2/3 초기 데이터 로딩...")
-    data_dir = os.path.join(PROJECT_ROOT, 'data')
-    index_path = os.path.join(data_dir, 'washing_machine.index')
-    chunks_path = os.path.join(data_dir, 'chunks.pkl')
-    text_path = os.path.join(data_dir, 'extracted_text_pdfplumber.txt')
-
-    if os.path.exists(index_path) and os.path.exists(chunks_path):
-        try:
-            index = faiss.read_index(index_path)
-            with open(chunks_path, 'rb') as f:
-                chunks = pickle.load(f)
-            if os.path.exists(text_path):
-                with open(text_path, 'r', encoding='utf-8') as f:
-                    current_pdf_text = f.read()
-            print(f"✅ 초기 데이터 로드 완료: {len(chunks)} chunks")
-        except Exception as e:
-            print(f"⚠️ 초기 데이터 로드 실패: {e}")
-            index = None
-            chunks = []
-
-    # 3. 답변 생성용 LLM (llama.cpp)
-    print("3/3 LLM 모델 로딩...")
-    model_path = os.path.join(data_dir, 'models', 'downloaded_models', 'A.X-4.0-Light-Q4_K_M.gguf')
-
-    if not os.path.exists(model_path):
-        print(f"⚠️  모델 파일이 없습니다: {model_path}")
-        llm_model = None
-    else:
-        llm_model = Llama(
-            model_path=model_path,
-            n_ctx=2048,
-            n_threads=4,
-            n_gpu_layers=0,
-            verbose=False
-        )
-        print(f"✅ 모델 로드 완료: A.X-4.0-Light")
-
-    print("=" * 60)
-    print("✅ 모든 모델 로딩 완료!")
-    print("=" * 60)
+query_encoder = None  # 질의 임베딩 LRU 캐시 + 동시 질의 배치 인코딩
+chunk_encoder = None  # 청크 임베딩용 토큰 길이 순 배치 인코더
+llm_scheduler = None  # LLM 컨텍스트 풀 + 요청 대기열 (모델이 없으면 None)
+llm_tokenizer = None  # 문맥 토큰 예산 계산용 (어휘만 로드한 Llama)
+LLM_N_CTX = 2048
+# 고정 지시문(프롬프트 접두어)의 KV 상태 재사용 (RAG_LLM_PREFIX_CACHE=0이면 끔)
+prefix_cache = PromptPrefixCache(prompts.PROMPT_PREFIXES) if os.getenv('RAG_LLM_PREFIX_CACHE', '1') != '0' else None
+# 인덱스 종류: flat / ivf_flat / ivf_pq / hnsw (기본값 flat = 전수 탐색)
+INDEX_TYPE = os.getenv('RAG_INDEX_TYPE', 'flat')
+# 기본 검색 방식: dense / sparse / hybrid (BM25 + 임베딩 RRF)
+RETRIEVAL_MODE = os.getenv('RAG_RETRIEVAL_MODE', 'hybrid')
+# cross-encoder 재정렬 (모델 이름을 설정하면 켜짐, 예: cross-encoder/mmarco-mMiniLMv2-L12-H384-v1)
+RERANK_MODEL_NAME = os.getenv('RAG_RERANK_MODEL', '')
+RERANK_CANDIDATES = int(os.getenv('RAG_RERANK_CANDIDATES', '20'))  # 재정렬할 1차 검색 후보 수
+reranker = None
+# PDF 추출 프로세스 수 (0 또는 미설정이면 CPU 수)
+PDF_WORKERS = int(os.getenv('RAG_PDF_WORKERS', '0')) or None
+# 이름 있는 코퍼스 컬렉션 (컬렉션마다 문서 단위 증분 인덱스, 최근에 쓴 컬렉션만 메모리에 유지)
+collections = CollectionRegistry(
+    os.path.join(PROJECT_ROOT, 'data', 'collections'),
+    os.path.join(PROJECT_ROOT, 'data', 'corpus'),
+    index_type=INDEX_TYPE,
+    max_loaded=int(os.getenv('RAG_MAX_LOADED_COLLECTIONS', '4')),
+    max_bytes=int(os.getenv('RAG_COLLECTION_MEMORY_MB')) * 1024 * 1024 if os.getenv('RAG_COLLECTION_MEMORY_MB') else None
+)
+# 업로드 내용(SHA-256) 기준 추출/청킹/임베딩 결과 캐시
+extraction_cache = ExtractionCache(
+    os.path.join(PROJECT_ROOT, 'data', 'extraction_cache'),
+    max_bytes=int(os.getenv('RAG_EXTRACTION_CACHE_MB', '2048')) * 1024 * 1024
+)
+# 문서 수집 작업자 풀 (코퍼스 변경 순서를 지키기 위해 기본 1개)
+ingest_jobs = JobManager(max_workers=int(os.getenv('RAG_INGEST_WORKERS', '1')))
+# 생성 답변 캐시 (코퍼스 버전 + 문맥 청크 + 파라미터 + 질의, RAG_ANSWER_CACHE_SIZE=0이면 끔)
+ANSWER_CACHE_SIZE = int(os.getenv('RAG_ANSWER_CACHE_SIZE', '1000'))
+answer_cache = AnswerCache(
+    max_entries=ANSWER_CACHE_SIZE,
+    ttl=float(os.getenv('RAG_ANSWER_CACHE_TTL', '3600')),
+    # 비슷한 질문도 적중으로 볼 코사인 유사도 (예: 0.95, 비우면 정확히 같은 질문만)
+    similarity_threshold=float(os.getenv('RAG_ANSWER_CACHE_SIMILARITY')) if os.getenv('RAG_ANSWER_CACHE_SIMILARITY') else None
+) if ANSWER_CACHE_SIZE > 0 else None
+# 정규화 텍스트 해시 -> 청크 임베딩 캐시 (반복되는 머리말/표 행/경고문은 한 번만 인코딩)
+embedding_cache = EmbeddingCache(
+    os.path.join(PROJECT_ROOT, 'data', 'embedding_cache'),
+    f"{EMBEDDING_MODEL_KEY}@{EMBEDDING_MODEL_REVISION}"
+)
 
-# 앱 시작 시 모델 초기화
-initialize_models()
+def get_collection(name):
+    """읽기용 컬렉션 (아직 없으면 등록하지 않은 빈 코퍼스)"""
+    return collections.get(name) or IndexManager(index_type=INDEX_TYPE)
 
 class ChatRequest(BaseModel):
     query: str
+    collection: str = DEFAULT_COLLECTION
 
 class SearchRequest(BaseModel):
     query: str
     k: int = 5
+    nprobe: Optional[int] = None     # IVF 계열: 탐색할 클러스터 수
+    ef_search: Optional[int] = None  # HNSW: 탐색 폭
+    mode: Optional[str] = None       # dense / sparse / hybrid (기본값 RAG_RETRIEVAL_MODE)
+    rerank: Optional[bool] = None    # cross-encoder 재정렬 (기본값: 모델이 설정되어 있으면 사용)
+    collection: str = DEFAULT_COLLECTION
+
+class BatchSearchQuery(BaseModel):
+    query: str
+    k: int = 5
+
+class BatchSearchRequest(BaseModel):
+    queries: list[BatchSearchQuery]
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    mode: Optional[str] = None
+    collection: str = DEFAULT_COLLECTION
+
+# /search/batch 한 요청의 최대 질의 수
+MAX_BATCH_QUERIES = 1024
+
+class IndexRebuildRequest(BaseModel):
+    index_type: str = 'flat'
+    nlist: Optional[int] = None
+    pq_m: Optional[int] = None
+    hnsw_m: Optional[int] = None
+    collection: str = DEFAULT_COLLECTION
 
 class GenerateRequest(BaseModel):
     query: str
     selected_indices: list[int]
+    collection: str = DEFAULT_COLLECTION
 
 @app.get("/")
 def root():
@@ -114,95 +171,276 @@ def root():
         "status": "ok",
         "message": "RAG 챗봇 API (A.X-4.0-Light)",
         "model": "A.X-4.0-Light-Q4_K_M",
-        "model_loaded": llm_model is not None,
-        "chunks_loaded": len(chunks) if chunks else 0
+        "model_loaded": llm_scheduler is not None,
+        "chunks_loaded": len(get_collection(DEFAULT_COLLECTION)),
+        "collections": collections.names()
+    }
+
+@app.get("/health")
+def health():
+    """프로세스 생존 확인 + 구성 요소별 초기화 상태/소요 시간"""
+    return {"status": "ok", **startup.snapshot()}
+
+@app.get("/ready")
+def ready():
+    """검색 준비 여부 (임베딩 모델 + 코퍼스, 준비 전에는 503); chat은 LLM까지 준비되었는지"""
+    search_ready = startup.is_ready('embedder', 'corpus')
+    chat_ready = search_ready and startup.is_ready('llm') and startup.state('prefix_cache') != 'loading'
+    return JSONResponse(
+        status_code=200 if search_ready else 503,
+        content={"ready": search_ready, "search": search_ready, "chat": chat_ready, **startup.snapshot()}
+    )
+
+def invalid_collection(name):
+    """컬렉션 이름이 잘못되었으면 400 응답 (올바르면 None)"""
+    try:
+        validate_name(name)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+    return None
+
+def not_ready(*components):
+    """필요한 구성 요소가 아직 로드 중이면 503 응답 (준비되었거나 실패/비활성화면 None)"""
+    loading = [name for name in components if startup.state(name) in ('pending', 'loading')]
+    if not loading:
+        return None
+    return JSONResponse(
+        status_code=503,
+        content={"success": False, "error": f"모델을 불러오는 중입니다: {', '.join(loading)}"},
+        headers={"Retry-After": "5"}
+    )
+
+# 임베딩 진행률을 보고할 배치 크기 (청크 -> 임베딩 단계 사이의 배치 단위)
+EMBED_PROGRESS_BATCH = 256
+# 수집 단계(추출 -> 청킹 -> 임베딩) 사이 큐 크기: 단계마다 대기하는 페이지/배치 수 상한
+INGEST_QUEUE_SIZE = int(os.getenv('RAG_INGEST_QUEUE_SIZE', '2'))
+# 수집 중인 문서의 원문/청크/임베딩을 임시로 쓰는 디렉터리 (이전 실행에서 남은 파일은 서버 시작 시 정리)
+INGEST_SPOOL_DIR = os.path.join(PROJECT_ROOT, 'data', 'ingest_spool')
+# 이 크기 이하의 문서만 추출 캐시에 저장 (큰 문서는 페이지를 메모리에 모으지 않음)
+EXTRACTION_CACHE_DOC_BYTES = int(os.getenv('RAG_EXTRACTION_CACHE_DOC_MB', '64')) * 1024 * 1024
+
+def prepare_document(job, doc_id, name, pages_content, text=None, content_hash=None, page_count=None):
+    """
+    문서 하나를 추출/청킹/임베딩해 DocumentSpool에 기록 (인덱스는 건드리지 않음)
+    페이지 추출 -> 청킹 -> 임베딩을 단계별 스레드로 흘려보내므로 (ingest_pipeline 참고)
+    메모리 사용량은 문서 크기가 아니라 배치 크기에 비례한다.
+    content_hash가 추출 캐시에 있으면 추출/토큰화/임베딩을 건너뛴다.
+    page_count: 페이지 수 (pages_content가 제너레이터일 때 추출 단계 전체량으로 사용)
+                호출 가능한 객체면 추출 캐시에 없을 때만 호출한다 (PDF 페이지 세기도 파싱이므로)
+
+    Returns:
+        {'doc_id', 'name', 'content_hash', 'spool'}
+    """
+    spool = DocumentSpool(INGEST_SPOOL_DIR)
+    try:
+        if text is not None:
+            spool.write_text(text)
+
+        if content_hash:
+            cached = extraction_cache.get(content_hash, EMBEDDING_MODEL_KEY)
+            if cached is not None:
+                page_count = len(cached['pages'])
+                if cached['chunks'] is not None:
+                    print(f"추출 캐시 사용: {name} (추출/임베딩 생략)")
+                    if text is None:
+                        spool.write_text(rag_pipeline.format_pages_text(cached['pages']))
+                    spool.add(cached['chunks'], cached['embeddings'])
+                    spool.finish()
+                    job.add_total('extract', page_count)
+                    job.advance('extract', page_count)
+                    job.advance('chunk', len(cached['chunks']))
+                    job.advance('embed', len(cached['chunks']))
+                    return {'doc_id': doc_id, 'name': name, 'content_hash': content_hash, 'spool': spool}
+                # 다른 임베딩 모델로 만든 항목: 추출 결과만 재사용
+                print(f"추출 캐시 사용: {name} (추출 생략)")
+                pages_content = cached['pages']
+
+        if callable(page_count):
+            page_count = page_count()
+        if page_count is None and hasattr(pages_content, '__len__'):
+            page_count = len(pages_content)
+        if page_count is not None:
+            job.add_total('extract', page_count)
+
+        cache_pages = [] if content_hash else None
+        cache_bytes = 0
+
+        def extract_stage(pages):
+            nonlocal cache_pages, cache_bytes
+            for page_data in pages:
+                if text is None:
+                    spool.write_text(rag_pipeline.format_page_text(page_data))
+                if cache_pages is not None:
+                    cache_bytes += len(page_data['text'].encode('utf-8'))
+                    if cache_bytes <= EXTRACTION_CACHE_DOC_BYTES:
+                        cache_pages.append(page_data)
+                    else:
+                        cache_pages = None
+                job.advance('extract')
+                yield page_data
+
+        def chunk_stage(pages):
+            for batch in batched(rag_pipeline.iter_chunks(pages, embedding_model), EMBED_PROGRESS_BATCH):
+                job.advance('chunk', len(batch))
+                yield batch
+
+        def embed_stage(batches):
+            for batch in batches:
+                yield batch, rag_pipeline.embed_chunks(batch, chunk_encoder, cache=embedding_cache)
+
+        for batch, embeddings in pipeline(pages_content, extract_stage, chunk_stage, embed_stage,
+                                          maxsize=INGEST_QUEUE_SIZE):
+            spool.add(batch, embeddings)
+            job.advance('embed', len(batch))
+        spool.finish()
+
+        if cache_pages is not None:
+            extraction_cache.put(content_hash, cache_pages, list(spool.chunks()), spool.embeddings(),
+                                 model_name=EMBEDDING_MODEL_KEY)
+    except BaseException:
+        spool.close()
+        raise
+
+    return {'doc_id': doc_id, 'name': name, 'content_hash': content_hash, 'spool': spool}
+
+def run_ingest(job, collection, sources, text_input=None):
+    """
+    업로드 수집 작업 (백그라운드 스레드에서 실행)
+    모든 문서를 준비한 뒤 인덱스에 반영하며, 검색은 문서 단위로 반영 전 또는 후 상태만 본다.
+
+    Args:
+        collection: 문서를 넣을 컬렉션 이름 (없으면 새로 만든다)
+        sources: [(파일명, 내용 해시, 저장 경로), ...]
+    """
+    # 서버 시작 직후의 업로드는 임베딩 모델이 준비될 때까지 대기
+    if not startup.wait('embedder'):
+        raise RuntimeError("임베딩 모델이 로드되지 않았습니다.")
+
+    prepared = []
+    processed_files = []
+    try:
+        for filename, content_hash, file_path in sources:
+            # Extract text based on file type
+            if filename.lower().endswith('.pdf'):
+                print(f"PDF 텍스트 추출 중: {filename}")
+                # 페이지가 추출되는 대로 청킹 (여러 프로세스로 페이지 범위 분할)
+                text = None
+                # 페이지 수는 추출 캐시에 없을 때만 센다
+                page_count = partial(rag_pipeline.count_pdf_pages, file_path)
+                pages = rag_pipeline.iter_pdf_pages(file_path, workers=PDF_WORKERS)
+            elif filename.lower().endswith('.txt'):
+                print(f"TXT 파일 읽기 중: {filename}")
+                text, pages = rag_pipeline.extract_text_from_txt(file_path)
+                page_count = len(pages)
+            else:
+                print(f"지원하지 않는 파일 형식: {filename}")
+                continue
+
+            # 같은 파일명은 같은 문서로 보고 해당 문서의 청크만 교체 (내용이 다르면 응답의 replaced_files에 표시)
+            prepared.append(prepare_document(job, filename, filename, pages, text, content_hash=content_hash,
+                                             page_count=page_count))
+            processed_files.append(filename)
+
+        # Add text input if provided
+        if text_input and text_input.strip():
+            print("직접 입력된 텍스트 추가 중...")
+            text_hash = hashlib.sha256(text_input.encode('utf-8')).hexdigest()
+            pages = [{'page': 1, 'text': text_input}]
+            prepared.append(prepare_document(job, "text:" + text_hash[:12], "직접 입력 텍스트", pages,
+                                             text_input, content_hash=text_hash))
+
+        # Check if we have any content
+        if not prepared:
+            raise ValueError("처리할 파일이나 텍스트가 없습니다.")
+
+        for stage in ('extract', 'chunk', 'embed'):
+            job.finish_stage(stage)
+
+        # corpus.lock은 다른 수정 작업(삭제/재구축/다른 수집)과의 순서만 지킨다.
+        # 검색은 이 잠금을 잡지 않으며 add_document가 문서 하나를 바꿔 끼우는 동안만 기다린다.
+        print("인덱싱 중...")
+        job.update('index', done=0, total=len(prepared))
+        added_chunks = 0
+        replaced_files = []
+        with collections.use(collection, create=True) as corpus:
+            with corpus.lock:
+                for doc in prepared:
+                    spool = doc['spool']
+                    if len(spool):
+                        existing = corpus.documents.get(doc['doc_id'])
+                        if existing is not None and existing.get('content_hash') != doc['content_hash']:
+                            print(f"같은 이름의 기존 문서를 교체합니다: {doc['name']}")
+                            replaced_files.append(doc['name'])
+                        added_chunks += corpus.add_document(doc['doc_id'], spool.chunks(), spool.embeddings(),
+                                                            name=doc['name'], text=spool.text(),
+                                                            content_hash=doc['content_hash'])
+                    job.advance('index')
+                chunk_count, document_count = len(corpus), len(corpus.documents)
+            # 디스크에 저장 (재시작 후에도 유지, 파일 쓰기는 잠금 밖에서 하므로 저장 중에도 검색 가능)
+            # 원문/청크/임베딩은 스풀 파일에서 새 세대로 흘려 쓴다
+            collections.persist(collection, corpus)
+        job.finish_stage('index')
+
+        # 문서별 앞부분만 읽어 미리보기 구성
+        combined_text = "\n\n=== 문서 구분 ===\n\n".join(doc['spool'].text_head(1001) for doc in prepared)
+    finally:
+        for doc in prepared:
+            doc['spool'].close()
+
+    return {
+        "message": "문서 처리 완료",
+        "file_count": len(processed_files),
+        "files": processed_files,
+        "replaced_files": replaced_files,
+        "has_text_input": bool(text_input and text_input.strip()),
+        "collection": collection,
+        "chunk_count": chunk_count,
+        "added_chunk_count": added_chunks,
+        "document_count": document_count,
+        "text_preview": combined_text[:1000] + "..." if len(combined_text) > 1000 else combined_text
     }
 
 @app.post("/upload")
 async def upload_pdf(
     files: list[UploadFile] = File(...),
-    text_input: str = Form(None)
+    text_input: str = Form(None),
+    wait: bool = Form(True),
+    collection: str = Form(DEFAULT_COLLECTION)
 ):
-    global index, chunks, current_pdf_text
-    
+    """
+    파일 업로드 후 수집 작업을 백그라운드 작업자에서 실행
+    wait=True(기본)면 이벤트 루프를 막지 않고 완료를 기다려 결과를 반환하고,
+    wait=False면 job_id만 바로 반환한다 (/jobs/{job_id}로 진행 상황 조회).
+    """
     try:
+        validate_name(collection)
         upload_dir = os.path.join(PROJECT_ROOT, 'data', 'uploads')
-        os.makedirs(upload_dir, exist_ok=True)
         
-        all_texts = []
-        all_pages_content = []
-        processed_files = []
-        
-        # Process uploaded files
+        sources = []
         for file in files:
             if not file.filename:
                 continue
-                
-            file_path = os.path.join(upload_dir, file.filename)
-            
-            # Save file
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            print(f"파일 업로드 완료: {file.filename}")
-            
-            # Extract text based on file type
-            if file.filename.lower().endswith('.pdf'):
-                print(f"PDF 텍스트 추출 중: {file.filename}")
-                text, pages = rag_pipeline.extract_text_from_pdf(file_path)
-                all_texts.append(text)
-                all_pages_content.extend(pages)
-                processed_files.append(file.filename)
-            elif file.filename.lower().endswith('.txt'):
-                print(f"TXT 파일 읽기 중: {file.filename}")
-                text, pages = rag_pipeline.extract_text_from_txt(file_path)
-                all_texts.append(text)
-                all_pages_content.extend(pages)
-                processed_files.append(file.filename)
-            else:
-                print(f"지원하지 않는 파일 형식: {file.filename}")
+            # Save file (내용 해시 이름으로 저장하여 같은 이름의 다른 파일이 덮어쓰지 않음)
+            content_hash, file_path = await run_in_threadpool(save_upload, file.file, upload_dir, file.filename)
+            print(f"파일 업로드 완료: {file.filename} ({content_hash[:12]})")
+            sources.append((file.filename, content_hash, file_path))
         
-        # Add text input if provided
-        if text_input and text_input.strip():
-            print("직접 입력된 텍스트 추가 중...")
-            all_texts.append(text_input)
-            all_pages_content.append({
-                'page': len(all_pages_content) + 1,
-                'text': text_input
-            })
+        description = ", ".join(name for name, _, _ in sources) or "직접 입력 텍스트"
+        job, future = ingest_jobs.submit(run_ingest, collection, sources, text_input,
+                                         description=f"[{collection}] {description}")
         
-        # Check if we have any content
-        if not all_texts:
+        if not wait:
             return {
-                "success": False,
-                "error": "처리할 파일이나 텍스트가 없습니다."
+                "success": True,
+                "job_id": job.id,
+                "status_url": f"/jobs/{job.id}",
+                "events_url": f"/jobs/{job.id}/events"
             }
         
-        # Combine all texts
-        combined_text = "\n\n=== 문서 구분 ===\n\n".join(all_texts)
-        current_pdf_text = combined_text
-        
-        # 2. 청킹
-        print("청킹 중...")
-        new_chunks = rag_pipeline.chunk_text(all_pages_content, embedding_model)
-        
-        # 3. 인덱싱
-        print("인덱싱 중...")
-        new_index, _ = rag_pipeline.build_index(new_chunks, embedding_model)
-        
-        # 전역 변수 업데이트
-        chunks = new_chunks
-        index = new_index
-        
-        return {
-            "success": True,
-            "message": "문서 처리 완료",
-            "file_count": len(processed_files),
-            "files": processed_files,
-            "has_text_input": bool(text_input and text_input.strip()),
-            "chunk_count": len(chunks),
-            "text_preview": combined_text[:1000] + "..." if len(combined_text) > 1000 else combined_text
-        }
+        await asyncio.wrap_future(future)
+        if job.status == 'failed':
+            return {"success": False, "error": job.error, "job_id": job.id}
+        return {"success": True, "job_id": job.id, **job.result}
         
     except Exception as e:
         print(f"업로드 처리 중 오류: {e}")
@@ -210,193 +448,753 @@ async def upload_pdf(
         traceback.print_exc()
         return {"success": False, "error": str(e)}
 
+@app.get("/jobs")
+def list_jobs():
+    """수집 작업 목록"""
+    return {"success": True, "jobs": ingest_jobs.list()}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """수집 작업 상태 (단계별 진행률 포함)"""
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        return {"success": False, "error": f"작업을 찾을 수 없습니다: {job_id}"}
+    return {"success": True, **job.to_dict()}
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """수집 작업 상태를 Server-Sent Events로 전송 (완료/실패 시 종료)"""
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        return {"success": False, "error": f"작업을 찾을 수 없습니다: {job_id}"}
+
+    async def event_stream():
+        last_version = -1
+        while True:
+            state = job.to_dict()
+            if state['version'] != last_version:
+                last_version = state['version']
+                yield f"data: {json.dumps(state, ensure_ascii=False)}\n\n"
+            if state['status'] in ('done', 'failed'):
+                break
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.get("/data")
-def get_data():
+def get_data(collection: str = DEFAULT_COLLECTION):
     """현재 로드된 데이터 정보 반환"""
+    invalid = invalid_collection(collection)
+    if invalid is not None:
+        return invalid
+    corpus = get_collection(collection)
     return {
-        "text": current_pdf_text,
-        "chunk_count": len(chunks),
-        "has_index": index is not None
+        "text": corpus.combined_text(),
+        "chunk_count": len(corpus),
+        "has_index": corpus.has_index()
     }
 
 @app.get("/chunks")
-def get_chunks():
+def get_chunks(collection: str = DEFAULT_COLLECTION):
     """전체 청크 목록 반환"""
+    invalid = invalid_collection(collection)
+    if invalid is not None:
+        return invalid
+    all_chunks = get_collection(collection).list_chunks()
     return {
         "success": True,
-        "chunks": chunks,
-        "count": len(chunks)
+        "chunks": all_chunks,
+        "count": len(all_chunks)
     }
 
+@app.get("/documents")
+def get_documents(collection: str = DEFAULT_COLLECTION):
+    """인덱스에 올라간 문서 목록 반환"""
+    invalid = invalid_collection(collection)
+    if invalid is not None:
+        return invalid
+    documents = get_collection(collection).list_documents()
+    return {
+        "success": True,
+        "documents": documents,
+        "count": len(documents)
+    }
+
+@app.delete("/documents/{doc_id:path}")
+def delete_document(doc_id: str, collection: str = DEFAULT_COLLECTION):
+    """문서 하나의 청크만 인덱스에서 삭제 (전체 재구축 없음)"""
+    try:
+        with collections.use(collection) as corpus:
+            removed = corpus.remove_document(doc_id)
+            if removed == 0:
+                return {"success": False, "error": f"문서를 찾을 수 없습니다: {doc_id}"}
+            collections.persist(collection, corpus)
+            return {
+                "success": True,
+                "removed_chunk_count": removed,
+                "chunk_count": len(corpus)
+            }
+    except KeyError:
+        return {"success": False, "error": f"컬렉션을 찾을 수 없습니다: {collection}"}
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"success": False, "error": str(e)})
+
+@app.get("/collections")
+def list_collections():
+    """컬렉션 목록과 메모리 사용량 (메모리에 없는 컬렉션은 디스크에만 있음)"""
+    return {
+        "success": True,
+        "collections": collections.list(),
+        "registry": collections.stats()
+    }
+
+@app.get("/cache")
+def get_cache_stats():
+    """캐시 사용 현황 반환"""
+    return {
+        "success": True,
+        "extraction": extraction_cache.stats(),
+        "embedding": embedding_cache.stats(),
+        "chunk_encoding": chunk_encoder.stats() if chunk_encoder is not None else None,
+        "query": query_encoder.stats() if query_encoder is not None else None,
+        "answer": answer_cache.stats() if answer_cache is not None else None
+    }
+
+@app.get("/index")
+def get_index_info(collection: str = DEFAULT_COLLECTION):
+    """인덱스 종류와 크기 반환"""
+    invalid = invalid_collection(collection)
+    if invalid is not None:
+        return invalid
+    corpus = get_collection(collection)
+    return {
+        "success": True,
+        "collection": collection,
+        "index_type": corpus.built_index_type,
+        "target_index_type": corpus.index_type,
+        "index_params": corpus.index_params,
+        "vector_count": corpus.index.ntotal if corpus.index is not None else 0,
+        "retrieval_mode": RETRIEVAL_MODE,
+        "rerank": reranker.stats() if reranker is not None else None,
+        "sparse": corpus.sparse_index().stats(),
+        "memory": corpus.memory_usage()
+    }
+
+@app.post("/index/rebuild")
+def rebuild_index(request: IndexRebuildRequest):
+    """저장된 임베딩으로 인덱스 종류를 바꿔 재구축 (임베딩 재계산 없음)"""
+    try:
+        params = {
+            key: value for key, value in
+            {"nlist": request.nlist, "pq_m": request.pq_m, "hnsw_m": request.hnsw_m}.items()
+            if value
+        }
+        with collections.use(request.collection) as corpus:
+            built = corpus.rebuild_index(request.index_type, **params)
+            collections.persist(request.collection, corpus)
+            return {
+                "success": True,
+                "index_type": built,
+                "target_index_type": corpus.index_type
+            }
+    except KeyError:
+        return {"success": False, "error": f"컬렉션을 찾을 수 없습니다: {request.collection}"}
+    except Exception as e:
+        print(f"인덱스 재구축 오류: {e}")
+        return {"success": False, "error": str(e)}
+
+@app.get("/index/recall")
+def index_recall(k: int = 10, n_queries: int = 100, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                 collection: str = DEFAULT_COLLECTION):
+    """현재 인덱스의 recall@k를 Flat(전수 탐색) 기준과 비교"""
+    invalid = invalid_collection(collection)
+    if invalid is not None:
+        return invalid
+    corpus = get_collection(collection)
+    if len(corpus) == 0:
+        return {"success": False, "error": "문서가 로드되지 않았습니다."}
+    try:
+        result = corpus.evaluate_recall(k=k, n_queries=n_queries, nprobe=nprobe, ef_search=ef_search)
+        return {"success": True, **result}
+    except Exception as e:
+        print(f"recall 측정 오류: {e}")
+        return {"success": False, "error": str(e)}
+
+# 답변 생성 파라미터
+LLM_STOP = ["질문:", "\n질문", "사용자:"]
+CHAT_PARAMS = dict(max_tokens=400, temperature=0.7, top_p=0.9, repeat_penalty=1.1, stop=LLM_STOP, echo=False)
+GENERATE_PARAMS = dict(max_tokens=600, temperature=0.2, top_p=0.9, repeat_penalty=1.1, stop=LLM_STOP, echo=False)
+# 토큰 경계 차이(청크별로 센 합과 이어붙인 문맥의 토큰 수 차이)를 위한 여유분
+CONTEXT_SAFETY_TOKENS = 16
+
+def rerank_results(corpus, query, indices, k):
+    """1차 검색 후보(ID 행렬의 첫 행)를 cross-encoder로 재정렬해 (점수, ID) 1xk 행렬로 반환"""
+    candidates = [(int(idx), corpus.get_chunk(idx)) for idx in indices[0] if idx >= 0]
+    candidates = [(idx, chunk) for idx, chunk in candidates if chunk]
+    scores, ids = reranker.rerank(query, [idx for idx, _ in candidates],
+                                  [chunk['content'] for _, chunk in candidates], k)
+    return scores[None, :], ids[None, :]
+
+def count_llm_tokens(text):
+    """LLM 토크나이저 기준 토큰 수 (모델이 없으면 글자 수로 넉넉하게 추정)"""
+    if llm_tokenizer is None:
+        return len(text)
+    return len(llm_tokenizer.tokenize(text.encode('utf-8'), add_bos=False, special=True))
+
+def pack_prompt(build_prompt, query, chunks, params):
+    """
+    n_ctx에서 답변(max_tokens)과 지시문/질문 토큰을 뺀 예산 안에서 관련도 순으로 문맥을 채운다.
+
+    Returns:
+        (프롬프트, sources, 문맥 보고서)
+    """
+    overhead = count_llm_tokens(build_prompt("", query)) + 1  # BOS
+    budget = LLM_N_CTX - params['max_tokens'] - overhead - CONTEXT_SAFETY_TOKENS
+    context, included, report = context_packer.pack_context(chunks, count_llm_tokens, max(budget, 0))
+    sources = [{"page": chunk['page'], "title": chunk['title']} for chunk in included]
+    return context, sources, report
+
+def build_chat_prompt(corpus, query):
+    """검색으로 상위 5개 청크를 찾아 /chat 프롬프트 구성"""
+    # 1. 검색 (기본값: BM25 + 벡터 하이브리드)
+    query_embedding = query_encoder.encode([query])
+    
+    depth = RERANK_CANDIDATES if reranker is not None else 5
+    distances, indices = corpus.retrieve(query_embedding, [query], depth, mode=RETRIEVAL_MODE)
+    if reranker is not None:
+        distances, indices = rerank_results(corpus, query, indices, 5)
+    
+    # 2. 컨텍스트 구성 (토큰 예산 안에서 관련도 순)
+    chunks = [chunk for chunk in (corpus.get_chunk(idx) for idx in indices[0] if idx >= 0) if chunk]
+    context, sources, report = pack_prompt(prompts.chat_prompt, query, chunks, CHAT_PARAMS)
+    
+    # 3. 프롬프트 구성
+    prompt = prompts.chat_prompt(context, query)
+    return prompt, sources, report
+
+def build_generate_prompt(corpus, query, selected_indices):
+    """선택된 청크로 /generate 프롬프트 구성 (선택 순서를 관련도 순으로 보고 토큰 예산만큼 사용)"""
+    chunks = [chunk for chunk in (corpus.get_chunk(idx) for idx in selected_indices) if chunk]
+    context, sources, report = pack_prompt(prompts.generate_prompt, query, chunks, GENERATE_PARAMS)
+    
+    if not context:
+        context = "참고할 문서가 선택되지 않았습니다."
+
+    prompt = prompts.generate_prompt(context, query)
+    return prompt, sources, report
+
+def complete(lease, prompt, params, stream=False):
+    """대여한 컨텍스트로 생성 (고정 접두어 KV 상태를 먼저 맞춰 문맥/질문 부분만 평가)"""
+    if prefix_cache is not None:
+        prefix_cache.prepare(lease.model, prompt)
+    return lease.model(prompt, stream=stream, stopping_criteria=lease.stopping_criteria(), **params)
+
+def corpus_version(corpus):
+    """답변 캐시 무효화 기준 (저장 세대 + 세대 이후 변경 횟수; 메모리에서 내렸다 다시 열어도 유지)"""
+    generation = os.path.basename(corpus.snapshot.path) if corpus.snapshot is not None else None
+    return (generation, corpus.version)
+
+def lookup_answer(collection, corpus, kind, query, context_report, params):
+    """답변 캐시 조회 (캐시를 끄거나 없으면 None)"""
+    if answer_cache is None:
+        return None
+    chunk_ids = [item['index'] for item in context_report['included']]
+    embedding = query_encoder.encode([query])[0] if answer_cache.similarity_threshold is not None else None
+    return answer_cache.get(collection, corpus_version(corpus), kind, query, chunk_ids, params, embedding=embedding)
+
+def store_answer(collection, kind, query, context_report, params, answer, sources, version):
+    """생성한 답변 저장 (version은 문맥을 만들 때의 코퍼스 버전)"""
+    if answer_cache is None or not answer:
+        return
+    chunk_ids = [item['index'] for item in context_report['included']]
+    try:
+        embedding = query_encoder.encode([query])[0] if answer_cache.similarity_threshold is not None else None
+    except QueryEncoderTimeout as e:
+        # 답변은 이미 생성됐으므로 캐시 저장만 건너뜀
+        print(f"답변 캐시 저장 생략: {e}")
+        return
+    answer_cache.put(collection, version, kind, query, chunk_ids, params, answer, sources, embedding=embedding)
+
+def busy_response(e):
+    """LLM 대기열 포화 응답 (HTTP 429)"""
+    return JSONResponse(
+        status_code=429,
+        content={"success": False, "error": str(e)},
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+def encoder_timeout_response(e):
+    """질의 인코더가 응답하지 않을 때의 응답 (HTTP 503)"""
+    return JSONResponse(
+        status_code=503,
+        content={"success": False, "error": str(e)},
+        headers={"Retry-After": "5"}
+    )
+
 @app.post("/chat")
 def chat(request: ChatRequest):
-    # 기존 로직 유지하되 index/chunks가 비어있을 때 처리 추가
-    if not index or not chunks:
-         return {"success": False, "error": "문서가 로드되지 않았습니다. PDF를 업로드해주세요."}
-         
+    loading = not_ready('embedder', 'corpus', 'llm', 'prefix_cache')
+    if loading is not None:
+        return loading
+
     try:
-        if llm_model is None:
+        # 기존 로직 유지하되 index/chunks가 비어있을 때 처리 추가
+        corpus = get_collection(request.collection)
+        if len(corpus) == 0:
+            return {"success": False, "error": "문서가 로드되지 않았습니다. PDF를 업로드해주세요."}
+        if llm_scheduler is None:
             return {"success": False, "error": "모델이 로드되지 않았습니다."}
         
         print(f"\n질문: {request.query}")
         
-        # 1. 벡터 검색
-        query_embedding = embedding_model.encode([request.query])
-        query_embedding = np.array(query_embedding).astype('float32')
-        
-        distances, indices = index.search(query_embedding, 5)
+        version = corpus_version(corpus)
+        prompt, sources, context_report = build_chat_prompt(corpus, request.query)
         
-        # 2. 컨텍스트 구성
-        context = ""
-        sources = []
-        for idx in indices[0]:
-            if 0 <= idx < len(chunks):
-                context += f"[페이지 {chunks[idx]['page']}]\n"
-                context += chunks[idx]['content'][:300] + "\n\n"
-                sources.append({
-                    "page": chunks[idx]['page'],
-                    "title": chunks[idx]['title']
-                })
-        
-        # 3. 프롬프트 구성
-        prompt = f"""당신은 문서 전문 상담원입니다.
-아래 문서를 참고하여 질문에 정확하고 친절하게 한국어로 답변하세요.
-
-문서 내용:
-{context}
-
-질문: {request.query}
-
-답변:"""
+        cached = lookup_answer(request.collection, corpus, 'chat', request.query, context_report, CHAT_PARAMS)
+        if cached is not None:
+            print(f"답변 캐시 적중 (유사도 {cached['similarity']:.3f})")
+            return {
+                "success": True,
+                "answer": cached['answer'],
+                "sources": cached['sources'],
+                "context": context_report,
+                "cached": True
+            }
         
         print("LLM 답변 생성 중...")
         
-        # 4. LLM 답변 생성
-        response = llm_model(
-            prompt,
-            max_tokens=400,
-            temperature=0.7,
-            top_p=0.9,
-            repeat_penalty=1.1,
-            stop=["질문:", "\n질문", "사용자:"],
-            echo=False
-        )
+        # 4. LLM 답변 생성 (컨텍스트 대여 후 생성, 끝나면 반납)
+        with llm_scheduler.acquire() as lease:
+            response = complete(lease, prompt, CHAT_PARAMS)
         
         answer = response['choices'][0]['text'].strip()
+        if not lease.timed_out:
+            store_answer(request.collection, 'chat', request.query, context_report, CHAT_PARAMS, answer, sources, version)
         
         return {
             "success": True,
             "answer": answer,
-            "sources": sources
+            "sources": sources,
+            "context": context_report,
+            "cached": False
         }
         
+    except SchedulerBusy as e:
+        return busy_response(e)
+    except QueryEncoderTimeout as e:
+        return encoder_timeout_response(e)
     except Exception as e:
         print(f"오류: {e}")
         return {"success": False, "error": str(e)}
 
+@app.post("/chat/stream")
+def chat_stream(request: ChatRequest):
+    """/chat의 스트리밍 버전 (SSE: sources -> token... -> done)"""
+    loading = not_ready('embedder', 'corpus', 'llm', 'prefix_cache')
+    if loading is not None:
+        return loading
+
+    try:
+        corpus = get_collection(request.collection)
+        if len(corpus) == 0:
+            return {"success": False, "error": "문서가 로드되지 않았습니다. PDF를 업로드해주세요."}
+        if llm_scheduler is None:
+            return {"success": False, "error": "모델이 로드되지 않았습니다."}
+
+        print(f"\n질문 (스트리밍): {request.query}")
+        version = corpus_version(corpus)
+        prompt, sources, context_report = build_chat_prompt(corpus, request.query)
+        cached = lookup_answer(request.collection, corpus, 'chat', request.query, context_report, CHAT_PARAMS)
+        if cached is not None:
+            return StreamingResponse(
+                stream_cached_answer(cached['answer'], cached['sources'], context=context_report),
+                media_type="text/event-stream"
+            )
+        # 컨텍스트는 스트림이 끝날 때 반납
+        lease = llm_scheduler.acquire()
+        try:
+            completion = complete(lease, prompt, CHAT_PARAMS, stream=True)
+
+            def on_complete(answer):
+                if not lease.timed_out:
+                    store_answer(request.collection, 'chat', request.query, context_report, CHAT_PARAMS, answer, sources, version)
+
+            return StreamingResponse(
+                lease.wrap(stream_answer(completion, sources, context=context_report, on_complete=on_complete)),
+                media_type="text/event-stream"
+            )
+        except BaseException:
+            # 스트림에 넘기기 전에 실패하면 여기서 반납
+            lease.release()
+            raise
+    except SchedulerBusy as e:
+        return busy_response(e)
+    except QueryEncoderTimeout as e:
+        return encoder_timeout_response(e)
+    except Exception as e:
+        print(f"오류: {e}")
+        return {"success": False, "error": str(e)}
+
+def format_search_results(corpus, distances, indices, k=None):
+    """검색 결과 한 행을 응답 형식으로 변환 (k가 주어지면 앞에서 k개만)"""
+    results = []
+    for i, idx in enumerate(indices[:k]):
+        chunk = corpus.get_chunk(idx) if idx >= 0 else None
+        if chunk:
+            score = float(distances[i])
+            
+            # index는 청크 고정 ID (/generate의 selected_indices로 그대로 사용)
+            results.append({
+                "index": chunk['id'],
+                "page": chunk['page'],
+                "title": chunk['title'],
+                "content": chunk['content'],
+                "score": score
+            })
+    return results
+
 @app.post("/search")
 def search(request: SearchRequest):
-    if not index or not chunks:
-         return {"success": False, "error": "문서가 로드되지 않았습니다. PDF를 업로드해주세요."}
+    # LLM은 기다리지 않는다 (임베딩 모델과 코퍼스만 필요)
+    loading = not_ready('embedder', 'corpus')
+    if loading is not None:
+        return loading
 
     try:
+        corpus = get_collection(request.collection)
+        if len(corpus) == 0:
+            return {"success": False, "error": "문서가 로드되지 않았습니다. PDF를 업로드해주세요."}
+
         print(f"\n검색 요청: {request.query} (k={request.k})")
         
-        query_embedding = embedding_model.encode([request.query])
-        query_embedding = np.array(query_embedding).astype('float32')
-        
-        distances, indices = index.search(query_embedding, request.k)
+        query_embedding = query_encoder.encode([request.query])
+        use_rerank = reranker is not None and request.rerank is not False
         
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if 0 <= idx < len(chunks):
-                score = float(distances[0][i])
-                doc_idx = int(idx)
-                
-                results.append({
-                    "index": doc_idx,
-                    "page": chunks[doc_idx]['page'],
-                    "title": chunks[doc_idx]['title'],
-                    "content": chunks[doc_idx]['content'],
-                    "score": score
-                })
+        distances, indices = corpus.retrieve(
+            query_embedding, [request.query], max(request.k, RERANK_CANDIDATES) if use_rerank else request.k,
+            mode=request.mode or RETRIEVAL_MODE, nprobe=request.nprobe, ef_search=request.ef_search
+        )
+        if use_rerank:
+            distances, indices = rerank_results(corpus, request.query, indices, request.k)
             
         return {
             "success": True,
-            "results": results
+            "results": format_search_results(corpus, distances[0], indices[0])
         }
+    except QueryEncoderTimeout as e:
+        return encoder_timeout_response(e)
     except Exception as e:
         print(f"검색 오류: {e}")
         return {"success": False, "error": str(e)}
 
+@app.post("/search/batch")
+def search_batch(request: BatchSearchRequest):
+    """여러 질의를 한 번에 인코딩하고 FAISS 검색도 한 번만 수행 (질의별 k는 가장 큰 k로 검색 후 자름)"""
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        return {"success": False, "error": f"한 번에 최대 {MAX_BATCH_QUERIES}개 질의까지 검색할 수 있습니다."}
+    loading = not_ready('embedder', 'corpus')
+    if loading is not None:
+        return loading
+
+    try:
+        corpus = get_collection(request.collection)
+        if len(corpus) == 0:
+            return {"success": False, "error": "문서가 로드되지 않았습니다. PDF를 업로드해주세요."}
+        if not request.queries:
+            return {"success": True, "results": []}
+
+        print(f"\n배치 검색 요청: {len(request.queries)}개 질의")
+        
+        query_embeddings = query_encoder.encode([q.query for q in request.queries])
+        max_k = max(q.k for q in request.queries)
+        
+        distances, indices = corpus.retrieve(
+            query_embeddings, [q.query for q in request.queries], max_k, mode=request.mode or RETRIEVAL_MODE,
+            nprobe=request.nprobe, ef_search=request.ef_search
+        )
+        
+        return {
+            "success": True,
+            "results": [
+                {"query": q.query, "results": format_search_results(corpus, distances[i], indices[i], q.k)}
+                for i, q in enumerate(request.queries)
+            ]
+        }
+    except QueryEncoderTimeout as e:
+        return encoder_timeout_response(e)
+    except Exception as e:
+        print(f"배치 검색 오류: {e}")
+        return {"success": False, "error": str(e)}
+
 @app.post("/generate")
 def generate(request: GenerateRequest):
-    if not chunks:
-         return {"success": False, "error": "문서가 로드되지 않았습니다."}
+    loading = not_ready('embedder', 'corpus', 'llm', 'prefix_cache')
+    if loading is not None:
+        return loading
 
     try:
-        if llm_model is None:
+        corpus = get_collection(request.collection)
+        if len(corpus) == 0:
+            return {"success": False, "error": "문서가 로드되지 않았습니다."}
+        if llm_scheduler is None:
             return {"success": False, "error": "모델이 로드되지 않았습니다."}
             
         print(f"\n생성 요청: {request.query}")
         
-        context = ""
-        sources = []
-        
-        for idx in request.selected_indices:
-            if 0 <= idx < len(chunks):
-                chunk = chunks[idx]
-                context += f"[페이지 {chunk['page']}]\n"
-                context += chunk['content'] + "\n\n"  # 전체 내용 사용
-                sources.append({
-                    "page": chunk['page'],
-                    "title": chunk['title']
-                })
+        version = corpus_version(corpus)
+        prompt, sources, context_report = build_generate_prompt(corpus, request.query, request.selected_indices)
         
-        if not context:
-            context = "참고할 문서가 선택되지 않았습니다."
-
-        prompt = f"""당신은 문서 전문 상담원입니다.
-아래 제공된 문서 내용을 바탕으로 질문에 정확하고 친절하게 한국어로 답변하세요.
-
-**중요 지침:**
-1. 반드시 제공된 문서 내용만을 사용하여 답변하세요.
-2. 문서에 없는 내용은 추측하거나 만들어내지 마세요.
-3. 문서에 해당 정보가 없는 경우 "문서에 해당 정보가 없습니다"라고 답변하세요.
-4. 답변은 구체적이고 명확하게 작성하세요.
-5. 시간 범위를 표시할 때는 물결표(~) 대신 하이픈(-)을 사용하세요 (예: 12:30-14:30).
-
-문서 내용:
-{context}
-
-질문: {request.query}
-
-답변:"""
+        cached = lookup_answer(request.collection, corpus, 'generate', request.query, context_report, GENERATE_PARAMS)
+        if cached is not None:
+            print(f"답변 캐시 적중 (유사도 {cached['similarity']:.3f})")
+            return {
+                "success": True,
+                "answer": cached['answer'],
+                "sources": cached['sources'],
+                "context": context_report,
+                "cached": True
+            }
         
-        response = llm_model(
-            prompt,
-            max_tokens=600,
-            temperature=0.2,
-            top_p=0.9,
-            repeat_penalty=1.1,
-            stop=["질문:", "\n질문", "사용자:"],
-            echo=False
-        )
+        with llm_scheduler.acquire() as lease:
+            response = complete(lease, prompt, GENERATE_PARAMS)
         
         answer = response['choices'][0]['text'].strip()
 
         # 물결표를 하이픈으로 변환 (마크다운 취소선 방지)
         answer = answer.replace('~', '-')
+        if not lease.timed_out:
+            store_answer(request.collection, 'generate', request.query, context_report, GENERATE_PARAMS, answer, sources, version)
         
         return {
             "success": True,
             "answer": answer,
-            "sources": sources
+            "sources": sources,
+            "context": context_report,
+            "cached": False
         }
         
+    except SchedulerBusy as e:
+        return busy_response(e)
+    except QueryEncoderTimeout as e:
+        return encoder_timeout_response(e)
+    except Exception as e:
+        print(f"생성 오류: {e}")
+        return {"success": False, "error": str(e)}
+
+@app.post("/generate/stream")
+def generate_stream(request: GenerateRequest):
+    """/generate의 스트리밍 버전 (물결표 치환도 토큰 단위로 적용)"""
+    loading = not_ready('embedder', 'corpus', 'llm', 'prefix_cache')
+    if loading is not None:
+        return loading
+
+    try:
+        corpus = get_collection(request.collection)
+        if len(corpus) == 0:
+            return {"success": False, "error": "문서가 로드되지 않았습니다."}
+        if llm_scheduler is None:
+            return {"success": False, "error": "모델이 로드되지 않았습니다."}
+
+        print(f"\n생성 요청 (스트리밍): {request.query}")
+        version = corpus_version(corpus)
+        prompt, sources, context_report = build_generate_prompt(corpus, request.query, request.selected_indices)
+        cached = lookup_answer(request.collection, corpus, 'generate', request.query, context_report, GENERATE_PARAMS)
+        if cached is not None:
+            return StreamingResponse(
+                stream_cached_answer(cached['answer'], cached['sources'], context=context_report),
+                media_type="text/event-stream"
+            )
+        lease = llm_scheduler.acquire()
+        try:
+            completion = complete(lease, prompt, GENERATE_PARAMS, stream=True)
+
+            def on_complete(answer):
+                if not lease.timed_out:
+                    store_answer(request.collection, 'generate', request.query, context_report, GENERATE_PARAMS, answer, sources, version)
+
+            return StreamingResponse(
+                lease.wrap(stream_answer(completion, sources, replace_tilde=True, context=context_report,
+                                         on_complete=on_complete)),
+                media_type="text/event-stream"
+            )
+        except BaseException:
+            # 스트림에 넘기기 전에 실패하면 여기서 반납
+            lease.release()
+            raise
+    except SchedulerBusy as e:
+        return busy_response(e)
+    except QueryEncoderTimeout as e:
+        return encoder_timeout_response(e)
     except Exception as e:
         print(f"생성 오류: {e}")
         return {"success": False, "error": str(e)}
 
+@app.get("/llm/metrics")
+def llm_metrics():
+    """LLM 스케줄러 지표 (대기열 깊이, 대기/생성 시간)"""
+    if llm_scheduler is None:
+        return {"success": False, "error": "모델이 로드되지 않았습니다."}
+    metrics = llm_scheduler.metrics()
+    if prefix_cache is not None:
+        metrics['prefix_cache'] = prefix_cache.stats()
+    return {"success": True, **metrics}
+
+# 초기화 단계 (이 순서로 로드; 임베딩 모델과 코퍼스가 준비되면 검색부터 받는다)
+STARTUP_COMPONENTS = ('embedder', 'corpus', 'reranker', 'llm', 'prefix_cache', 'warmup')
+startup = StartupStatus(STARTUP_COMPONENTS)
+# 로드가 끝난 뒤 더미 질의로 한 번씩 실행해 첫 요청 지연을 줄임 (RAG_WARMUP=1)
+WARMUP_ENABLED = os.getenv('RAG_WARMUP', '0') == '1'
+WARMUP_QUERY = "세탁기 필터 청소 방법"
+DATA_DIR = os.path.join(PROJECT_ROOT, 'data')
+LLM_MODEL_PATH = os.path.join(DATA_DIR, 'models', 'downloaded_models', 'A.X-4.0-Light-Q4_K_M.gguf')
+llm_models = []
+
+def load_embedder():
+    """검색용 임베딩 모델"""
+    global embedding_model, query_encoder, chunk_encoder
+    embedding_model = load_embedding_model(EMBEDDING_MODEL_NAME, EMBEDDING_MODEL_REVISION, EMBEDDING_BACKEND,
+                                           onnx_dir=os.path.join(DATA_DIR, 'models', 'onnx'))
+    query_encoder = QueryEncoder(
+        embedding_model,
+        f"{EMBEDDING_MODEL_KEY}@{EMBEDDING_MODEL_REVISION}",
+        cache_size=int(os.getenv('RAG_QUERY_CACHE_SIZE', '10000')),
+        max_wait_ms=float(os.getenv('RAG_QUERY_BATCH_WAIT_MS', '5')),
+        timeout=float(os.getenv('RAG_QUERY_ENCODE_TIMEOUT', '30'))
+    )
+    chunk_encoder = rag_pipeline.LengthBucketEncoder(
+        embedding_model,
+        batch_size=int(os.getenv('RAG_EMBED_BATCH_SIZE', str(rag_pipeline.EMBED_BATCH_SIZE))),
+        # 배치 크기 x 패딩된 토큰 길이 상한 (인코딩 중 최대 메모리 제한, 0이면 제한 없음)
+        max_batch_tokens=int(os.getenv('RAG_EMBED_MAX_BATCH_TOKENS', str(rag_pipeline.EMBED_MAX_BATCH_TOKENS))) or None
+    )
+    print(f"✅ 임베딩 모델 로드 완료: {EMBEDDING_MODEL_NAME} ({EMBEDDING_BACKEND})")
+
+def load_corpus():
+    """기본 컬렉션 연결 (저장된 코퍼스가 없으면 기존 데이터 가져오기)"""
+    index_path = os.path.join(DATA_DIR, 'washing_machine.index')
+    chunks_path = os.path.join(DATA_DIR, 'chunks.pkl')
+    text_path = os.path.join(DATA_DIR, 'extracted_text_pdfplumber.txt')
+
+    corpus = None
+    try:
+        corpus = collections.get(DEFAULT_COLLECTION)
+    except Exception as e:
+        print(f"⚠️ 저장된 코퍼스 열기 실패: {e}")
+
+    if corpus is not None:
+        # manifest만 읽고 인덱스/청크는 첫 검색 때 mmap으로 연다
+        print(f"✅ 저장된 코퍼스 연결 완료: {len(corpus)} chunks ({os.path.basename(corpus.snapshot.path)})")
+        if corpus.index_type != INDEX_TYPE:
+            print(f"인덱스 종류 변경: {corpus.index_type} -> {INDEX_TYPE}")
+            with collections.use(DEFAULT_COLLECTION):
+                corpus.rebuild_index(INDEX_TYPE)
+                collections.persist(DEFAULT_COLLECTION, corpus)
+        others = [name for name in collections.names() if name != DEFAULT_COLLECTION]
+        if others:
+            print(f"다른 컬렉션 {len(others)}개 (첫 요청 때 로드): {', '.join(others)}")
+    elif os.path.exists(index_path) and os.path.exists(chunks_path):
+        legacy_index = faiss.read_index(index_path)
+        with open(chunks_path, 'rb') as f:
+            legacy_chunks = pickle.load(f)
+        legacy_text = ""
+        if os.path.exists(text_path):
+            with open(text_path, 'r', encoding='utf-8') as f:
+                legacy_text = f.read()
+        corpus = IndexManager.from_legacy(legacy_index, legacy_chunks, text=legacy_text, index_type=INDEX_TYPE)
+        collections.persist(DEFAULT_COLLECTION, corpus)
+        collections.put(DEFAULT_COLLECTION, corpus)
+        print(f"✅ 초기 데이터 로드 완료: {len(corpus)} chunks")
+
+def load_reranker():
+    """cross-encoder 재정렬 모델 (로드 전까지는 재정렬 없이 검색)"""
+    global reranker
+    reranker = Reranker(
+        CrossEncoder(RERANK_MODEL_NAME, max_length=512),
+        batch_size=int(os.getenv('RAG_RERANK_BATCH_SIZE', '16')),
+        budget_ms=float(os.getenv('RAG_RERANK_BUDGET_MS', '300'))
+    )
+    print(f"✅ 재정렬 모델 로드 완료: {RERANK_MODEL_NAME}")
+
+def load_llm():
+    """답변 생성용 LLM (llama.cpp)"""
+    global llm_scheduler, llm_tokenizer
+    # 컨텍스트마다 KV 캐시와 스레드를 따로 쓰므로 메모리/코어 수에 맞춰 설정
+    pool_size = int(os.getenv('RAG_LLM_POOL_SIZE', '1'))
+    llm_models[:] = [
+        Llama(
+            model_path=LLM_MODEL_PATH,
+            n_ctx=LLM_N_CTX,
+            n_threads=4,
+            n_gpu_layers=0,
+            verbose=False
+        )
+        for _ in range(pool_size)
+    ]
+    llm_tokenizer = Llama(model_path=LLM_MODEL_PATH, vocab_only=True, verbose=False)
+    llm_scheduler = LLMScheduler(
+        llm_models,
+        max_queue=int(os.getenv('RAG_LLM_MAX_QUEUE', '8')),
+        queue_timeout=float(os.getenv('RAG_LLM_QUEUE_TIMEOUT', '30')),
+        generation_timeout=float(os.getenv('RAG_LLM_GENERATION_TIMEOUT', '120'))
+    )
+    print(f"✅ 모델 로드 완료: A.X-4.0-Light (컨텍스트 {pool_size}개)")
+
+def load_prefix_cache():
+    prefix_cache.warm(llm_models)
+    print(f"✅ 프롬프트 접두어 캐시 준비 완료: {prefix_cache.stats()['prefixes']}")
+
+def run_warmup():
+    """더미 질의로 임베딩/검색/재정렬/LLM을 한 번씩 실행 (첫 요청의 지연 방지)"""
+    query_embedding = query_encoder.encode([WARMUP_QUERY])
+    corpus = get_collection(DEFAULT_COLLECTION)
+    if len(corpus) > 0:
+        _, indices = corpus.retrieve(query_embedding, [WARMUP_QUERY], RERANK_CANDIDATES, mode=RETRIEVAL_MODE)
+        if reranker is not None:
+            rerank_results(corpus, WARMUP_QUERY, indices, 5)
+    if llm_scheduler is not None:
+        with llm_scheduler.acquire() as lease:
+            complete(lease, prompts.chat_prompt("", WARMUP_QUERY), dict(CHAT_PARAMS, max_tokens=1))
+    print("✅ 워밍업 완료")
+
+def initialize_models():
+    """모든 구성 요소를 순서대로 로드 (백그라운드 스레드에서 실행)"""
+    print("=" * 60)
+    print("모델 로딩 중...")
+    print("=" * 60)
+
+    try:
+        if not RERANK_MODEL_NAME:
+            startup.disable('reranker', "RAG_RERANK_MODEL이 설정되지 않았습니다.")
+        if not os.path.exists(LLM_MODEL_PATH):
+            print(f"⚠️  모델 파일이 없습니다: {LLM_MODEL_PATH}")
+            startup.disable('llm', f"모델 파일이 없습니다: {LLM_MODEL_PATH}")
+        if not WARMUP_ENABLED:
+            startup.disable('warmup', "RAG_WARMUP=1로 켤 수 있습니다.")
+
+        startup.run('embedder', load_embedder)
+        startup.run('corpus', load_corpus)
+        startup.run('reranker', load_reranker)
+        startup.run('llm', load_llm)
+        if prefix_cache is None or llm_scheduler is None:
+            startup.disable('prefix_cache', "프롬프트 접두어 캐시를 쓰지 않습니다.")
+        startup.run('prefix_cache', load_prefix_cache)
+        if query_encoder is None:
+            startup.disable('warmup', "임베딩 모델이 없습니다.")
+        startup.run('warmup', run_warmup)
+    finally:
+        startup.done()
+
+    status = startup.snapshot()
+    print("=" * 60)
+    print(f"✅ 모델 로딩 완료 ({status['elapsed_seconds']:.1f}초)")
+    for name, info in status['components'].items():
+        seconds = f"{info['seconds']:.2f}초" if info['seconds'] is not None else "-"
+        print(f"  {name:<13} {info['state']:<9} {seconds}")
+    print("=" * 60)
+
+def start_background_initialization():
+    """서버가 바로 요청을 받을 수 있도록 모델 로드를 백그라운드 스레드로 시작"""
+    threading.Thread(target=initialize_models, name='model-init', daemon=True).start()
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,149 @@
+# 청킹 토큰 수 계산 벤치마크
+# 문장마다 tokenizer.encode를 호출하던 기존 방식과
+# 페이지 단위 배치 토큰화 + LRU 캐시(TokenCounter)를 합성 한국어 코퍼스로 비교한다.
+# 토큰 수와 청킹 결과가 기존 방식과 다르면 종료 코드 1로 끝난다.
+
+import random
+import sys
+import time
+from types import SimpleNamespace
+from transformers import AutoTokenizer
+import rag_pipeline
+
+# 합성 코퍼스 설정
+NUM_PAGES = 200
+SENTENCES_PER_PAGE = 40
+
+# 설명서에 흔한 반복 문장 (머리말/꼬리말/경고문)
+BOILERPLATE = [
+    "경고:전원플러그를뽑은후청소하세요.",
+    "본제품의사양은품질개선을위해예고없이변경될수있습니다.",
+    "고객센터1588-0000으로문의하세요.",
+]
+SUBJECTS = ["세탁기", "건조기", "필터", "배수호스", "세제통", "도어", "전원버튼", "급수밸브"]
+PREDICATES = ["를정기적으로점검해야합니다.", "가정상적으로작동하지않으면서비스센터에연락하세요.",
+              "의온도는40도이하로설정하는것이좋습니다.", "은사용후반드시건조시켜주십시오.",
+              "에이물질이끼면소음이발생할수있습니다."]
+
+
+def make_corpus(seed=0):
+    """띄어쓰기 없는 한국어 설명서 형태의 합성 페이지 생성"""
+    rng = random.Random(seed)
+    pages = []
+    for page in range(NUM_PAGES):
+        sentences = []
+        for _ in range(SENTENCES_PER_PAGE):
+            if rng.random() < 0.2:
+                sentences.append(rng.choice(BOILERPLATE))
+            else:
+                sentences.append(f"{rng.choice(SUBJECTS)}{rng.choice(PREDICATES)}모델{rng.randint(100, 999)}기준입니다.")
+        pages.append({'page': page + 1, 'text': "".join(sentences)})
+    return pages
+
+
+def count_tokens_per_sentence(pages_content, tokenizer):
+    """기존 방식: 문장마다 encode 호출"""
+    counts = []
+    for page_data in pages_content:
+        for sentence in rag_pipeline.split_into_sentences(page_data['text']):
+            counts.append(len(tokenizer.encode(sentence, add_special_tokens=False)))
+    return counts
+
+
+def chunk_text_per_sentence(pages_content, tokenizer):
+    """기존 청킹 (rag_pipeline.chunk_text 변경 전 구현, 문장마다 encode 호출)"""
+    chunks = []
+
+    def add_chunk(page_num, content, token_count):
+        chunks.append({
+            'id': len(chunks),
+            'page': page_num,
+            'title': content[:50],
+            'content': content,
+            'token_count': token_count
+        })
+
+    for page_data in pages_content:
+        page_num = page_data['page']
+        sentences = rag_pipeline.split_into_sentences(page_data['text'])
+        current_chunk_sentences = []
+        current_tokens = 0
+
+        for sentence in sentences:
+            sentence_token_count = len(tokenizer.encode(sentence, add_special_tokens=False))
+            if sentence_token_count > 100:
+                if current_chunk_sentences:
+                    add_chunk(page_num, " ".join(current_chunk_sentences), current_tokens)
+                    current_chunk_sentences = []
+                    current_tokens = 0
+                add_chunk(page_num, sentence, sentence_token_count)
+                continue
+
+            if current_tokens + sentence_token_count > 100:
+                add_chunk(page_num, " ".join(current_chunk_sentences), current_tokens)
+                current_chunk_sentences = [sentence]
+                current_tokens = sentence_token_count
+            else:
+                current_chunk_sentences.append(sentence)
+                current_tokens += sentence_token_count
+
+        if current_chunk_sentences:
+            add_chunk(page_num, " ".join(current_chunk_sentences), current_tokens)
+
+    return chunks
+
+
+def count_tokens_batched(pages_content, counter):
+    """새 방식: 페이지 단위 배치 + 캐시"""
+    counts = []
+    for page_data in pages_content:
+        counts.extend(counter.count(rag_pipeline.split_into_sentences(page_data['text'])))
+    return counts
+
+
+if __name__ == "__main__":
+    tokenizer = AutoTokenizer.from_pretrained('jhgan/ko-sroberta-multitask')
+    model = SimpleNamespace(tokenizer=tokenizer)
+    pages = make_corpus()
+    num_sentences = sum(len(rag_pipeline.split_into_sentences(p['text'])) for p in pages)
+
+    print("=" * 80)
+    print(f"청킹 토큰화 벤치마크 ({NUM_PAGES}페이지, {num_sentences}문장, fast tokenizer: {tokenizer.is_fast})")
+    print("=" * 80)
+
+    start = time.perf_counter()
+    before = count_tokens_per_sentence(pages, tokenizer)
+    before_sec = time.perf_counter() - start
+
+    counter = rag_pipeline.TokenCounter(tokenizer)
+    start = time.perf_counter()
+    after = count_tokens_batched(pages, counter)
+    after_sec = time.perf_counter() - start
+
+    # 캐시가 채워진 상태에서 같은 문서를 다시 처리 (재업로드)
+    start = time.perf_counter()
+    count_tokens_batched(pages, counter)
+    warm_sec = time.perf_counter() - start
+
+    print(f"  문장별 encode:        {num_sentences / before_sec:10.0f} 문장/초")
+    print(f"  배치 + 캐시 (cold):   {num_sentences / after_sec:10.0f} 문장/초 ({before_sec / after_sec:.1f}x)")
+    print(f"  배치 + 캐시 (warm):   {num_sentences / warm_sec:10.0f} 문장/초 ({before_sec / warm_sec:.1f}x)")
+    print(f"  캐시 통계: {counter.stats()}")
+
+    # 청킹 결과가 기존 방식과 동일한지 확인
+    expected = chunk_text_per_sentence(pages, tokenizer)
+    chunks = rag_pipeline.chunk_text(pages, model, token_counter=rag_pipeline.TokenCounter(tokenizer))
+    print(f"\n청크 수: 기존 {len(expected)}, 새 방식 {len(chunks)}")
+
+    failed = False
+    if before != after:
+        print("오류: 배치 토큰 수가 기존 방식과 다릅니다.", file=sys.stderr)
+        failed = True
+    if chunks != expected:
+        mismatch = next((i for i, (a, b) in enumerate(zip(expected, chunks)) if a != b),
+                        min(len(expected), len(chunks)))
+        print(f"오류: 청킹 결과가 기존 방식과 다릅니다 (청크 {mismatch}번부터).", file=sys.stderr)
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("청킹 결과가 기존 방식과 동일합니다.")
@@ -0,0 +1,92 @@
+# 임베딩 백엔드 벤치마크
+# fp32 torch(기준)와 int8 동적 양자화 / ONNX Runtime 백엔드의 청크 인코딩 속도와
+# 검색 품질 차이(fp32 벡터 대비)를 합성 설명서 코퍼스와 코퍼스에 없는 질문 세트로 비교한다.
+#
+#   python benchmark_embedding.py              # torch, int8, onnx 모두
+#   python benchmark_embedding.py int8         # 기준(torch)과 int8만
+
+import sys
+import time
+import numpy as np
+import faiss
+import rag_pipeline
+from benchmark_chunking import make_corpus, SUBJECTS
+from embedding_backend import EMBEDDING_BACKENDS, load_embedding_model
+
+MODEL_NAME = 'jhgan/ko-sroberta-multitask'
+BATCH_SIZE = 32
+TOP_K = 10
+
+# 코퍼스 문장과 겹치지 않는 질문 (held-out)
+QUESTION_TEMPLATES = ["{}는 어떻게 청소하나요?", "{} 점검 주기가 궁금해요", "{}에서 소리가 나요",
+                      "{} 고장 시 어디에 연락하나요?"]
+
+
+def make_queries():
+    return [template.format(subject) for subject in SUBJECTS for template in QUESTION_TEMPLATES]
+
+
+def encode_timed(model, texts):
+    start = time.perf_counter()
+    vectors = np.asarray(model.encode(texts, batch_size=BATCH_SIZE, show_progress_bar=False), dtype='float32')
+    return vectors, time.perf_counter() - start
+
+
+def top_k(corpus_vectors, query_vectors, k):
+    index = faiss.IndexFlatL2(corpus_vectors.shape[1])
+    index.add(corpus_vectors)
+    return index.search(query_vectors, k)[1]
+
+
+def overlap(reference, result):
+    """질의별 상위 k개 중 기준 결과와 겹치는 비율의 평균 (recall@k)"""
+    return float(np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(reference, result)]))
+
+
+def cosine_rows(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+if __name__ == "__main__":
+    backends = ['torch'] + [b for b in (sys.argv[1:] or EMBEDDING_BACKENDS) if b != 'torch']
+
+    reference_model = load_embedding_model(MODEL_NAME, backend='torch')
+    chunks = rag_pipeline.chunk_text(make_corpus(), reference_model)
+    texts = [chunk['content'] for chunk in chunks]
+    queries = make_queries()
+
+    print("=" * 80)
+    print(f"임베딩 백엔드 벤치마크 ({len(texts)}청크, 질문 {len(queries)}개, batch_size={BATCH_SIZE})")
+    print("=" * 80)
+
+    reference = None
+    for backend in backends:
+        try:
+            start = time.perf_counter()
+            model = reference_model if backend == 'torch' else load_embedding_model(MODEL_NAME, backend=backend)
+            load_sec = time.perf_counter() - start
+        except Exception as e:
+            print(f"  {backend:<6} 건너뜀: {e}")
+            continue
+
+        model.encode(texts[:BATCH_SIZE], batch_size=BATCH_SIZE, show_progress_bar=False)  # 워밍업
+        vectors, encode_sec = encode_timed(model, texts)
+        query_vectors, _ = encode_timed(model, queries)
+        result = top_k(vectors, query_vectors, TOP_K)
+
+        if reference is None:
+            reference = {'vectors': vectors, 'queries': query_vectors, 'result': result, 'sec': encode_sec}
+            print(f"  {backend:<6} {len(texts) / encode_sec:8.1f} 청크/초 (로드 {load_sec:.1f}초, 기준)")
+            continue
+
+        drift = cosine_rows(reference['vectors'], vectors)
+        # 저장된 fp32 인덱스를 그대로 두고 질의만 새 백엔드로 인코딩하는 경우
+        mixed = top_k(reference['vectors'], query_vectors, TOP_K)
+        print(f"  {backend:<6} {len(texts) / encode_sec:8.1f} 청크/초 (로드 {load_sec:.1f}초, "
+              f"{reference['sec'] / encode_sec:.2f}x)")
+        print(f"         fp32 대비 코사인 유사도: 평균 {drift.mean():.4f} / 최소 {drift.min():.4f}")
+        print(f"         recall@{TOP_K} (fp32 결과 기준): 코퍼스+질의 {overlap(reference['result'], result):.3f}, "
+              f"질의만 {overlap(reference['result'], mixed):.3f}")
+        print(f"         top-1 일치율: {float(np.mean(reference['result'][:, 0] == result[:, 0])):.3f}")
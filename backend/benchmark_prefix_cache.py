@@ -0,0 +1,74 @@
+# 프롬프트 접두어 KV 캐시 벤치마크
+# 매 요청마다 프롬프트 전체를 평가하는 기존 방식과
+# 고정 지시문의 KV 상태를 복원하고 나머지만 평가하는 방식의 프롬프트 처리 시간을 비교한다.
+# (max_tokens=1로 생성해 시간 대부분이 프롬프트 평가가 되도록 한다)
+
+import os
+import statistics
+import time
+from llama_cpp import Llama
+import prompts
+from llm_prefix_cache import PromptPrefixCache
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(os.path.dirname(BASE_DIR), 'data', 'models', 'downloaded_models',
+                          'A.X-4.0-Light-Q4_K_M.gguf')
+
+NUM_REQUESTS = 10
+
+SAMPLE_CONTEXT = """[페이지 12]
+필터는 한 달에 한 번 분리하여 흐르는 물에 세척하십시오. 세척 후에는 완전히 건조시킨 뒤 다시 장착합니다.
+
+[페이지 13]
+배수 호스가 꺾이거나 눌리면 배수 오류(OE)가 표시될 수 있습니다. 호스 상태를 확인하세요.
+"""
+QUESTIONS = ["필터는 얼마나 자주 청소하나요?", "배수 오류가 나면 어떻게 하나요?",
+             "세척 후 필터를 바로 장착해도 되나요?", "OE 오류는 무슨 뜻인가요?"]
+
+
+def make_requests():
+    """/chat, /generate 프롬프트를 번갈아 생성 (접두어가 매번 바뀌는 최악의 경우)"""
+    requests = []
+    for i in range(NUM_REQUESTS):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        build = prompts.chat_prompt if i % 2 == 0 else prompts.generate_prompt
+        requests.append(build(SAMPLE_CONTEXT, question))
+    return requests
+
+
+def time_requests(llm, requests, prefix_cache=None):
+    timings = []
+    for prompt in requests:
+        start = time.perf_counter()
+        if prefix_cache is None:
+            llm.reset()  # 이전 요청의 KV 재사용 없이 전체 평가
+        else:
+            prefix_cache.prepare(llm, prompt)
+        llm(prompt, max_tokens=1, temperature=0.0)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+if __name__ == "__main__":
+    llm = Llama(model_path=MODEL_PATH, n_ctx=2048, n_threads=4, n_gpu_layers=0, verbose=False)
+    requests = make_requests()
+
+    prefix_cache = PromptPrefixCache(prompts.PROMPT_PREFIXES)
+    prefix_cache.warm([llm])
+
+    print("=" * 80)
+    print(f"프롬프트 접두어 KV 캐시 벤치마크 ({NUM_REQUESTS}요청, /chat·/generate 번갈아)")
+    print("=" * 80)
+    for name, info in prefix_cache.stats()['prefixes'].items():
+        print(f"  접두어 {name:8s}: {info['tokens']:4d} 토큰, 평가 {info['eval_ms']:8.1f} ms, "
+              f"상태 {info['state_bytes'] / 1024 ** 2:.1f} MB")
+
+    baseline = time_requests(llm, requests)
+    cached = time_requests(llm, requests, prefix_cache)
+
+    base_ms = statistics.median(baseline)
+    cached_ms = statistics.median(cached)
+    print(f"\n  전체 평가 (기존):     중앙값 {base_ms:8.1f} ms")
+    print(f"  접두어 복원 후 평가:  중앙값 {cached_ms:8.1f} ms ({base_ms / cached_ms:.1f}x, "
+          f"요청당 {base_ms - cached_ms:.1f} ms 절약)")
+    print(f"  캐시 통계: {prefix_cache.stats()}")
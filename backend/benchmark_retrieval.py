@@ -0,0 +1,425 @@
+# 검색 품질/지연 시간 벤치마크
+# 로컬 코퍼스(합성 설명서 또는 --pdf로 지정한 PDF)로 수집 → 검색 → 답변 경로를 단계별로 측정하고
+# 결과를 JSON으로 남겨 실행 간 회귀를 비교한다. 네트워크 없이 실행된다.
+# - 추출: pages/sec (합성 모드는 같은 쪽수의 PDF를 만들어 pdfplumber로 추출)
+# - 청킹: sentences/sec,  임베딩: chunks/sec (LengthBucketEncoder)
+# - 인덱스 종류별 구축 시간, 검색 방식별 p50/p95/p99와 recall@k/MRR (정답이 표시된 질의)
+# - 답변: 검색 + 문맥 구성 + 스텁 LLM (모델 없이 프롬프트 경로만 측정)
+# 임베딩 모델은 로컬 HF 캐시에서만 읽고(HF_HUB_OFFLINE), 없으면 해시 임베딩으로 대신한다.
+#
+#   python benchmark_retrieval.py --output result.json
+#   python benchmark_retrieval.py --baseline result.json                 # 이전 결과와 비교 (회귀 시 종료 코드 1)
+#   python benchmark_retrieval.py --pdf manual.pdf --queries queries.json
+#
+# queries.json: [{"query": "필터 청소 주기", "answer": "한 달에 한 번"}, ...]
+#   (answer 문자열을 포함한 청크를 정답으로 본다)
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import zlib
+
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+
+import numpy as np
+import faiss
+import rag_pipeline
+import prompts
+import context_packer
+from index_manager import IndexManager, RETRIEVAL_MODES
+from sparse_index import SparseIndex
+from embedding_backend import load_embedding_model
+
+MODEL_NAME = 'jhgan/ko-sroberta-multitask'
+LLM_N_CTX = 2048          # app.py와 같은 값
+CHAT_MAX_TOKENS = 400
+CONTEXT_SAFETY_TOKENS = 16
+
+# 합성 설명서: 모델 코드마다 부품/항목 값이 다른 사실 문장 + 반복 문장
+SUBJECTS = ["세탁기", "건조기", "필터", "배수 호스", "세제통", "도어", "전원 버튼", "급수 밸브"]
+ATTRIBUTES = [("점검 주기", ["매주", "한 달에 한 번", "석 달에 한 번", "6개월마다", "1년마다"]),
+              ("권장 온도", ["20도", "30도", "40도", "60도", "90도"]),
+              ("교체 시기", ["1년", "2년", "3년", "5년", "고장 시"]),
+              ("오류 코드", ["OE", "IE", "UE", "DE", "LE"])]
+BOILERPLATE = ["경고: 전원 플러그를 뽑은 후 청소하세요.",
+               "본 제품의 사양은 품질 개선을 위해 예고 없이 변경될 수 있습니다.",
+               "고객센터 1588-0000으로 문의하세요."]
+QUESTION_TEMPLATES = ["{code} {subject} {attribute} 알려줘", "{code} 모델 {subject}의 {attribute}는?"]
+
+
+def make_labelled_corpus(num_pages, facts_per_page=12, seed=0):
+    """
+    합성 설명서 페이지와 정답이 표시된 질의
+    사실 문장은 '모델 {코드}의 {부품} {항목}은 {값}입니다.' 형태이며, 질의 정답은 이 문장 앞부분이다.
+    """
+    rng = random.Random(seed)
+    pages, queries = [], []
+    for page in range(num_pages):
+        code = f"WX-{page + 1:04d}"
+        sentences = []
+        for _ in range(facts_per_page):
+            subject = rng.choice(SUBJECTS)
+            attribute, values = rng.choice(ATTRIBUTES)
+            key = f"모델 {code}의 {subject} {attribute}"
+            sentences.append(f"{key}은 {rng.choice(values)}입니다.")
+            if rng.random() < 0.3:
+                sentences.append(rng.choice(BOILERPLATE))
+            if rng.random() < 0.15:
+                template = rng.choice(QUESTION_TEMPLATES)
+                queries.append({'query': template.format(code=code, subject=subject, attribute=attribute),
+                                'answer': key})
+        pages.append({'page': page + 1, 'text': " ".join(sentences)})
+    return pages, queries
+
+
+def write_synthetic_pdf(path, num_pages, lines_per_page=40):
+    """
+    추출 측정용 PDF (표준 Helvetica 글꼴로 영문 본문만, 외부 패키지 없이 직접 기록)
+    """
+    def escape(text):
+        return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in range(num_pages):
+        lines = [f"Model WX-{page + 1:04d} line {i}: clean the filter once a month and check the drain hose."
+                 for i in range(lines_per_page)]
+        stream = "BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"({escape(line)}) Tj T*" for line in lines) + " ET"
+        data = stream.encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(data), data))
+        objects.append(("<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                        f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>").encode())
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {num_pages} >>".encode()
+
+    with open(path, 'wb') as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+class CharTokenizer:
+    """HF tokenizer 호출 형식을 흉내 낸 글자 단위 토크나이저 (해시 임베딩용)"""
+
+    def __call__(self, texts, add_special_tokens=False, **kwargs):
+        return {'input_ids': [[ord(c) for c in text if not c.isspace()] for text in texts]}
+
+
+class HashingEncoder:
+    """
+    오프라인 대체 임베딩 (글자 bigram 특징 해싱, 결정적)
+    실제 모델보다 품질은 낮지만 같은 인터페이스로 검색/지연 경로를 측정할 수 있다.
+    """
+
+    def __init__(self, dimension=256):
+        self.dimension = dimension
+        self.tokenizer = CharTokenizer()
+        self.max_seq_length = 128
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False, **kwargs):
+        vectors = np.zeros((len(texts), self.dimension), dtype='float32')
+        for row, text in enumerate(texts):
+            text = ''.join(text.split())
+            for i in range(len(text) - 1):
+                vectors[row, zlib.crc32(text[i:i + 2].encode('utf-8')) % self.dimension] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.clip(norms, 1e-9, None)
+
+
+class StubLLM:
+    """llama_cpp.Llama 대신 쓰는 스텁 (토큰 수는 UTF-8 바이트 / 3으로 추정, 고정 답변 반환)"""
+
+    ANSWER = "문서에 따르면 해당 항목은 설명서의 안내를 따르면 됩니다."
+
+    def tokenize(self, text, add_bos=False, special=True):
+        return [0] * (len(text) // 3 + 1)
+
+    def __call__(self, prompt, max_tokens=16, **kwargs):
+        return {'choices': [{'text': self.ANSWER, 'finish_reason': 'stop'}]}
+
+
+def percentiles(values_ms):
+    values = np.asarray(values_ms, dtype='float64')
+    if not len(values):
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'mean_ms': None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50_ms': round(float(p50), 3), 'p95_ms': round(float(p95), 3),
+            'p99_ms': round(float(p99), 3), 'mean_ms': round(float(values.mean()), 3)}
+
+
+def relevant_ids(manager, queries):
+    """질의별 정답 청크 ID 집합 (answer 문자열을 포함한 청크)"""
+    chunks = list(manager.chunks.values())
+    return [{chunk['id'] for chunk in chunks if query['answer'] in chunk['content']} for query in queries]
+
+
+def quality(ids, relevant, k):
+    """recall@k와 MRR (정답 청크가 없는 질의는 제외)"""
+    recalls, reciprocal_ranks = [], []
+    for row, answers in zip(ids, relevant):
+        if not answers:
+            continue
+        row = [int(i) for i in row[:k] if i >= 0]
+        recalls.append(len(answers.intersection(row)) / len(answers))
+        rank = next((position for position, chunk_id in enumerate(row, start=1) if chunk_id in answers), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    if not recalls:
+        return {f'recall@{k}': None, 'mrr': None, 'labelled_queries': 0}
+    return {f'recall@{k}': round(float(np.mean(recalls)), 4), 'mrr': round(float(np.mean(reciprocal_ranks)), 4),
+            'labelled_queries': len(recalls)}
+
+
+def bench_extraction(pdf_paths, workers):
+    pages, start = [], time.perf_counter()
+    for path in pdf_paths:
+        pages.extend(rag_pipeline.iter_pdf_pages(path, workers=workers))
+    seconds = time.perf_counter() - start
+    return pages, {'pages': len(pages), 'seconds': round(seconds, 4),
+                   'pages_per_sec': round(len(pages) / seconds, 2) if seconds else None}
+
+
+def bench_chunking(pages, model):
+    num_sentences = sum(len(rag_pipeline.split_into_sentences(page['text'])) for page in pages)
+    counter = rag_pipeline.TokenCounter(model.tokenizer)
+    start = time.perf_counter()
+    chunks = rag_pipeline.chunk_text(pages, model, token_counter=counter)
+    seconds = time.perf_counter() - start
+    return chunks, {'sentences': num_sentences, 'chunks': len(chunks), 'seconds': round(seconds, 4),
+                    'sentences_per_sec': round(num_sentences / seconds, 2) if seconds else None}
+
+
+def bench_embedding(chunks, model):
+    encoder = rag_pipeline.LengthBucketEncoder(model)
+    encoder.encode([chunk['content'] for chunk in chunks[:8]])  # 워밍업
+    start = time.perf_counter()
+    embeddings = rag_pipeline.embed_chunks(chunks, encoder)
+    seconds = time.perf_counter() - start
+    return embeddings, {'chunks': len(chunks), 'dimension': int(embeddings.shape[1]), 'seconds': round(seconds, 4),
+                        'chunks_per_sec': round(len(chunks) / seconds, 2) if seconds else None,
+                        'padding_overhead': encoder.stats()['padding_overhead']}
+
+
+def bench_index(index_type, chunks, embeddings, model, queries, k, modes, repeat=3):
+    """인덱스 구축 시간 + 검색 방식별 지연 시간/품질"""
+    manager = IndexManager(index_type=index_type)
+    start = time.perf_counter()
+    manager.add_document('benchmark', chunks, embeddings)  # BM25 세그먼트 생성 포함
+    build_seconds = time.perf_counter() - start
+    # BM25 역색인만 따로 만드는 시간 (참고용)
+    start = time.perf_counter()
+    SparseIndex.build(range(len(chunks)), (chunk['content'] for chunk in chunks))
+    sparse_seconds = time.perf_counter() - start
+
+    texts = [query['query'] for query in queries]
+    query_embeddings = np.asarray(model.encode(texts), dtype='float32')
+    relevant = relevant_ids(manager, queries)
+    result = {'built_index_type': manager.built_index_type, 'build_seconds': round(build_seconds, 4),
+              'sparse_build_seconds': round(sparse_seconds, 4), 'modes': {}}
+
+    for mode in modes:
+        manager.retrieve(query_embeddings[:1], texts[:1], k, mode=mode)  # 워밍업
+        search_ms, query_ms = [], []
+        # 짧은 지연 시간은 흔들림이 크므로 질의 세트를 repeat번 반복해 분포를 잰다
+        for _ in range(repeat):
+            rows = []
+            for i, text in enumerate(texts):
+                start = time.perf_counter()
+                _, ids = manager.retrieve(query_embeddings[i:i + 1], [text], k, mode=mode)
+                search_ms.append((time.perf_counter() - start) * 1000)
+                rows.append(ids[0])
+            # 질의 인코딩 포함 (요청 하나 단위)
+            for text in texts:
+                start = time.perf_counter()
+                manager.retrieve(np.asarray(model.encode([text]), dtype='float32'), [text], k, mode=mode)
+                query_ms.append((time.perf_counter() - start) * 1000)
+        result['modes'][mode] = dict(
+            {'search': percentiles(search_ms), 'search_with_encoding': percentiles(query_ms)},
+            **quality(rows, relevant, k)
+        )
+    return manager, result
+
+
+def bench_answer(manager, model, queries, mode, llm):
+    """/chat 경로: 질의 인코딩 + 검색 5개 + 문맥 구성 + 프롬프트 + 스텁 LLM"""
+    def count_tokens(text):
+        return len(llm.tokenize(text.encode('utf-8'), add_bos=False, special=True))
+
+    timings, context_tokens = [], []
+    for query in queries:
+        start = time.perf_counter()
+        text = query['query']
+        _, ids = manager.retrieve(np.asarray(model.encode([text]), dtype='float32'), [text], 5, mode=mode)
+        chunks = [chunk for chunk in (manager.get_chunk(i) for i in ids[0] if i >= 0) if chunk]
+        overhead = count_tokens(prompts.chat_prompt("", text)) + 1
+        budget = LLM_N_CTX - CHAT_MAX_TOKENS - overhead - CONTEXT_SAFETY_TOKENS
+        context, _, report = context_packer.pack_context(chunks, count_tokens, max(budget, 0))
+        llm(prompts.chat_prompt(context, text), max_tokens=CHAT_MAX_TOKENS)
+        timings.append((time.perf_counter() - start) * 1000)
+        context_tokens.append(report['context_tokens'])
+    return dict(percentiles(timings), mode=mode, llm='stub',
+                mean_context_tokens=round(float(np.mean(context_tokens)), 1) if context_tokens else None)
+
+
+def load_model(args):
+    if args.hashing:
+        return HashingEncoder(), 'hashing'
+    try:
+        return load_embedding_model(args.model, backend=args.backend), f"{args.model}+{args.backend}"
+    except Exception as e:
+        print(f"임베딩 모델을 로컬에서 찾을 수 없어 해시 임베딩으로 대신합니다: {e}", file=sys.stderr)
+        return HashingEncoder(), 'hashing'
+
+
+def flatten(data, prefix=''):
+    """중첩 dict의 숫자 값을 'a.b.c' 키로 펼침"""
+    items = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            items.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            items[name] = value
+    return items
+
+
+def higher_is_better(name):
+    return name.endswith('_per_sec') or '.recall@' in name or name.endswith('.mrr')
+
+
+def compare(baseline, current, tolerance, min_ms=0.1):
+    """
+    이전 결과와 비교해 변화율 출력
+    지연 시간(_ms)은 변화율과 함께 min_ms 이상 차이 날 때만 회귀로 본다.
+
+    Returns:
+        회귀(tolerance보다 나빠진) 지표 이름 목록
+    """
+    before, after = flatten(baseline['metrics']), flatten(current['metrics'])
+    regressions = []
+    print(f"\n이전 결과 대비 (허용 {tolerance:.0%}):")
+    for name in sorted(set(before) & set(after)):
+        if not (higher_is_better(name) or name.endswith('_ms') or name.endswith('seconds')):
+            continue
+        old, new = before[name], after[name]
+        if not old:
+            continue
+        change = (new - old) / abs(old)
+        worse = -change if higher_is_better(name) else change
+        mark = ""
+        if worse > tolerance and not (name.endswith('_ms') and abs(new - old) < min_ms):
+            mark = "  ← 회귀"
+            regressions.append(name)
+        print(f"  {name:<60} {old:>12.4g} -> {new:>12.4g} ({change:+.1%}){mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="검색 품질/지연 시간 벤치마크")
+    parser.add_argument('--pdf', action='append', default=[], help="합성 코퍼스 대신 사용할 PDF (여러 번 지정 가능)")
+    parser.add_argument('--queries', help="정답이 표시된 질의 JSON ([{query, answer}])")
+    parser.add_argument('--pages', type=int, default=100, help="합성 코퍼스 페이지 수")
+    parser.add_argument('--model', default=MODEL_NAME)
+    parser.add_argument('--backend', default='torch')
+    parser.add_argument('--hashing', action='store_true', help="모델 대신 해시 임베딩 사용")
+    parser.add_argument('--index-types', default='flat,hnsw')
+    parser.add_argument('--modes', default=','.join(RETRIEVAL_MODES))
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=1, help="PDF 추출 프로세스 수")
+    parser.add_argument('--repeat', type=int, default=3, help="지연 시간 측정 시 질의 세트 반복 횟수")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="결과 JSON 경로 (없으면 표준 출력)")
+    parser.add_argument('--baseline', help="비교할 이전 결과 JSON")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="회귀로 볼 변화율")
+    parser.add_argument('--min-ms', type=float, default=0.1, help="회귀로 볼 최소 지연 시간 차이 (ms)")
+    args = parser.parse_args()
+
+    model, embedder = load_model(args)
+    index_types = [name for name in args.index_types.split(',') if name]
+    modes = [name for name in args.modes.split(',') if name]
+
+    metrics = {}
+    if args.pdf:
+        pages, metrics['extraction'] = bench_extraction(args.pdf, args.workers)
+        source = 'pdf'
+    else:
+        pages, synthetic_queries = make_labelled_corpus(args.pages, seed=args.seed)
+        with tempfile.TemporaryDirectory() as tmp:
+            pdf_path = os.path.join(tmp, 'synthetic.pdf')
+            write_synthetic_pdf(pdf_path, args.pages)
+            _, metrics['extraction'] = bench_extraction([pdf_path], args.workers)
+        source = 'synthetic'
+
+    chunks, metrics['chunking'] = bench_chunking(pages, model)
+    embeddings, metrics['embedding'] = bench_embedding(chunks, model)
+
+    if args.queries:
+        with open(args.queries, 'r', encoding='utf-8') as f:
+            queries = json.load(f)
+    elif not args.pdf:
+        queries = synthetic_queries
+    else:
+        # 정답 질의가 없으면 청크 앞부분으로 찾는 known-item 질의를 만든다
+        rng = random.Random(args.seed)
+        sample = rng.sample(chunks, min(100, len(chunks)))
+        queries = [{'query': chunk['content'][:30], 'answer': chunk['content'][:30]} for chunk in sample]
+
+    metrics['index'] = {}
+    manager = None
+    for index_type in index_types:
+        manager, metrics['index'][index_type] = bench_index(index_type, chunks, embeddings, model,
+                                                            queries, args.k, modes, args.repeat)
+    if manager is not None:
+        metrics['answer'] = bench_answer(manager, model, queries, 'hybrid' if 'hybrid' in modes else modes[0],
+                                         StubLLM())
+
+    result = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'faiss': getattr(faiss, '__version__', None),
+            'embedder': embedder,
+            'source': source,
+            'pages': len(pages),
+            'queries': len(queries),
+            'k': args.k,
+            'repeat': args.repeat,
+            'seed': args.seed
+        },
+        'metrics': metrics
+    }
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"결과 저장: {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('embedder') != embedder or baseline['meta'].get('source') != source:
+            print("주의: 이전 결과와 임베딩 모델 또는 코퍼스가 다릅니다.", file=sys.stderr)
+        if compare(baseline, result, args.tolerance, args.min_ms):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
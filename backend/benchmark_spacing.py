@@ -0,0 +1,128 @@
+# 한국어 띄어쓰기 보정 벤치마크
+# test_spacing.py / compare_spacing.py의 띄어쓰기 없는 예문으로 처리량(MB/s)을 측정한다.
+# - 규칙 기반: 기존 방식(호출마다 re.sub 21패스 + 콜백)과 spacing_util의 미리 컴파일한 패스,
+#   여러 텍스트를 한 번에 처리하는 add_basic_spacing_many를 비교 (결과가 같은지도 확인)
+# - 모델 기반: PyKoSpacing이 설치되어 있으면 텍스트별 호출과 배치 예측을 비교
+#
+#   python benchmark_spacing.py
+
+import importlib.util
+import re
+import time
+from spacing_util import add_basic_spacing, add_basic_spacing_many, add_spacing_to_text, add_spacing_to_texts
+
+# test_spacing.py, compare_spacing.py 예문
+SAMPLE_TEXTS = [
+    "시민들의오락을위해건설한곳이다.관중석계단의돌들은로마시민들이주워다집짓는데사용하고자부심을가졌다고하는데,지금은형체조차없다.",
+    "양쪽끝에나무가한그루씩서있으며대전차경기가열리면이나무들을열바퀴돌아야했다고한다.",
+    "영화<냉정과열정사이>의촬영지이며<벤허>에서전차를몰고경주하는장면의모티프가된곳이다.",
+]
+REPEAT = 3000        # 규칙 기반 입력: 예문 x REPEAT개 (문장 단위 호출)
+MODEL_REPEAT = 20    # 모델 기반 입력
+
+
+def add_basic_spacing_per_pass(text):
+    """
+    기존 방식 (호출마다 re.sub 21패스, 조사 규칙 일부는 콜백)
+    주요 조사와 어미 패턴을 인식하여 단어 경계 추정
+    """
+    if not text or len(text.strip()) == 0:
+        return text
+    
+    # 이미 띄어쓰기가 충분히 있는 경우 (전체 길이의 10% 이상이 공백)
+    space_ratio = text.count(' ') / len(text) if len(text) > 0 else 0
+    if space_ratio > 0.1:
+        return text
+    
+    result = text
+    
+    # 1. 문장 부호 뒤에 띄어쓰기
+    result = re.sub(r'([.!?])([가-힣A-Za-z0-9])', r'\1 \2', result)
+    result = re.sub(r'([,;:])([가-힣A-Za-z0-9])', r'\1 \2', result)
+    
+    # 2. 한국어 조사 및 어미 패턴
+    # 주격 조사: 이, 가
+    result = re.sub(r'([가-힣])([이가])([가-힣])', lambda m: m.group(1) + m.group(2) + ' ' + m.group(3) if m.group(3) not in '가나다라마바사아자차카타파하' else m.group(0), result)
+    
+    # 목적격 조사: 을, 를
+    result = re.sub(r'([가-힣])([을를])([가-힣])', lambda m: m.group(1) + m.group(2) + ' ' + m.group(3), result)
+    
+    # 관형격 조사: 의
+    result = re.sub(r'([가-힣])의([가-힣])', r'\1의 \2', result)
+    
+    # 부사격 조사: 에, 에서, 에게, 로, 으로
+    result = re.sub(r'([가-힣])(에서|에게|에도|에만|로서|으로)([가-힣])', r'\1\2 \3', result)
+    result = re.sub(r'([가-힣])([에로])([가-힣])', lambda m: m.group(1) + m.group(2) + ' ' + m.group(3), result)
+    
+    # 접속 조사: 와, 과, 하고
+    result = re.sub(r'([가-힣])(와|과|하고)([가-힣])', r'\1\2 \3', result)
+    
+    # 보조사: 은, 는, 도, 만, 까지
+    result = re.sub(r'([가-힣])([은는도만])([가-힣])', lambda m: m.group(1) + m.group(2) + ' ' + m.group(3), result)
+    result = re.sub(r'([가-힣])(까지)([가-힣])', r'\1\2 \3', result)
+    
+    # 3. 용언 어미
+    # -다 (종결어미)
+    result = re.sub(r'([가-힣])(다)([\.!?])', r'\1\2\3 ', result)
+    result = re.sub(r'([가-힣])(했다|됐다|였다|이다)([\.!?,])', r'\1\2\3 ', result)
+    
+    # -고, -며, -면서 (연결어미)
+    result = re.sub(r'([가-힣])(고|며|면서|지만|는데)([가-힣])', r'\1\2 \3', result)
+    
+    # -한, -된, -인 (관형사형 어미)
+    result = re.sub(r'([가-힣])(한|된|인|은|를)([가-힣])', lambda m: m.group(1) + m.group(2) + ' ' + m.group(3) if len(m.group(1)) > 1 else m.group(0), result)
+    
+    # 4. 숫자와 한글 사이
+    result = re.sub(r'([0-9])([가-힣])', r'\1 \2', result)
+    result = re.sub(r'([가-힣])([0-9])', r'\1 \2', result)
+    
+    # 5. 영문자와 한글 사이
+    result = re.sub(r'([A-Za-z])([가-힣])', r'\1 \2', result)
+    result = re.sub(r'([가-힣])([A-Za-z])', r'\1 \2', result)
+    
+    # 6. 괄호 처리
+    result = re.sub(r'([가-힣])(<|>|\(|\)|\[|\])([가-힣])', r'\1\2 \3', result)
+    result = re.sub(r'(<|>|\(|\)|\[|\])([가-힣])', r'\1 \2', result)
+    
+    # 연속된 공백 제거
+    result = re.sub(r'\s+', ' ', result)
+    
+    return result.strip()
+
+
+
+def throughput(func, texts):
+    """(결과, MB/s)"""
+    size = sum(len(text.encode('utf-8')) for text in texts)
+    start = time.perf_counter()
+    results = func(texts)
+    return results, size / (time.perf_counter() - start) / 1e6
+
+
+if __name__ == "__main__":
+    texts = SAMPLE_TEXTS * REPEAT
+    size_mb = sum(len(text.encode('utf-8')) for text in texts) / 1e6
+
+    print("=" * 80)
+    print(f"띄어쓰기 보정 벤치마크 (예문 {len(SAMPLE_TEXTS)}개 x {REPEAT}, {size_mb:.1f}MB)")
+    print("=" * 80)
+
+    before, before_mbps = throughput(lambda items: [add_basic_spacing_per_pass(t) for t in items], texts)
+    after, after_mbps = throughput(lambda items: [add_basic_spacing(t) for t in items], texts)
+    batched, batched_mbps = throughput(add_basic_spacing_many, texts)
+    assert before == after == batched, "띄어쓰기 결과가 기존 방식과 다릅니다."
+
+    print(f"  규칙 기반 (기존, 텍스트별):   {before_mbps:6.2f} MB/s")
+    print(f"  규칙 기반 (컴파일, 텍스트별): {after_mbps:6.2f} MB/s ({after_mbps / before_mbps:.1f}x)")
+    print(f"  규칙 기반 (컴파일, 배치):     {batched_mbps:6.2f} MB/s ({batched_mbps / before_mbps:.1f}x)")
+
+    model_texts = SAMPLE_TEXTS * MODEL_REPEAT
+    if importlib.util.find_spec('pykospacing') is None:
+        print("  모델 기반 건너뜀: pykospacing이 설치되지 않았습니다.")
+    else:
+        add_spacing_to_texts(SAMPLE_TEXTS)  # 모델 로드 + 워밍업
+        single, single_mbps = throughput(lambda items: [add_spacing_to_text(t) for t in items], model_texts)
+        batch, batch_mbps = throughput(add_spacing_to_texts, model_texts)
+        print(f"  모델 기반 (텍스트별):          {single_mbps:6.3f} MB/s")
+        print(f"  모델 기반 (배치):              {batch_mbps:6.3f} MB/s ({batch_mbps / single_mbps:.1f}x)")
+        print(f"  텍스트별/배치 결과 일치율: {sum(a == b for a, b in zip(single, batch)) / len(batch):.3f}")
@@ -0,0 +1,219 @@
+# 이름 있는 코퍼스 컬렉션 관리
+# 한 서버에서 여러 팀이 각자의 설명서 묶음(컬렉션)을 쓰도록 컬렉션마다 따로 IndexManager를 둔다.
+# 임베딩 모델과 LLM은 모든 컬렉션이 함께 쓴다.
+#
+# data/corpus/                 기본 컬렉션 (default, 기존 저장 위치 그대로)
+# data/collections/<이름>/     그 밖의 컬렉션 (CorpusStore 세대 디렉터리)
+#
+# - 메모리에는 최근에 쓴 컬렉션만 LRU로 유지 (max_loaded개, max_bytes 바이트 이하)
+# - 밀려난 컬렉션은 디스크 세대만 남기고 버리며, 다음 요청 때 manifest만 읽어 다시 연다
+#   (저장되지 않은 변경은 잠금 밖에서 저장하고, 저장이 끝날 때까지는 메모리의 manager를 그대로 돌려준다)
+# - 수집/삭제/재구축처럼 코퍼스를 바꾸는 작업은 use()로 고정(pin)해 도중에 밀려나지 않게 한다
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from index_manager import IndexManager
+from corpus_store import CorpusStore, CorpusSnapshot, CURRENT_FILE
+
+DEFAULT_COLLECTION = 'default'
+
+_COLLECTION_NAME = re.compile(r'^[0-9A-Za-z_-]{1,64}$')
+
+
+def validate_name(name):
+    if not _COLLECTION_NAME.match(name or ''):
+        raise ValueError(f"컬렉션 이름은 영문/숫자/-/_ 1~64자여야 합니다: {name}")
+    return name
+
+
+class CollectionRegistry:
+    """
+    컬렉션 이름 -> IndexManager (LRU)
+
+    Args:
+        root: 기본 컬렉션 외의 컬렉션을 저장할 디렉터리
+        default_root: 기본 컬렉션 저장 디렉터리
+        index_type: 새 컬렉션의 인덱스 종류
+        max_loaded: 메모리에 유지할 최대 컬렉션 수
+        max_bytes: 메모리에 올라간 컬렉션 크기 합의 상한 (None이면 제한 없음)
+    """
+
+    def __init__(self, root, default_root, index_type='flat', max_loaded=4, max_bytes=None):
+        self.root = root
+        self.default_root = default_root
+        self.index_type = index_type
+        self.max_loaded = max_loaded
+        self.max_bytes = max_bytes
+        self.lock = threading.RLock()
+        self.loaded = OrderedDict()  # 이름 -> IndexManager (오래 안 쓴 순)
+        self.pins = {}               # 이름 -> 사용 중인 작업 수
+        self.persisting = {}         # 이름 -> [IndexManager, 진행 중인 저장 수] (밀려난 뒤 저장 중)
+        self.loads = 0
+        self.evictions = 0
+
+    def store(self, name):
+        validate_name(name)
+        if name == DEFAULT_COLLECTION:
+            return CorpusStore(self.default_root)
+        return CorpusStore(os.path.join(self.root, name))
+
+    def get(self, name, create=False):
+        """
+        컬렉션의 IndexManager (없으면 create=True일 때만 빈 컬렉션 생성, 아니면 None)
+        메모리에 없으면 디스크 세대를 연다 (manifest만 읽고 인덱스/청크는 지연 로드).
+        """
+        with self.lock:
+            manager, evicted = self._get(name, create)
+        self._persist_evicted(evicted)
+        return manager
+
+    def _get(self, name, create):
+        """get()의 본체 (lock 안에서 호출, 밀려난 컬렉션 목록을 함께 반환)"""
+        store = self.store(name)
+        manager = self.loaded.get(name)
+        if manager is not None:
+            self.loaded.move_to_end(name)
+            return manager, []
+        if name in self.persisting:
+            # 밀려난 뒤 아직 저장 중: 디스크 세대는 낡았으므로 메모리의 manager를 다시 올린다
+            manager = self.persisting[name][0]
+        else:
+            snapshot = store.open()
+            if snapshot is not None:
+                manager = IndexManager.open(snapshot)
+                self.loads += 1
+            elif create:
+                manager = IndexManager(index_type=self.index_type)
+            else:
+                return None, []
+        self.loaded[name] = manager
+        return manager, self._evict(keep=name)
+
+    def put(self, name, manager):
+        """이미 만든 IndexManager를 컬렉션으로 등록 (기존 데이터 가져오기 등)"""
+        self.store(name)
+        with self.lock:
+            self.loaded[name] = manager
+            self.loaded.move_to_end(name)
+            evicted = self._evict(keep=name)
+        self._persist_evicted(evicted)
+
+    @contextmanager
+    def use(self, name, create=False):
+        """코퍼스를 바꾸는 작업 동안 컬렉션을 메모리에 고정"""
+        with self.lock:
+            manager, evicted = self._get(name, create)
+            if manager is not None:
+                self.pins[name] = self.pins.get(name, 0) + 1
+        self._persist_evicted(evicted)
+        if manager is None:
+            raise KeyError(name)
+        try:
+            yield manager
+        finally:
+            with self.lock:
+                self.pins[name] -= 1
+                if self.pins[name] == 0:
+                    del self.pins[name]
+                evicted = self._evict()
+            self._persist_evicted(evicted)
+
+    def persist(self, name, manager):
+        """
+        컬렉션을 새 세대로 저장하고, 청크는 저장된 파일에서 읽도록 다시 연결
+        파일을 쓰는 동안 manager가 바뀌었으면 (version이 다르면) 메모리 내용이 더 새로우므로
+        연결하지 않고 다음 저장에 맡긴다.
+        """
+        snapshot = CorpusSnapshot(self.store(name).save(manager))
+        with manager.lock:
+            if manager.version == snapshot.version:
+                manager.attach(snapshot)
+
+    def _resident_bytes(self):
+        return sum(manager.memory_usage()['resident_bytes'] for manager in self.loaded.values())
+
+    def _over_limit(self):
+        if len(self.loaded) > self.max_loaded:
+            return True
+        return self.max_bytes is not None and self._resident_bytes() > self.max_bytes
+
+    def _evict(self, keep=None):
+        """
+        한도를 넘으면 오래 안 쓴 컬렉션부터 메모리에서 내림 (lock 안에서 호출)
+        내린 컬렉션은 저장이 끝날 때까지 persisting에 남겨 두고 [(이름, manager), ...]로 반환한다.
+        저장은 호출한 쪽이 잠금을 놓은 뒤 _persist_evicted로 한다.
+        """
+        evicted = []
+        while self._over_limit():
+            victim = next(
+                (name for name in self.loaded if name != keep and name not in self.pins),
+                None
+            )
+            if victim is None:
+                break
+            manager = self.loaded.pop(victim)
+            entry = self.persisting.setdefault(victim, [manager, 0])
+            entry[1] += 1
+            evicted.append((victim, manager))
+            self.evictions += 1
+        return evicted
+
+    def _persist_evicted(self, evicted):
+        """밀려난 컬렉션의 저장되지 않은 변경을 디스크에 남김 (registry/manager 잠금 밖에서 호출)"""
+        for name, manager in evicted:
+            try:
+                with manager.lock:
+                    dirty = manager.is_dirty()
+                if dirty:
+                    self.persist(name, manager)
+                print(f"컬렉션 메모리 해제: {name}")
+            except Exception as e:
+                # 저장에 실패하면 변경을 잃지 않도록 다시 메모리에 올려 둔다
+                print(f"컬렉션 저장 실패 ({name}): {e}")
+                with self.lock:
+                    self.loaded.setdefault(name, manager)
+            finally:
+                with self.lock:
+                    entry = self.persisting[name]
+                    entry[1] -= 1
+                    if entry[1] == 0:
+                        del self.persisting[name]
+
+    def names(self):
+        """디스크에 저장되었거나 메모리에 있는 컬렉션 이름"""
+        names = set(self.loaded) | set(self.persisting)
+        if os.path.exists(os.path.join(self.default_root, CURRENT_FILE)):
+            names.add(DEFAULT_COLLECTION)
+        if os.path.isdir(self.root):
+            for name in os.listdir(self.root):
+                if _COLLECTION_NAME.match(name) and os.path.exists(os.path.join(self.root, name, CURRENT_FILE)):
+                    names.add(name)
+        return sorted(names)
+
+    def list(self):
+        """컬렉션 목록 (메모리에 있는 컬렉션은 크기/메모리 사용량 포함)"""
+        with self.lock:
+            collections = []
+            for name in self.names():
+                manager = self.loaded.get(name)
+                info = {'name': name, 'loaded': manager is not None, 'pinned': name in self.pins}
+                if manager is not None:
+                    info['chunk_count'] = len(manager)
+                    info['document_count'] = len(manager.documents)
+                    info['memory'] = manager.memory_usage()
+                collections.append(info)
+            return collections
+
+    def stats(self):
+        with self.lock:
+            return {
+                'loaded': list(self.loaded),
+                'max_loaded': self.max_loaded,
+                'max_bytes': self.max_bytes,
+                'resident_bytes': self._resident_bytes(),
+                'loads': self.loads,
+                'evictions': self.evictions
+            }
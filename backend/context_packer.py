@@ -0,0 +1,124 @@
+# LLM 프롬프트 문맥 구성 (토큰 예산 기반)
+# n_ctx=2048 안에 프롬프트와 답변(max_tokens)이 모두 들어가야 하므로
+# LLM 토크나이저로 청크 토큰 수를 세어 남은 예산 안에서 관련도 순으로 채운다.
+# - 같은 청크/같은 내용은 한 번만 넣음
+# - 같은 문서·같은 페이지의 연속 청크는 하나의 [페이지 n] 블록으로 합침 (머리말 토큰 절약)
+# - 예산에 다 들어가지 않는 청크는 남은 예산이 충분하면 잘라서 넣음
+
+from embedding_cache import normalize_text
+
+
+def _header(page):
+    return f"[페이지 {page}]\n"
+
+
+def _truncate_to_fit(content, count_tokens, max_tokens):
+    """content 앞부분 중 max_tokens 토큰 이하인 가장 긴 부분 (글자 단위 이분 탐색)"""
+    lo, hi = 0, len(content)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(content[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return content[:lo].rstrip()
+
+
+def pack_context(chunks, count_tokens, budget, min_tokens=32):
+    """
+    관련도 순 청크로 토큰 예산 안의 문맥 문자열 생성
+
+    Args:
+        chunks: 관련도 순 청크 dict 목록 (id, page, content, doc_id)
+        count_tokens: 텍스트 -> 토큰 수 (LLM 토크나이저 기준)
+        budget: 문맥에 쓸 수 있는 토큰 수
+        min_tokens: 청크를 잘라서라도 넣을 최소 남은 예산
+
+    Returns:
+        (문맥 문자열, 포함된 청크 목록(관련도 순), 보고서 dict)
+    """
+    selected = {}       # 청크 ID -> {'chunk', 'content', 'rank', 'tokens', 'truncated'}
+    seen_content = set()
+    duplicates, dropped = [], []
+    used = 0
+
+    def adjacent(chunk):
+        for other_id in (chunk['id'] - 1, chunk['id'] + 1):
+            other = selected.get(other_id)
+            if (other and not other['truncated'] and other['chunk']['page'] == chunk['page']
+                    and other['chunk'].get('doc_id') == chunk.get('doc_id')):
+                return True
+        return False
+
+    for rank, chunk in enumerate(chunks):
+        key = normalize_text(chunk['content'])
+        if chunk['id'] in selected or key in seen_content:
+            duplicates.append(chunk['id'])
+            continue
+
+        # 이미 고른 청크와 이어지면 같은 블록에 합쳐지므로 머리말 토큰이 들지 않는다
+        header_tokens = 0 if adjacent(chunk) else count_tokens(_header(chunk['page']))
+        content_tokens = count_tokens(chunk['content'] + "\n\n")
+        content, truncated = chunk['content'], False
+
+        if used + header_tokens + content_tokens > budget:
+            header_tokens = count_tokens(_header(chunk['page']))
+            room = budget - used - header_tokens - count_tokens("\n\n")
+            if room < min_tokens:
+                dropped.append(chunk['id'])
+                continue
+            content = _truncate_to_fit(chunk['content'], count_tokens, room)
+            if not content:
+                dropped.append(chunk['id'])
+                continue
+            content_tokens = count_tokens(content + "\n\n")
+            truncated = True
+
+        seen_content.add(key)
+        selected[chunk['id']] = {
+            'chunk': chunk,
+            'content': content,
+            'rank': rank,
+            'tokens': header_tokens + content_tokens,
+            'truncated': truncated
+        }
+        used += header_tokens + content_tokens
+
+    # 연속 청크를 블록으로 묶기 (블록 안은 문서 순서, 블록은 가장 관련도 높은 청크 순)
+    blocks = []
+    for chunk_id in sorted(selected):
+        item = selected[chunk_id]
+        chunk = item['chunk']
+        if blocks:
+            last = blocks[-1][-1]
+            if (last['chunk']['id'] == chunk_id - 1 and not last['truncated']
+                    and last['chunk']['page'] == chunk['page']
+                    and last['chunk'].get('doc_id') == chunk.get('doc_id')):
+                blocks[-1].append(item)
+                continue
+        blocks.append([item])
+    blocks.sort(key=lambda block: min(item['rank'] for item in block))
+
+    context = ""
+    for block in blocks:
+        context += _header(block[0]['chunk']['page'])
+        context += " ".join(item['content'] for item in block) + "\n\n"
+
+    included = sorted(selected.values(), key=lambda item: item['rank'])
+    report = {
+        'budget_tokens': budget,
+        'context_tokens': count_tokens(context) if context else 0,
+        'blocks': len(blocks),
+        'included': [
+            {
+                'index': item['chunk']['id'],
+                'page': item['chunk']['page'],
+                'tokens': item['tokens'],
+                'truncated': item['truncated']
+            }
+            for item in included
+        ],
+        'duplicates': duplicates,
+        'dropped': dropped
+    }
+    return context, [item['chunk'] for item in included], report
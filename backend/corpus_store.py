@@ -0,0 +1,629 @@
+# 업로드된 코퍼스의 디스크 저장 형식
+# 재시작해도 업로드한 문서가 유지되도록 인덱스와 청크를 세대(generation) 디렉터리에 저장한다.
+#
+# data/corpus/
+#   CURRENT                  -> 현재 세대 디렉터리 이름 (예: gen-000003)
+#   gen-000003/
+#     manifest.json          형식 버전, 차원, next_id, 인덱스 종류, 문서 목록
+#     index.faiss            FAISS 인덱스 (IO_FLAG_MMAP으로 읽음)
+#     embeddings.npy         원본 임베딩 (float32, chunk_ids와 같은 순서, v2부터)
+#     chunk_ids.npy          청크 고정 ID (int64, 오름차순)
+#     chunk_pages.npy        페이지 번호 (int32)
+#     chunk_tokens.npy       토큰 수 (int32)
+#     chunk_docs.npy         문서 번호 (manifest 문서 목록의 위치, int32)
+#     chunk_offsets.npy      content 시작 바이트 오프셋 (int64, n+1개)
+#     chunk_content.bin      모든 청크 content를 이어붙인 UTF-8 바이트
+#     doc_text.bin           문서 원문을 이어붙인 UTF-8 바이트
+#     sparse_*.npy           BM25 역색인 배열 (sparse_index.py, 없으면 열 때 다시 만듦)
+#
+# 열 때는 manifest만 읽고, 배열/바이트 파일은 처음 접근할 때 mmap으로 연다.
+
+import bisect
+import json
+import mmap
+import os
+import shutil
+import numpy as np
+import faiss
+from sparse_index import SparseIndex
+
+FORMAT_VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)  # v1: embeddings.npy 없음 (인덱스에서 복원)
+
+MANIFEST_FILE = 'manifest.json'
+INDEX_FILE = 'index.faiss'
+CURRENT_FILE = 'CURRENT'
+
+
+def _write_rows(f, blob, offsets, rows):
+    """blob에서 rows 행의 바이트만 순서대로 기록 (연속된 행은 한 번에 씀)"""
+    if len(rows) == 0:
+        return
+    breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+    for run in np.split(rows, breaks):
+        f.write(blob[int(offsets[run[0]]):int(offsets[run[-1] + 1])])
+
+
+VECTOR_WRITE_ROWS = 8192  # 임베딩을 저장할 때 한 번에 옮기는 행 수
+
+
+def _write_vectors(path, parts, dimension, n):
+    """열 조각의 남길 행 임베딩을 .npy로 기록 (전체 행렬을 메모리에 만들지 않음)"""
+    out = np.lib.format.open_memmap(path, mode='w+', dtype='float32', shape=(n, dimension))
+    pos = 0
+    for part in parts:
+        rows, vectors = part['rows'], part['vectors']
+        for start in range(0, len(rows), VECTOR_WRITE_ROWS):
+            batch = rows[start:start + VECTOR_WRITE_ROWS]
+            out[pos:pos + len(batch)] = vectors[batch]
+            pos += len(batch)
+    out.flush()
+    del out
+
+
+def _write_text(f, text, snapshot, doc_id):
+    """
+    문서 원문을 UTF-8로 기록하고 바이트 수 반환
+    text가 None이면 세대 파일에서, SpooledText면 스풀 파일에서 복사한다 (원문 전체를 str로 만들지 않음).
+    """
+    if text is None:
+        data = snapshot.document_bytes(doc_id)
+    elif isinstance(text, str):
+        data = text.encode('utf-8')
+    else:
+        return text.copy_to(f)
+    f.write(data)
+    return len(data)
+
+
+def _link_or_copy(src, dst):
+    """세대 파일은 수정하지 않으므로 하드 링크로 공유 (안 되면 복사)"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _open_blob(path):
+    """UTF-8 바이트 파일을 읽기 전용 mmap으로 연다 (빈 파일은 b'')"""
+    if os.path.getsize(path) == 0:
+        return b''
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class CorpusSnapshot:
+    """
+    디스크에 저장된 코퍼스 한 세대 (읽기 전용)
+    manifest만 즉시 읽고 나머지 파일은 첫 접근 시 mmap으로 연다.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+
+        version = self.manifest.get('format_version')
+        if version not in SUPPORTED_VERSIONS:
+            raise ValueError(f"지원하지 않는 코퍼스 형식 버전입니다: {version}")
+
+        self.dimension = self.manifest['dimension']
+        self.next_id = self.manifest['next_id']
+        self.documents = self.manifest['documents']
+        self.index_type = self.manifest.get('index_type', 'flat')
+        self.target_index_type = self.manifest.get('target_index_type', self.index_type)
+        self.index_params = self.manifest.get('index_params', {})
+        self.version = self.manifest.get('version', 0)  # 저장 시점의 IndexManager.version
+        self.trained_size = self.manifest.get('trained_size')
+        if self.trained_size is None and self.index_type in ('ivf_flat', 'ivf_pq'):
+            self.trained_size = self.manifest.get('chunk_count')  # 예전 세대: 저장 당시 벡터 수로 본다
+        self._columns = None
+        self._doc_text = None
+
+    @property
+    def index_path(self):
+        return os.path.join(self.path, INDEX_FILE)
+
+    def read_index(self, mmap_mode=True):
+        """
+        FAISS 인덱스 로드
+        mmap_mode=True면 IO_FLAG_MMAP으로 읽어 IVF 계열의 역색인 리스트를 디스크에 둔다.
+        (mmap으로 읽은 인덱스는 수정할 수 없으므로 추가/삭제 전에는 mmap_mode=False로 다시 읽는다)
+        """
+        if not os.path.exists(self.index_path):
+            return None
+        flags = faiss.IO_FLAG_MMAP if mmap_mode else 0
+        return faiss.read_index(self.index_path, flags)
+
+    def read_sparse(self):
+        """BM25 역색인 (mmap, 저장되지 않은 세대면 None)"""
+        return SparseIndex.load(self.path)
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            def load(name):
+                return np.load(os.path.join(self.path, name), mmap_mode='r')
+            self._columns = {
+                'ids': load('chunk_ids.npy'),
+                'pages': load('chunk_pages.npy'),
+                'tokens': load('chunk_tokens.npy'),
+                'docs': load('chunk_docs.npy'),
+                'offsets': load('chunk_offsets.npy'),
+                'content': _open_blob(os.path.join(self.path, 'chunk_content.bin')),
+                'vectors': None,
+            }
+            if os.path.exists(os.path.join(self.path, 'embeddings.npy')):
+                self._columns['vectors'] = load('embeddings.npy')
+        return self._columns
+
+    def __len__(self):
+        return self.manifest['chunk_count']
+
+    def position_of(self, chunk_id):
+        """청크 ID의 배열 위치 (없으면 -1)"""
+        ids = self.columns['ids']
+        pos = int(np.searchsorted(ids, chunk_id))
+        if pos < len(ids) and ids[pos] == chunk_id:
+            return pos
+        return -1
+
+    def chunk_at(self, pos):
+        """배열 위치의 청크를 dict로 복원 (title은 content 앞부분에서 파생)"""
+        cols = self.columns
+        start, end = int(cols['offsets'][pos]), int(cols['offsets'][pos + 1])
+        content = bytes(cols['content'][start:end]).decode('utf-8')
+        return {
+            'id': int(cols['ids'][pos]),
+            'page': int(cols['pages'][pos]),
+            'title': content[:50],
+            'content': content,
+            'token_count': int(cols['tokens'][pos]),
+            'doc_id': self.documents[int(cols['docs'][pos])]['doc_id']
+        }
+
+    def document_bytes(self, doc_id):
+        """문서 원문의 UTF-8 바이트 (doc_text.bin mmap의 memoryview, 복사하지 않음)"""
+        for doc in self.documents:
+            if doc['doc_id'] == doc_id:
+                if self._doc_text is None:
+                    self._doc_text = _open_blob(os.path.join(self.path, 'doc_text.bin'))
+                return memoryview(self._doc_text)[doc['text_start']:doc['text_end']]
+        return memoryview(b'')
+
+    def document_text(self, doc_id):
+        """문서 원문 (doc_text.bin에서 필요할 때만 읽음)"""
+        return bytes(self.document_bytes(doc_id)).decode('utf-8')
+
+
+def _grow(column, capacity):
+    """열 배열의 용량을 늘린 복사본 (앞부분 유지)"""
+    grown = np.zeros((capacity,) + column.shape[1:], dtype=column.dtype)
+    grown[:len(column)] = column
+    return grown
+
+
+class ChunkColumns:
+    """
+    스냅샷 이후 추가된 청크를 세대 파일과 같은 열 단위로 보관
+    청크마다 dict를 만들지 않고 ID/페이지/토큰 수/문서 번호는 NumPy 배열로 저장한다 (title은 읽을 때 파생).
+    content 바이트와 임베딩은 append 한 번(문서 하나)마다 조각(segment)으로 두며,
+    DocumentSpool에서 온 조각은 스풀 파일(mmap)을 그대로 참조해 문서 크기만큼 메모리에 올리지 않는다.
+    ID는 항상 증가하는 순서로만 추가되며 (IndexManager.next_id), 삭제는 live 표시만 끈다.
+    """
+
+    def __init__(self):
+        self.size = 0               # 추가된 행 수 (삭제 표시된 행 포함)
+        self.count = 0              # 삭제되지 않은 행 수
+        self.ids = np.zeros(0, dtype='int64')
+        self.pages = np.zeros(0, dtype='int32')
+        self.tokens = np.zeros(0, dtype='int32')
+        self.docs = np.zeros(0, dtype='int32')
+        self.live = np.zeros(0, dtype=bool)
+        self.offsets = np.zeros(1, dtype='int64')  # 모든 조각의 content를 이어붙였을 때의 오프셋
+        self.segments = []          # {'start': 첫 행, 'base': 첫 행 오프셋, 'content', 'vectors', 'owner'}
+        self._segment_starts = []
+        self.doc_ids = []           # 문서 번호 -> doc_id
+        self._doc_pos = {}
+
+    def __len__(self):
+        return self.count
+
+    def _reserve(self, n):
+        needed = self.size + n
+        if needed <= len(self.ids):
+            return
+        capacity = max(needed, 2 * len(self.ids), 256)
+        for name in ('ids', 'pages', 'tokens', 'docs', 'live'):
+            setattr(self, name, _grow(getattr(self, name), capacity))
+        self.offsets = _grow(self.offsets, capacity + 1)
+
+    def append(self, ids, chunks, doc_id, vectors):
+        """
+        청크 배치 추가 (ids는 기존 ID보다 커야 함, vectors는 (n, 차원))
+        chunks에 columns()가 있으면 (SpooledChunks) content와 vectors를 복사하지 않고 참조한다.
+        """
+        n = len(ids)
+        if n == 0:
+            return
+        self._reserve(n)
+        rows = slice(self.size, self.size + n)
+
+        if doc_id not in self._doc_pos:
+            self._doc_pos[doc_id] = len(self.doc_ids)
+            self.doc_ids.append(doc_id)
+
+        base = int(self.offsets[self.size])
+        columns = chunks.columns() if hasattr(chunks, 'columns') else None
+        if columns is not None:
+            self.offsets[self.size + 1:self.size + n + 1] = base + columns['offsets'][1:]
+            self.pages[rows] = columns['pages']
+            self.tokens[rows] = columns['tokens']
+            content, owner = columns['content'], columns['owner']
+        else:
+            content = bytearray()
+            for row, chunk in enumerate(chunks, start=self.size):
+                content += chunk['content'].encode('utf-8')
+                self.offsets[row + 1] = base + len(content)
+                self.pages[row] = chunk['page']
+                self.tokens[row] = chunk.get('token_count', 0)
+            content = bytes(content)
+            vectors = np.array(vectors, dtype='float32')  # 호출한 쪽 배열과 분리
+            owner = None
+        self.ids[rows] = ids
+        self.docs[rows] = self._doc_pos[doc_id]
+        self.live[rows] = True
+        self.segments.append({'start': self.size, 'base': base, 'content': content, 'vectors': vectors,
+                              'owner': owner})
+        self._segment_starts.append(self.size)
+        self.size += n
+        self.count += n
+
+    def _segment(self, pos):
+        return self.segments[bisect.bisect_right(self._segment_starts, pos) - 1]
+
+    def iter_segments(self):
+        """(조각, 첫 행, 끝 행, 조각 안에서 삭제되지 않은 행 위치)를 순서대로"""
+        for i, segment in enumerate(self.segments):
+            start = segment['start']
+            end = self.segments[i + 1]['start'] if i + 1 < len(self.segments) else self.size
+            yield segment, start, end, np.flatnonzero(self.live[start:end])
+
+    def position_of(self, chunk_id):
+        """청크 ID의 행 위치 (없거나 삭제되었으면 -1)"""
+        pos = int(np.searchsorted(self.ids[:self.size], chunk_id))
+        if pos < self.size and self.ids[pos] == chunk_id and self.live[pos]:
+            return pos
+        return -1
+
+    def chunk_at(self, pos):
+        """행 위치의 청크를 dict로 복원 (CorpusSnapshot.chunk_at과 같은 형식)"""
+        segment = self._segment(pos)
+        start, end = int(self.offsets[pos]) - segment['base'], int(self.offsets[pos + 1]) - segment['base']
+        content = bytes(segment['content'][start:end]).decode('utf-8')
+        return {
+            'id': int(self.ids[pos]),
+            'page': int(self.pages[pos]),
+            'title': content[:50],
+            'content': content,
+            'token_count': int(self.tokens[pos]),
+            'doc_id': self.doc_ids[int(self.docs[pos])]
+        }
+
+    def remove(self, pos):
+        self.live[pos] = False
+        self.count -= 1
+
+    def live_rows(self):
+        """삭제되지 않은 행 위치 (ID 오름차순)"""
+        return np.flatnonzero(self.live[:self.size])
+
+    @property
+    def nbytes(self):
+        """메모리에 올라간 크기 (스풀 파일을 참조하는 조각 제외)"""
+        columns = (self.ids, self.pages, self.tokens, self.docs, self.live, self.offsets)
+        total = sum(column.nbytes for column in columns)
+        for segment in self.segments:
+            if segment['owner'] is None:
+                total += len(segment['content']) + segment['vectors'].nbytes
+        return total
+
+    @property
+    def mapped_nbytes(self):
+        """스풀 파일을 mmap으로 참조하는 조각의 크기"""
+        return sum(len(segment['content']) + segment['vectors'].nbytes
+                   for segment in self.segments if segment['owner'] is not None)
+
+
+class ChunkTable:
+    """
+    청크 ID -> 청크 dict 매핑
+    디스크 세대(읽기 전용, mmap)를 바탕으로 새로 추가된 청크(ChunkColumns)와 삭제 표시를 얹는다.
+    청크는 열 단위로만 보관하고, get/values 때 dict로 복원한다.
+    """
+
+    def __init__(self, snapshot=None):
+        self.snapshot = snapshot
+        self.added = ChunkColumns()  # 스냅샷 이후 추가된 청크와 임베딩
+        self.removed = set()         # 스냅샷에서 삭제된 청크 ID
+
+    def _base_position(self, chunk_id):
+        if self.snapshot is None or chunk_id in self.removed:
+            return -1
+        return self.snapshot.position_of(chunk_id)
+
+    def get(self, chunk_id, default=None):
+        pos = self.added.position_of(chunk_id)
+        if pos >= 0:
+            return self.added.chunk_at(pos)
+        pos = self._base_position(chunk_id)
+        if pos < 0:
+            return default
+        return self.snapshot.chunk_at(pos)
+
+    def __getitem__(self, chunk_id):
+        chunk = self.get(chunk_id)
+        if chunk is None:
+            raise KeyError(chunk_id)
+        return chunk
+
+    def __contains__(self, chunk_id):
+        return self.added.position_of(chunk_id) >= 0 or self._base_position(chunk_id) >= 0
+
+    def append(self, ids, chunks, doc_id, vectors):
+        """문서 하나의 청크와 임베딩 추가 (ChunkColumns.append 참고)"""
+        self.added.append(ids, chunks, doc_id, vectors)
+
+    def _base_keep(self):
+        """스냅샷 행 중 삭제되지 않은 행 표시"""
+        base_ids = np.asarray(self.snapshot.columns['ids'])
+        if not self.removed:
+            return np.ones(len(base_ids), dtype=bool)
+        return ~np.isin(base_ids, np.fromiter(self.removed, dtype='int64', count=len(self.removed)))
+
+    def vector_matrix(self):
+        """
+        (청크 ID 배열, 임베딩 행렬)을 ID 오름차순으로 반환
+        스냅샷에 임베딩이 없으면 (v1 형식) None
+        """
+        parts_ids, parts_vectors = [], []
+        if self.snapshot is not None and len(self.snapshot) > 0:
+            base_vectors = self.snapshot.columns['vectors']
+            if base_vectors is None:
+                return None
+            keep = self._base_keep()
+            parts_ids.append(np.asarray(self.snapshot.columns['ids'])[keep])
+            parts_vectors.append(np.asarray(base_vectors)[keep])
+        for segment, start, _, rows in self.added.iter_segments():
+            parts_ids.append(self.added.ids[start + rows])
+            parts_vectors.append(np.asarray(segment['vectors'])[rows])
+        if not parts_ids:
+            return np.zeros(0, dtype='int64'), None
+        return np.concatenate(parts_ids), np.ascontiguousarray(np.vstack(parts_vectors), dtype='float32')
+
+    def column_parts(self):
+        """
+        세대 저장용 열 조각 목록 (스냅샷 부분, 추가 부분 순서 = ID 오름차순)
+        각 조각은 {'ids', 'pages', 'tokens', 'docs', 'doc_ids', 'offsets', 'content', 'vectors', 'rows'}이며
+        docs는 조각의 doc_ids 목록 위치, rows는 남길 행 위치다. 추가분은 append 조각마다 하나씩 나온다.
+        """
+        parts = []
+        if self.snapshot is not None and len(self.snapshot) > 0:
+            cols = self.snapshot.columns
+            parts.append(dict(cols, doc_ids=[doc['doc_id'] for doc in self.snapshot.documents],
+                              rows=np.flatnonzero(self._base_keep())))
+        # 추가분의 기존 행은 바뀌지 않고 (삭제는 live만 끔, 용량을 늘리면 새 배열) 뒤에 덧붙기만 하므로
+        # 뷰로 넘긴다. 조각의 content/vectors도 바뀌지 않으므로 참조만 넘기고,
+        # 스풀 파일을 참조하는 조각은 owner로 저장이 끝날 때까지 파일을 살려 둔다.
+        added = self.added
+        doc_ids = list(added.doc_ids)
+        for segment, start, end, rows in added.iter_segments():
+            parts.append({
+                'ids': added.ids[start:end], 'pages': added.pages[start:end], 'tokens': added.tokens[start:end],
+                'docs': added.docs[start:end], 'doc_ids': doc_ids,
+                'offsets': added.offsets[start:end + 1] - segment['base'],
+                'content': segment['content'], 'vectors': segment['vectors'], 'rows': rows,
+                'owner': segment['owner']
+            })
+        return parts
+
+    def pop(self, chunk_id, default=None):
+        pos = self.added.position_of(chunk_id)
+        if pos >= 0:
+            chunk = self.added.chunk_at(pos)
+            self.added.remove(pos)
+            return chunk
+        pos = self._base_position(chunk_id)
+        if pos < 0:
+            return default
+        self.removed.add(chunk_id)
+        return self.snapshot.chunk_at(pos)
+
+    def __len__(self):
+        base = len(self.snapshot) - len(self.removed) if self.snapshot is not None else 0
+        return base + len(self.added)
+
+    def __iter__(self):
+        """청크 ID를 오름차순으로 순회"""
+        if self.snapshot is not None:
+            for chunk_id in self.snapshot.columns['ids']:
+                chunk_id = int(chunk_id)
+                if chunk_id not in self.removed:
+                    yield chunk_id
+        for pos in self.added.live_rows():
+            yield int(self.added.ids[pos])
+
+    def values(self):
+        for chunk_id in self:
+            yield self.get(chunk_id)
+
+
+class CorpusStore:
+    """
+    코퍼스 저장소
+    저장할 때마다 새 세대 디렉터리를 만들고 CURRENT 포인터를 교체한다.
+    (열려 있는 mmap 파일을 덮어쓰지 않으므로 Windows에서도 안전)
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def current_path(self):
+        pointer = os.path.join(self.root, CURRENT_FILE)
+        if not os.path.exists(pointer):
+            return None
+        with open(pointer, 'r', encoding='utf-8') as f:
+            name = f.read().strip()
+        path = os.path.join(self.root, name)
+        return path if os.path.isdir(path) else None
+
+    def open(self):
+        """현재 세대를 연다 (저장된 코퍼스가 없으면 None)"""
+        path = self.current_path()
+        if path is None:
+            return None
+        return CorpusSnapshot(path)
+
+    def _next_generation(self):
+        generations = [
+            int(name.split('-')[1]) for name in os.listdir(self.root)
+            if name.startswith('gen-') and name.split('-')[1].isdigit()
+        ]
+        return f"gen-{max(generations, default=0) + 1:06d}"
+
+    def save(self, manager):
+        """
+        IndexManager 내용을 새 세대로 저장하고 CURRENT를 교체
+        manager.lock 안에서는 저장할 상태만 잡아 두고 (_capture), 파일은 잠금 밖에서 쓴다 (_write).
+        그동안 검색/추가는 막히지 않으며, 같은 컬렉션의 저장끼리는 manager.save_lock으로 순서를 지킨다.
+
+        Returns:
+            저장된 세대 디렉터리 경로
+        """
+        with manager.save_lock:
+            with manager.lock:
+                state = self._capture(manager)
+            return self._write(state)
+
+    @staticmethod
+    def _capture(manager):
+        """
+        저장할 상태 (manager.lock 안에서 호출)
+        세대 파일은 읽기 전용이라 참조만 하고, 추가된 청크 열은 뒤에 덧붙기만 하므로 뷰로 잡는다.
+        임베딩 행렬과 문서 원문은 여기서 만들지 않는다 (스풀 파일에서 _write가 흘려 씀).
+        """
+        snapshot = manager.snapshot
+        parts = manager.chunks.column_parts()
+        vectors = None
+        if any(part['vectors'] is None for part in parts):
+            # 임베딩이 저장되지 않은 예전 세대: 인덱스에서 복원 (v1 형식에서 한 번만)
+            vectors = manager.vector_matrix()[1]
+        index_file, index_data = manager.index_for_save()
+        return {
+            'snapshot': snapshot,
+            'documents': [(doc_id, dict(doc)) for doc_id, doc in manager.documents.items()],
+            'parts': parts,
+            'vectors': vectors,
+            'index_file': index_file,
+            'index_data': index_data,
+            'sparse': manager.sparse_index(),
+            'manifest': {
+                'format_version': FORMAT_VERSION,
+                'dimension': manager.dimension,
+                'next_id': manager.next_id,
+                'version': manager.version,
+                'index_type': manager.built_index_type,
+                'target_index_type': manager.index_type,
+                'index_params': dict(manager.index_params),
+                'trained_size': manager.trained_size,
+            }
+        }
+
+    def _write(self, state):
+        """_capture한 상태를 새 세대 디렉터리에 기록 (잠금 밖에서 호출)"""
+        os.makedirs(self.root, exist_ok=True)
+        previous = self.current_path()
+        name = self._next_generation()
+        path = os.path.join(self.root, name)
+        os.makedirs(path)
+        snapshot = state['snapshot']
+
+        # 문서 원문 (세대에 있는 문서는 세대 파일에서 읽음)
+        doc_pos = {doc_id: i for i, (doc_id, _) in enumerate(state['documents'])}
+        documents = []
+        text_offset = 0
+        with open(os.path.join(path, 'doc_text.bin'), 'wb') as f:
+            for doc_id, doc in state['documents']:
+                size = _write_text(f, doc['text'], snapshot, doc_id)
+                documents.append({
+                    'doc_id': doc_id,
+                    'name': doc['name'],
+                    'start': doc['start'],
+                    'end': doc['end'],
+                    'content_hash': doc.get('content_hash'),
+                    'text_start': text_offset,
+                    'text_end': text_offset + size
+                })
+                text_offset += size
+
+        # 청크 (열 단위, dict로 복원하지 않고 남길 행만 이어붙임)
+        ids, pages, tokens, docs, lengths = [], [], [], [], []
+        with open(os.path.join(path, 'chunk_content.bin'), 'wb') as f:
+            for part in state['parts']:
+                rows = part['rows']
+                # 삭제된 문서는 남길 행에 나오지 않으므로 -1로 둔다
+                doc_map = np.array([doc_pos.get(doc_id, -1) for doc_id in part['doc_ids']], dtype='int32')
+                offsets = np.asarray(part['offsets'])
+                ids.append(np.asarray(part['ids'])[rows])
+                pages.append(np.asarray(part['pages'])[rows])
+                tokens.append(np.asarray(part['tokens'])[rows])
+                docs.append(doc_map[np.asarray(part['docs'])[rows]])
+                lengths.append(offsets[rows + 1] - offsets[rows])
+                _write_rows(f, part['content'], offsets, rows)
+
+        def column(parts, dtype):
+            return np.concatenate(parts).astype(dtype) if parts else np.zeros(0, dtype=dtype)
+
+        ids = column(ids, 'int64')
+        offsets = np.concatenate([[0], np.cumsum(column(lengths, 'int64'))]).astype('int64')
+        np.save(os.path.join(path, 'chunk_ids.npy'), ids)
+        np.save(os.path.join(path, 'chunk_pages.npy'), column(pages, 'int32'))
+        np.save(os.path.join(path, 'chunk_tokens.npy'), column(tokens, 'int32'))
+        np.save(os.path.join(path, 'chunk_docs.npy'), column(docs, 'int32'))
+        np.save(os.path.join(path, 'chunk_offsets.npy'), offsets)
+
+        # 인덱스 (바뀌지 않았으면 이전 세대 파일을 링크)
+        if state['index_file'] is not None:
+            _link_or_copy(state['index_file'], os.path.join(path, INDEX_FILE))
+        elif state['index_data'] is not None:
+            with open(os.path.join(path, INDEX_FILE), 'wb') as f:
+                f.write(state['index_data'].tobytes())
+
+        # 원본 임베딩 (남길 행만 묶음 단위로 흘려 씀)
+        if state['vectors'] is not None:
+            np.save(os.path.join(path, 'embeddings.npy'), state['vectors'])
+        elif len(ids):
+            _write_vectors(os.path.join(path, 'embeddings.npy'), state['parts'], state['manifest']['dimension'],
+                           len(ids))
+
+        state['sparse'].save(path)
+
+        manifest = dict(state['manifest'], chunk_count=len(ids), documents=documents)
+        with open(os.path.join(path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+        # CURRENT 포인터를 원자적으로 교체
+        pointer = os.path.join(self.root, CURRENT_FILE)
+        with open(pointer + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(name)
+        os.replace(pointer + '.tmp', pointer)
+
+        # 이전 세대 정리 (직전 세대와 manager가 연결된 세대는 남김,
+        # 열려 있어 지울 수 없으면 다음 저장 때 다시 시도)
+        keep = {path, previous, snapshot.path if snapshot is not None else None}
+        for old in os.listdir(self.root):
+            old_path = os.path.join(self.root, old)
+            if old.startswith('gen-') and old_path not in keep:
+                shutil.rmtree(old_path, ignore_errors=True)
+
+        return path
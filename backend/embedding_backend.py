@@ -0,0 +1,140 @@
+# 임베딩 모델 백엔드
+# CPU 서버에서는 수집 시간 대부분이 청크 임베딩이므로, 같은 모델을 더 빠르게 돌리는 방법을 고를 수 있게 한다.
+# - torch: SentenceTransformer fp32 (기본값, 품질 기준)
+# - int8:  SentenceTransformer의 Linear 층만 torch 동적 int8 양자화 (추가 의존성 없음)
+# - onnx:  ONNX Runtime으로 내보낸 같은 모델 (optimum[onnxruntime] 필요, 처음 한 번 내보내 디스크에 저장)
+# 백엔드마다 벡터가 조금씩 달라지므로 캐시 키에는 백엔드 이름을 넣는다.
+# 속도/품질 차이는 benchmark_embedding.py로 측정한다.
+
+import os
+import re
+import numpy as np
+
+EMBEDDING_BACKENDS = ('torch', 'int8', 'onnx')
+
+
+def backend_model_name(model_name, backend):
+    """캐시 키에 쓸 모델 이름 (fp32 torch는 기존 키 그대로, 그 밖의 백엔드는 이름에 표시)"""
+    return model_name if backend == 'torch' else f"{model_name}+{backend}"
+
+
+def length_sorted_batches(lengths, batch_size, max_batch_tokens=None):
+    """
+    긴 것부터 길이 순으로 정렬한 위치를 batch_size개씩 나눈 목록 (비슷한 길이끼리 묶어 패딩 낭비를 줄임)
+    max_batch_tokens를 주면 배치 크기 x 최장 길이가 이 값을 넘지 않도록 긴 배치를 더 작게 나눈다.
+    첫 배치가 가장 크므로 메모리가 부족하면 바로 드러난다.
+    """
+    lengths = np.asarray(lengths)
+    order = np.argsort(-lengths, kind='stable')
+    batches, start = [], 0
+    while start < len(order):
+        size = batch_size
+        if max_batch_tokens:
+            size = max(1, min(size, max_batch_tokens // max(1, int(lengths[order[start]]))))
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+
+def encode_length_sorted(encode_batch, lengths, batch_size, max_batch_tokens=None):
+    """
+    length_sorted_batches로 나눈 배치마다 encode_batch(위치 배열) -> (배치 크기, dim) 행렬을 호출하고
+    결과를 입력 순서의 행렬로 모은다.
+
+    Returns:
+        (임베딩 행렬, 배치 목록)
+    """
+    batches = length_sorted_batches(lengths, batch_size, max_batch_tokens)
+    embeddings = None
+    for batch in batches:
+        vectors = np.asarray(encode_batch(batch), dtype='float32')
+        if embeddings is None:
+            embeddings = np.empty((len(lengths), vectors.shape[1]), dtype='float32')
+        embeddings[batch] = vectors
+    return embeddings, batches
+
+
+class OnnxSentenceEncoder:
+    """
+    ONNX Runtime 문장 임베딩
+    SentenceTransformer.encode와 같은 인터페이스/결과 형식 (평균 풀링, 정규화 없음)
+
+    Args:
+        model: optimum ORTModelForFeatureExtraction
+        tokenizer: 같은 모델의 HF tokenizer (청킹 토큰 수 계산에도 사용)
+        max_seq_length: 최대 토큰 수 (ko-sroberta-multitask의 sentence_bert_config 값)
+    """
+
+    def __init__(self, model, tokenizer, max_seq_length=128):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_seq_length = max_seq_length
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        if len(sentences) == 0:
+            return np.zeros((0, 0), dtype='float32')
+
+        encoded = self.tokenizer(list(sentences), truncation=True, max_length=self.max_seq_length)
+        input_ids = encoded['input_ids']
+
+        def encode_batch(batch):
+            features = self.tokenizer.pad(
+                {'input_ids': [input_ids[i] for i in batch]},
+                return_tensors='np'
+            )
+            inputs = {name: value for name, value in features.items() if name in self.model.input_names}
+            hidden = np.asarray(self.model(**inputs).last_hidden_state, dtype='float32')
+            mask = features['attention_mask'][..., None].astype('float32')
+            return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        embeddings, _ = encode_length_sorted(encode_batch, [len(ids) for ids in input_ids], batch_size)
+        return embeddings[0] if single else embeddings
+
+
+def _quantize_int8(model):
+    """Linear 층 가중치를 int8로 양자화 (활성값은 실행 시 동적으로 양자화)"""
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _load_onnx(model_name, revision, export_dir):
+    try:
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+    except ImportError as e:
+        raise RuntimeError("onnx 백엔드에는 optimum[onnxruntime] 패키지가 필요합니다.") from e
+    from transformers import AutoTokenizer
+
+    path = os.path.join(export_dir, re.sub(r'[^0-9A-Za-z._-]+', '_', f"{model_name}@{revision}"))
+    if os.path.exists(os.path.join(path, 'model.onnx')):
+        model = ORTModelForFeatureExtraction.from_pretrained(path)
+        tokenizer = AutoTokenizer.from_pretrained(path)
+    else:
+        print(f"ONNX 모델 내보내는 중: {model_name} -> {path}")
+        model = ORTModelForFeatureExtraction.from_pretrained(model_name, revision=revision, export=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_name, revision=revision)
+        model.save_pretrained(path)
+        tokenizer.save_pretrained(path)
+    return OnnxSentenceEncoder(model, tokenizer)
+
+
+def load_embedding_model(model_name, revision='main', backend='torch', onnx_dir=None):
+    """
+    백엔드에 맞는 임베딩 모델 로드
+    반환값은 모두 encode(texts, batch_size=..., show_progress_bar=...)와 tokenizer 속성을 가진다.
+
+    Args:
+        onnx_dir: onnx 백엔드가 내보낸 모델을 저장할 디렉터리
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"지원하지 않는 임베딩 백엔드입니다: {backend}")
+    if backend == 'onnx':
+        return _load_onnx(model_name, revision, onnx_dir or os.path.join('data', 'models', 'onnx'))
+
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name, revision=revision, device='cpu' if backend == 'int8' else None)
+    if backend == 'int8':
+        model = _quantize_int8(model)
+    return model
@@ -0,0 +1,172 @@
+# 청크 임베딩 캐시
+# 설명서/여행 문서에는 머리말, 꼬리말, 표 행, 경고문처럼 같은 청크가 반복되므로
+# 정규화한 텍스트의 해시(모델 이름/버전 포함)를 키로 임베딩을 한 번만 계산해 저장한다.
+#
+# data/embedding_cache/<model_slug>/
+#   meta.json     모델 키, 차원
+#   keys.bin      16바이트 해시 키를 행 순서대로 이어붙인 파일
+#   vectors.f32   float32 임베딩 행렬 (행 = keys.bin 순서, np.memmap으로 읽음)
+
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+import numpy as np
+
+KEY_SIZE = 16
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """캐시 키용 정규화: 유니코드 NFC + 연속 공백 하나로 + 앞뒤 공백 제거"""
+    return _WHITESPACE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+class EmbeddingCache:
+    """
+    정규화 텍스트 해시 -> 임베딩 영구 캐시
+    - 한 배치 안의 중복 텍스트는 한 번만 인코딩
+    - 이미 본 텍스트는 memmap 행렬에서 바로 반환
+    - max_entries에 도달하면 더 이상 추가하지 않는다 (기존 항목은 계속 사용)
+    """
+
+    def __init__(self, root, model_key, max_entries=5_000_000):
+        self.model_key = model_key
+        self.max_entries = max_entries
+        slug = re.sub(r'[^0-9A-Za-z._-]+', '_', model_key)
+        self.path = os.path.join(root, slug)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.dimension = None
+        self._rows = None      # 키 -> 행 번호 (처음 사용할 때 keys.bin에서 구성)
+        self._count = 0        # 파일의 행 수 (keys.bin과 vectors.f32의 행 수는 항상 같게 유지)
+        self._vectors = None   # np.memmap (행 수가 바뀌면 다시 연다)
+
+    def _key(self, text):
+        data = (self.model_key + '\x00' + normalize_text(text)).encode('utf-8')
+        return hashlib.blake2b(data, digest_size=KEY_SIZE).digest()
+
+    def _keys_path(self):
+        return os.path.join(self.path, 'keys.bin')
+
+    def _vectors_path(self):
+        return os.path.join(self.path, 'vectors.f32')
+
+    def _load(self):
+        if self._rows is not None:
+            return
+        self._rows = {}
+        meta_path = os.path.join(self.path, 'meta.json')
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('model_key') != self.model_key:
+            return
+        self.dimension = meta['dimension']
+
+        row_bytes = 4 * self.dimension
+        with open(self._keys_path(), 'ab+') as f:
+            f.seek(0)
+            keys = f.read()
+        with open(self._vectors_path(), 'ab'):
+            pass
+        # 쓰다가 중단된 경우를 대비해 키/벡터 중 짧은 쪽에 맞추고, 남는 행과 잘린 레코드는 파일에서 잘라낸다
+        # (남겨 두면 이후에 덧붙인 행의 파일 위치와 행 번호가 어긋난다)
+        n = min(len(keys) // KEY_SIZE, os.path.getsize(self._vectors_path()) // row_bytes)
+        if len(keys) != n * KEY_SIZE:
+            os.truncate(self._keys_path(), n * KEY_SIZE)
+        if os.path.getsize(self._vectors_path()) != n * row_bytes:
+            os.truncate(self._vectors_path(), n * row_bytes)
+        self._count = n
+        for row in range(n):
+            self._rows[keys[row * KEY_SIZE:(row + 1) * KEY_SIZE]] = row
+
+    def _matrix(self):
+        n = self._count
+        if n == 0:
+            return None
+        if self._vectors is None or self._vectors.shape[0] != n:
+            self._vectors = np.memmap(self._vectors_path(), dtype='float32', mode='r',
+                                      shape=(n, self.dimension))
+        return self._vectors
+
+    def _append(self, keys, vectors):
+        if self.dimension is None:
+            self.dimension = vectors.shape[1]
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump({'model_key': self.model_key, 'dimension': self.dimension}, f, ensure_ascii=False)
+            # 이전 모델 키의 파일이 남아 있으면 비운다
+            open(self._keys_path(), 'wb').close()
+            open(self._vectors_path(), 'wb').close()
+            self._count = 0
+
+        room = self.max_entries - self._count
+        if room <= 0:
+            return
+        keys, vectors = keys[:room], vectors[:room]
+        start = self._count
+        # 벡터를 먼저 쓰고 키를 나중에 써서, 중단되더라도 키가 없는 행만 남도록 한다
+        with open(self._vectors_path(), 'ab') as f:
+            f.write(np.ascontiguousarray(vectors, dtype='float32').tobytes())
+        with open(self._keys_path(), 'ab') as f:
+            f.write(b''.join(keys))
+        for offset, key in enumerate(keys):
+            self._rows[key] = start + offset
+        self._count = start + len(keys)
+
+    def encode(self, texts, model, batch_size=32):
+        """
+        model.encode와 같은 결과를 캐시/중복 제거를 거쳐 반환
+
+        Returns:
+            (len(texts), dim) float32 행렬
+        """
+        if not texts:
+            return np.zeros((0, self.dimension or 0), dtype='float32')
+
+        keys = [self._key(text) for text in texts]
+        with self.lock:
+            self._load()
+            missing = {}  # 키 -> 인코딩할 원문 (배치 안 중복 제거)
+            for key, text in zip(keys, texts):
+                if key not in self._rows and key not in missing:
+                    missing[key] = text
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+
+        new_vectors = {}
+        if missing:
+            encoded = model.encode(list(missing.values()), batch_size=batch_size, show_progress_bar=False)
+            encoded = np.asarray(encoded, dtype='float32')
+            new_vectors = dict(zip(missing.keys(), encoded))
+
+        with self.lock:
+            if new_vectors:
+                new_keys = [key for key in new_vectors if key not in self._rows]
+                if new_keys:
+                    self._append(new_keys, np.vstack([new_vectors[key] for key in new_keys]))
+            matrix = self._matrix()
+            dimension = self.dimension
+            result = np.empty((len(texts), dimension), dtype='float32')
+            for i, key in enumerate(keys):
+                if key in new_vectors:
+                    result[i] = new_vectors[key]
+                else:
+                    result[i] = matrix[self._rows[key]]
+        return result
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'model_key': self.model_key,
+                'entries': len(self._rows) if self._rows is not None else None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
@@ -0,0 +1,172 @@
+# 업로드 파일 내용 해시 기반 추출 캐시
+# 같은 PDF를 다시 올리면 pdfplumber 추출, 토큰화, 임베딩을 모두 건너뛰도록
+# 업로드 바이트의 SHA-256을 키로 추출 결과를 디스크에 저장한다.
+#
+# data/extraction_cache/
+#   <sha256>/
+#     meta.json        모델 이름, 크기 (mtime = 마지막 사용 시각, LRU 기준)
+#     pages.json       pages_content
+#     chunks.json      청크 목록 (임베딩 모델의 토크나이저 기준)
+#     embeddings.npy   청크 임베딩 (float32)
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import numpy as np
+
+
+def save_upload(fileobj, upload_dir, filename, block_size=1 << 20):
+    """
+    업로드 스트림을 저장하면서 SHA-256을 계산
+    파일은 내용 해시 이름으로 저장하므로 같은 이름의 다른 파일이 서로 덮어쓰지 않는다.
+
+    Returns:
+        (sha256, 저장 경로)
+    """
+    os.makedirs(upload_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    tmp_path = os.path.join(upload_dir, f".upload-{threading.get_ident()}-{time.time_ns()}")
+    with open(tmp_path, 'wb') as out:
+        for block in iter(lambda: fileobj.read(block_size), b''):
+            digest.update(block)
+            out.write(block)
+    sha = digest.hexdigest()
+    ext = os.path.splitext(filename)[1].lower()
+    path = os.path.join(upload_dir, sha + ext)
+    os.replace(tmp_path, path)
+    return sha, path
+
+
+class ExtractionCache:
+    """
+    내용 해시 -> (pages_content, chunks, embeddings) 디스크 캐시
+    전체 크기가 max_bytes를 넘으면 가장 오래 사용하지 않은 항목부터 삭제한다.
+    """
+
+    def __init__(self, root, max_bytes=2 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._entries = None  # sha -> 크기 (처음 사용할 때 디렉터리 스캔)
+
+    def _entry_dir(self, sha):
+        return os.path.join(self.root, sha)
+
+    def _load_entries(self):
+        if self._entries is None:
+            self._entries = {}
+            if os.path.isdir(self.root):
+                for sha in os.listdir(self.root):
+                    if '.tmp-' in sha:
+                        continue  # 다른 스레드가 쓰는 중인 항목
+                    meta_path = os.path.join(self.root, sha, 'meta.json')
+                    try:
+                        with open(meta_path, 'r', encoding='utf-8') as f:
+                            self._entries[sha] = json.load(f)['size_bytes']
+                    except (OSError, ValueError, KeyError):
+                        shutil.rmtree(os.path.join(self.root, sha), ignore_errors=True)
+        return self._entries
+
+    def get(self, sha, model_name):
+        """
+        캐시 조회
+
+        Returns:
+            None (없음) 또는 {'pages': [...], 'chunks': [...] 또는 None, 'embeddings': ndarray 또는 None}
+            다른 임베딩 모델로 만든 항목이면 pages만 재사용한다.
+        """
+        with self.lock:
+            if sha not in self._load_entries():
+                self.misses += 1
+                return None
+            path = self._entry_dir(sha)
+            try:
+                with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                with open(os.path.join(path, 'pages.json'), 'r', encoding='utf-8') as f:
+                    pages = json.load(f)
+                chunks, embeddings = None, None
+                if meta.get('model') == model_name and meta.get('has_chunks'):
+                    with open(os.path.join(path, 'chunks.json'), 'r', encoding='utf-8') as f:
+                        chunks = json.load(f)
+                    embeddings = np.load(os.path.join(path, 'embeddings.npy'))
+                # 마지막 사용 시각 갱신 (LRU)
+                os.utime(os.path.join(path, 'meta.json'))
+            except (OSError, ValueError):
+                self._entries.pop(sha, None)
+                shutil.rmtree(path, ignore_errors=True)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return {'pages': pages, 'chunks': chunks, 'embeddings': embeddings}
+
+    def put(self, sha, pages, chunks=None, embeddings=None, model_name=None):
+        """추출 결과 저장 (같은 키가 있으면 덮어씀) 후 크기 제한에 맞춰 정리"""
+        tmp_path = self._entry_dir(sha) + f".tmp-{threading.get_ident()}"
+        os.makedirs(tmp_path, exist_ok=True)
+
+        with open(os.path.join(tmp_path, 'pages.json'), 'w', encoding='utf-8') as f:
+            json.dump(pages, f, ensure_ascii=False)
+        has_chunks = chunks is not None and embeddings is not None
+        if has_chunks:
+            with open(os.path.join(tmp_path, 'chunks.json'), 'w', encoding='utf-8') as f:
+                json.dump(chunks, f, ensure_ascii=False)
+            np.save(os.path.join(tmp_path, 'embeddings.npy'), np.asarray(embeddings, dtype='float32'))
+
+        size = sum(os.path.getsize(os.path.join(tmp_path, name)) for name in os.listdir(tmp_path))
+        with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'sha256': sha,
+                'model': model_name,
+                'has_chunks': has_chunks,
+                'size_bytes': size,
+                'created': time.time()
+            }, f)
+
+        with self.lock:
+            entries = self._load_entries()
+            path = self._entry_dir(sha)
+            if os.path.exists(path):
+                shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+            entries[sha] = size
+            self._evict(keep=sha)
+
+    def _evict(self, keep=None):
+        """전체 크기가 max_bytes 이하가 될 때까지 오래된 항목부터 삭제"""
+        total = sum(self._entries.values())
+        if total <= self.max_bytes:
+            return
+
+        def last_used(sha):
+            try:
+                return os.path.getmtime(os.path.join(self._entry_dir(sha), 'meta.json'))
+            except OSError:
+                return 0
+
+        for sha in sorted(self._entries, key=last_used):
+            if total <= self.max_bytes:
+                break
+            if sha == keep:
+                continue
+            shutil.rmtree(self._entry_dir(sha), ignore_errors=True)
+            total -= self._entries.pop(sha)
+            print(f"추출 캐시 제거: {sha[:12]}")
+
+    def stats(self):
+        with self.lock:
+            entries = self._load_entries()
+            total = self.hits + self.misses
+            return {
+                'entries': len(entries),
+                'size_bytes': sum(entries.values()),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
@@ -0,0 +1,601 @@
+# 문서 단위 증분 인덱스 관리
+# 업로드마다 전체 인덱스를 다시 만들지 않고, 새 문서의 임베딩만 추가하거나
+# 오래된 문서의 청크만 삭제할 수 있도록 청크 고정 ID로 FAISS 인덱스를 관리한다.
+
+import os
+import threading
+from contextlib import contextmanager
+import numpy as np
+import faiss
+import rag_pipeline
+from corpus_store import ChunkTable
+from sparse_index import SparseIndex, SegmentedSparseIndex, reciprocal_rank_fusion
+
+# 검색 방식: dense = FAISS 임베딩, sparse = BM25 역색인, hybrid = 두 결과를 RRF로 합침
+RETRIEVAL_MODES = ('dense', 'sparse', 'hybrid')
+
+
+class ReadWriteLock:
+    """
+    FAISS 인덱스 잠금: 검색(read)끼리는 동시에, 인덱스 수정(write)은 단독으로
+    쓰기가 기다리는 동안에는 새 읽기를 받지 않는다. 쓰기는 같은 스레드에서 다시 잡을 수 있다.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.readers = 0
+        self.writer = None          # 쓰기 중인 스레드
+        self.depth = 0
+        self.waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self.cond:
+            while self.writer is not None or self.waiting_writers:
+                self.cond.wait()
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.readers -= 1
+                if self.readers == 0:
+                    self.cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self.cond:
+            if self.writer != me:
+                self.waiting_writers += 1
+                try:
+                    while self.writer is not None or self.readers:
+                        self.cond.wait()
+                finally:
+                    self.waiting_writers -= 1
+                self.writer = me
+            self.depth += 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.writer = None
+                    self.cond.notify_all()
+
+
+class IndexManager:
+    """
+    문서 인식(document-aware) 인덱스 관리자
+    - 모든 청크에 고정 ID(stable chunk id)를 부여하고, 이 ID로 FAISS에 저장
+    - 문서마다 연속된 청크 ID 범위 [start, end)를 기록
+    - 문서 추가 시 해당 문서의 임베딩만 계산, 삭제 시 ID 범위만 제거
+    - 디스크 세대(CorpusSnapshot)에 연결되면 인덱스와 청크를 처음 접근할 때 연다
+    - index_type으로 Flat / IVF-Flat / IVF-PQ / HNSW 선택
+      (IVF 계열은 학습 벡터가 충분히 모일 때까지 Flat으로 운영 후 자동 전환)
+    - 같은 청크로 BM25 역색인(SparseIndex)도 유지해 하이브리드 검색 지원
+    - 검색은 lock을 잡지 않는다: FAISS 검색은 index_lock(읽기)만 잡고, 수정은 문서 하나를 반영하는
+      동안만 index_lock(쓰기)을 잡는다 (IVF 학습 등 재구축은 잠금 밖에서 만든 뒤 교체).
+      BM25 검색 뷰도 수정할 때 새로 만들어 바꿔 끼운다.
+    """
+
+    ADD_BATCH = 4096  # add_document가 한 번에 인덱스에 넣는 벡터 수
+    RETRAIN_GROWTH = 2  # IVF 학습 당시보다 벡터가 이 배수 이상 늘면 다시 학습
+    MAX_SPARSE_SEGMENTS = 16  # 저장하지 않고 BM25 세그먼트가 이보다 많이 쌓이면 하나로 합침
+
+    def __init__(self, dimension=None, index_type='flat', index_params=None):
+        if index_type not in rag_pipeline.INDEX_TYPES:
+            raise ValueError(f"지원하지 않는 인덱스 종류입니다: {index_type}")
+        self.dimension = dimension
+        self.index_type = index_type              # 목표 인덱스 종류
+        self.index_params = index_params or {}    # create_index에 넘길 파라미터
+        self.built_index_type = None              # 실제로 만들어진 인덱스 종류
+        self.trained_size = None                  # IVF 계열을 학습할 때의 벡터 수
+        self.snapshot = None
+        self._index = None
+        self._index_mmapped = False
+        self._index_cleared = False  # 벡터가 없어 인덱스를 비웠음 (세대의 인덱스 파일을 다시 읽지 않음)
+        self._sparse = None         # BM25 역색인 검색 뷰 (청크가 바뀌면 세그먼트로 다시 구성해 교체)
+        self._sparse_base = None    # 디스크 세대의 BM25 역색인 (mmap)
+        self._sparse_segments = []  # 세대 이후 추가된 문서별 BM25 세그먼트
+        self._sparse_removed = set()  # 세대 이후 삭제된 청크 ID (세그먼트에서 건너뜀)
+        self.chunks = ChunkTable()  # chunk_id -> chunk (열 단위 저장, 조회 시 dict)
+        self.documents = {}         # doc_id -> {'name', 'start', 'end', 'text', 'content_hash'}
+        self.next_id = 0
+        self.version = 0            # 청크가 추가/삭제될 때마다 증가 (답변 캐시 무효화 기준)
+        self.lock = threading.RLock()          # 수정 작업끼리의 순서 (검색은 잡지 않음)
+        self.index_lock = ReadWriteLock()      # FAISS 인덱스 검색/수정
+        self._index_load_lock = threading.Lock()
+        self.save_lock = threading.Lock()  # 디스크 저장은 한 번에 하나씩 (CorpusStore.save 참고)
+
+    @property
+    def index(self):
+        """FAISS 인덱스 (디스크 세대에 연결된 경우 첫 접근 시 mmap으로 로드)"""
+        if self._index is None and self.snapshot is not None and not self._index_cleared:
+            with self._index_load_lock:
+                if self._index is None and not self._index_cleared:
+                    self._index = self.snapshot.read_index(mmap_mode=True)
+                    self._index_mmapped = self._index is not None
+        return self._index
+
+    def has_index(self):
+        return self._index is not None or (
+            self.snapshot is not None and not self._index_cleared and os.path.exists(self.snapshot.index_path)
+        )
+
+    def _writable_index(self):
+        """추가/삭제 전에 호출: mmap으로 연 인덱스는 메모리로 다시 읽는다"""
+        if self.index is not None and self._index_mmapped:
+            self._index = self.snapshot.read_index(mmap_mode=False)
+            self._index_mmapped = False
+        return self._index
+
+    def index_for_save(self):
+        """
+        저장할 인덱스 (lock 안에서 호출)
+
+        Returns:
+            (세대 인덱스 파일 경로, None) - 세대 이후 인덱스를 고치지 않았으면 파일을 그대로 쓴다
+            (None, 직렬화한 uint8 배열) - 메모리에서 고친 인덱스 (메모리 복사만 하고 파일 쓰기는 잠금 밖에서)
+            (None, None) - 인덱스 없음 (세대 이후 비운 경우 포함)
+        """
+        if self._index_cleared:
+            return None, None
+        if self._index is None or self._index_mmapped:
+            if self.snapshot is not None and os.path.exists(self.snapshot.index_path):
+                return self.snapshot.index_path, None
+            return None, None
+        return None, faiss.serialize_index(self._index)
+
+    def _ensure_index(self, dimension):
+        if self._writable_index() is None:
+            self.dimension = dimension
+            # 학습이 필요한 인덱스는 벡터가 모일 때까지 Flat으로 시작
+            if rag_pipeline.min_training_size(self.index_type, 1) > 0:
+                initial_type = 'flat'
+            else:
+                initial_type = self.index_type
+            base = rag_pipeline.create_index(dimension, initial_type, **self._create_params(initial_type))
+            self._index = self._with_ids(base, initial_type)
+            self._index_cleared = False
+            self.built_index_type = initial_type
+        elif dimension != self.dimension:
+            raise ValueError(f"임베딩 차원이 다릅니다: {dimension} != {self.dimension}")
+
+    @staticmethod
+    def _with_ids(base, index_type):
+        """
+        청크 고정 ID로 저장할 수 있게 감싼다.
+        IVF 계열은 자체적으로 ID를 저장/삭제하므로 그대로 쓰고,
+        Flat/HNSW만 IndexIDMap2로 감싼다 (IDMap의 삭제는 번호를 당기는 Flat에서만 올바름).
+        """
+        if index_type in ('ivf_flat', 'ivf_pq'):
+            return base
+        return faiss.IndexIDMap2(base)
+
+    def _create_params(self, index_type):
+        """index_params 중 해당 인덱스 종류에 쓰이는 값만 추림"""
+        keys = {
+            'flat': (),
+            'hnsw': ('hnsw_m', 'ef_construction'),
+            'ivf_flat': ('nlist', 'max_training_size'),
+            'ivf_pq': ('nlist', 'pq_m', 'max_training_size'),
+        }[index_type]
+        return {key: self.index_params[key] for key in keys if self.index_params.get(key)}
+
+    def _maybe_train(self):
+        """
+        목표가 IVF 계열이고 학습 벡터가 충분해지면 인덱스를 학습된 종류로 재구축
+        이미 학습된 IVF 인덱스도 벡터가 학습 당시의 RETRAIN_GROWTH배 이상으로 늘거나
+        1/RETRAIN_GROWTH 미만으로 줄면 클러스터 수와 centroid가 데이터에 맞지 않으므로 다시 학습한다
+        (학습에 필요한 벡터 수보다 적어지면 rebuild_index가 Flat으로 되돌린다).
+        """
+        ntotal = self._index.ntotal
+        if self.built_index_type == self.index_type:
+            if self.trained_size and ntotal >= self.RETRAIN_GROWTH * self.trained_size:
+                print(f"인덱스 재학습: {self.index_type} ({self.trained_size} -> {ntotal} vectors)")
+                self.rebuild_index()
+            elif self.trained_size and ntotal * self.RETRAIN_GROWTH < self.trained_size:
+                print(f"인덱스 재학습 (축소): {self.index_type} ({self.trained_size} -> {ntotal} vectors)")
+                self.rebuild_index()
+            return
+        nlist = self.index_params.get('nlist') or rag_pipeline.default_nlist(ntotal)
+        if ntotal >= rag_pipeline.min_training_size(self.index_type, nlist):
+            print(f"인덱스 학습: {self.built_index_type} -> {self.index_type} ({ntotal} vectors)")
+            self.rebuild_index()
+
+    def sparse_index(self):
+        """
+        BM25 역색인
+        디스크 세대에 저장된 배열(mmap)에 세대 이후 추가된 문서의 세그먼트를 붙이고 삭제된 청크는 건너뛴다
+        (SegmentedSparseIndex 참고). 세그먼트는 저장할 때 하나로 합쳐진다.
+        이미 만든 검색 뷰는 잠금 없이 돌려준다 (수정 작업이 새 뷰로 교체).
+        """
+        sparse = self._sparse
+        if sparse is not None:
+            return sparse
+        with self.lock:
+            if self._sparse is None:
+                self._sparse = self._build_sparse()
+            return self._sparse
+
+    def _build_sparse(self):
+        """BM25 검색 뷰 구성 (lock 안에서 호출)"""
+        if self._sparse_base is None and self.snapshot is not None:
+            self._sparse_base = self.snapshot.read_sparse()
+            if self._sparse_base is None:
+                # 역색인을 저장하지 않은 예전 세대: 현재 청크 전체로 한 번 만든다
+                ids = list(self.chunks)
+                self._sparse_base = SparseIndex.build(ids, (self.chunks.get(i)['content'] for i in ids))
+                self._sparse_segments = []
+                self._sparse_removed = set()
+        segments = ([self._sparse_base] if self._sparse_base is not None else []) + self._sparse_segments
+        if len(self._sparse_segments) > self.MAX_SPARSE_SEGMENTS:
+            self._sparse_base = SegmentedSparseIndex(segments, self._sparse_removed).merged()
+            self._sparse_segments = []
+            self._sparse_removed = set()
+            segments = [self._sparse_base]
+        if len(segments) == 1 and not self._sparse_removed:
+            return segments[0]
+        return SegmentedSparseIndex(segments, self._sparse_removed)
+
+    def vector_matrix(self):
+        """
+        (청크 ID 배열, 원본 임베딩 행렬)
+        원본 임베딩이 저장되지 않은 예전 형식이면 인덱스에서 복원한다.
+        """
+        with self.lock:
+            result = self.chunks.vector_matrix()
+            if result is not None:
+                return result
+            ids = np.fromiter(iter(self.chunks), dtype='int64')
+            vectors = np.vstack([self.index.reconstruct(int(i)) for i in ids]) if len(ids) else None
+            return ids, vectors
+
+    def rebuild_index(self, index_type=None, **index_params):
+        """
+        저장된 원본 임베딩으로 인덱스를 다시 만든다 (임베딩 재계산 없음)
+        index_type을 주면 목표 인덱스 종류도 함께 바꾼다.
+
+        Returns:
+            실제로 만들어진 인덱스 종류
+        """
+        with self.lock:
+            if index_type is not None:
+                if index_type not in rag_pipeline.INDEX_TYPES:
+                    raise ValueError(f"지원하지 않는 인덱스 종류입니다: {index_type}")
+                self.index_type = index_type
+                self.index_params = index_params
+            ids, vectors = self.vector_matrix()
+            if vectors is None:
+                with self.index_lock.write():
+                    self._index = None
+                    self._index_mmapped = False
+                    self._index_cleared = True
+                self.built_index_type = None
+                self.trained_size = None
+                return None
+
+            build_type = self.index_type
+            nlist = self.index_params.get('nlist') or rag_pipeline.default_nlist(len(vectors))
+            if len(vectors) < rag_pipeline.min_training_size(build_type, nlist):
+                build_type = 'flat'
+            base = rag_pipeline.create_index(
+                vectors.shape[1], build_type, training_vectors=vectors, **self._create_params(build_type)
+            )
+            index = self._with_ids(base, build_type)
+            index.add_with_ids(vectors, ids)
+            # 학습/추가는 새 인덱스에 하므로 검색은 교체하는 순간만 기다린다
+            with self.index_lock.write():
+                self._index = index
+                self._index_mmapped = False
+                self._index_cleared = False
+            self.dimension = vectors.shape[1]
+            self.built_index_type = build_type
+            self.version += 1  # 검색 결과가 달라질 수 있으므로 답변 캐시/저장 기준도 바꾼다
+            self.trained_size = len(vectors) if rag_pipeline.min_training_size(build_type, 1) > 0 else None
+            return build_type
+
+    def add_document(self, doc_id, chunks, embeddings, name=None, text="", content_hash=None):
+        """
+        문서 하나의 청크와 임베딩을 인덱스에 추가
+        같은 doc_id가 이미 있으면 기존 청크를 지우고 교체한다.
+        content_hash는 원본 내용 해시 (같은 이름의 다른 파일인지 확인할 때 사용).
+        chunks는 len과 반복만 되면 되고 embeddings는 memmap이어도 되며,
+        인덱스에는 ADD_BATCH행씩 나눠 넣는다 (DocumentSpool 참고).
+        DocumentSpool의 청크/임베딩/원문(SpooledText)은 복사하지 않고 다음 저장까지 스풀 파일을 참조한다.
+
+        Returns:
+            추가된 청크 수
+        """
+        if not len(chunks):
+            return 0
+
+        embeddings = np.asarray(embeddings, dtype='float32')  # memmap이면 복사하지 않음
+        if len(embeddings) != len(chunks):
+            raise ValueError("청크 수와 임베딩 수가 일치하지 않습니다.")
+
+        with self.lock:
+            self._writable_index()  # mmap으로 연 인덱스는 쓰기 잠금 전에 메모리로 읽어 둔다
+
+            # 검색은 문서 하나가 통째로 반영되기 전 또는 후의 상태만 본다
+            with self.index_lock.write():
+                if doc_id in self.documents:
+                    # 재학습 여부는 새 청크까지 넣은 뒤 한 번만 판단
+                    self.remove_document(doc_id, retrain=False)
+                self._ensure_index(embeddings.shape[1])
+                start = self.next_id
+                ids = np.arange(start, start + len(chunks), dtype='int64')
+                for batch_start in range(0, len(ids), self.ADD_BATCH):
+                    batch = slice(batch_start, batch_start + self.ADD_BATCH)
+                    self._index.add_with_ids(np.ascontiguousarray(embeddings[batch], dtype='float32'), ids[batch])
+                self.chunks.append(ids, chunks, doc_id, embeddings)
+                self.version += 1
+
+                self.next_id = start + len(chunks)
+                self.documents[doc_id] = {
+                    'name': name or doc_id,
+                    'start': start,
+                    'end': self.next_id,
+                    'text': text,
+                    'content_hash': content_hash
+                }
+
+            # BM25는 이 문서의 청크만 세그먼트로 만들어 붙인다
+            self._sparse_segments.append(SparseIndex.build(ids, (self.chunks.get(int(i))['content'] for i in ids)))
+            self._sparse = self._build_sparse()
+            self._maybe_train()
+            return len(chunks)
+
+    def remove_document(self, doc_id, retrain=True):
+        """
+        문서의 청크 ID 범위만 인덱스에서 제거 (전체 재구축 없음)
+        retrain이면 IVF 인덱스가 학습 당시보다 크게 줄었을 때 다시 학습한다 (_maybe_train 참고).
+
+        Returns:
+            삭제된 청크 수 (문서가 없으면 0)
+        """
+        with self.lock:
+            if doc_id not in self.documents:
+                return 0
+            self._writable_index()
+
+            with self.index_lock.write():
+                doc = self.documents.pop(doc_id)
+                start, end = doc['start'], doc['end']
+                for chunk_id in range(start, end):
+                    self.chunks.pop(chunk_id, None)
+                self._sparse_removed.update(range(start, end))
+                self.version += 1
+                rebuilt = False
+                if self._index is not None:
+                    try:
+                        self._index.remove_ids(faiss.IDSelectorRange(start, end))
+                    except RuntimeError:
+                        # HNSW는 개별 삭제를 지원하지 않으므로 남은 임베딩으로 재구축 (검색도 끝날 때까지 대기)
+                        self.rebuild_index()
+                        rebuilt = True
+
+            self._sparse = self._build_sparse()
+            if retrain and not rebuilt and self._index is not None:
+                self._maybe_train()
+            return end - start
+
+    def search(self, query_embeddings, k, nprobe=None, ef_search=None):
+        """
+        질의 임베딩으로 검색
+        결과 ID는 청크 고정 ID이며, 결과가 모자라면 -1로 채워진다.
+        nprobe(IVF) / ef_search(HNSW)로 요청별 정확도/속도를 조절할 수 있다.
+        lock은 잡지 않고 index_lock(읽기)만 잡으므로 수집/재학습 중에도 기다리지 않는다.
+        """
+        query_embeddings = np.ascontiguousarray(query_embeddings, dtype='float32')
+        self.index  # 디스크 세대의 인덱스는 첫 검색 때 로드
+        with self.index_lock.read():
+            index = self._index
+            if index is None or index.ntotal == 0:
+                n = len(query_embeddings)
+                return (np.full((n, k), np.inf, dtype='float32'),
+                        np.full((n, k), -1, dtype='int64'))
+            params = rag_pipeline.search_params(index, nprobe, ef_search)
+            if params is not None:
+                return index.search(query_embeddings, k, params=params)
+            return index.search(query_embeddings, k)
+
+    def retrieve(self, query_embeddings, query_texts, k, mode='hybrid', candidates=50,
+                 nprobe=None, ef_search=None):
+        """
+        검색 방식(mode)에 따라 밀집/희소/하이브리드 검색
+        hybrid는 양쪽에서 max(k, candidates)개씩 뽑아 RRF로 합친다.
+
+        Returns:
+            (점수, 청크 ID) 행렬 - search()와 같은 모양, 결과가 모자라면 ID -1
+            (dense는 L2 거리(작을수록 좋음), sparse/hybrid는 BM25/RRF 점수(클수록 좋음))
+        """
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"지원하지 않는 검색 방식입니다: {mode}")
+        if mode == 'dense':
+            return self.search(query_embeddings, k, nprobe=nprobe, ef_search=ef_search)
+
+        depth = max(k, candidates)
+        dense_ids = None
+        if mode == 'hybrid':
+            dense_ids = self.search(query_embeddings, depth, nprobe=nprobe, ef_search=ef_search)[1]
+        sparse = self.sparse_index()
+
+        scores = np.zeros((len(query_texts), k), dtype='float32')
+        ids = np.full((len(query_texts), k), -1, dtype='int64')
+        for i, text in enumerate(query_texts):
+            row_scores, row_ids = sparse.search(text, depth if dense_ids is not None else k)
+            if dense_ids is not None:
+                row_scores, row_ids = reciprocal_rank_fusion([dense_ids[i], row_ids], k)
+            scores[i, :len(row_ids)] = row_scores
+            ids[i, :len(row_ids)] = row_ids
+        return scores, ids
+
+    def evaluate_recall(self, k=10, n_queries=100, nprobe=None, ef_search=None, seed=0):
+        """
+        현재 인덱스의 recall@k를 Flat 기준과 비교
+        질의는 저장된 청크 임베딩에서 무작위로 뽑는다.
+        """
+        with self.lock:
+            ids, vectors = self.vector_matrix()
+            if vectors is None:
+                return None
+            rng = np.random.default_rng(seed)
+            picked = rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)
+            params = rag_pipeline.search_params(self.index, nprobe, ef_search)
+            result = rag_pipeline.evaluate_recall(
+                self.index, vectors, vectors[picked], k=k, ids=ids, params=params
+            )
+            result['index_type'] = self.built_index_type
+            return result
+
+    def get_chunk(self, chunk_id):
+        """청크 ID로 청크 조회 (없으면 None)"""
+        return self.chunks.get(int(chunk_id))
+
+    def list_chunks(self):
+        """ID 순으로 정렬된 전체 청크 목록"""
+        with self.lock:
+            return list(self.chunks.values())
+
+    def list_documents(self):
+        """문서 목록 (본문 텍스트 제외)"""
+        with self.lock:
+            return [
+                {
+                    'doc_id': doc_id,
+                    'name': doc['name'],
+                    'chunk_start': doc['start'],
+                    'chunk_end': doc['end'],
+                    'chunk_count': doc['end'] - doc['start'],
+                    'content_hash': doc.get('content_hash')
+                }
+                for doc_id, doc in self.documents.items()
+            ]
+
+    def document_text(self, doc_id):
+        """문서 원문 (디스크에 저장된 문서는 필요할 때 읽음)"""
+        doc = self.documents.get(doc_id)
+        if doc is None:
+            return ""
+        if doc['text'] is None:
+            return self.snapshot.document_text(doc_id)
+        if not isinstance(doc['text'], str):
+            return doc['text'].read()  # 아직 저장되지 않은 업로드 문서 (SpooledText)
+        return doc['text']
+
+    def combined_text(self):
+        """문서별 원문을 업로드 순서대로 이어붙인 텍스트"""
+        with self.lock:
+            texts = [self.document_text(doc_id) for doc_id in self.documents]
+            return "\n\n=== 문서 구분 ===\n\n".join(text for text in texts if text)
+
+    def attach(self, snapshot):
+        """
+        디스크 세대에 연결
+        청크와 문서 원문은 세대 파일에서 읽도록 바꿔 메모리에 들고 있지 않는다.
+        이미 메모리에 있는 인덱스는 그대로 사용한다.
+        """
+        with self.lock:
+            self.snapshot = snapshot
+            self._index_cleared = False  # 새 세대의 인덱스 파일이 현재 상태 (비웠으면 파일 없음)
+            self.dimension = snapshot.dimension
+            self.index_type = snapshot.target_index_type
+            self.index_params = snapshot.index_params
+            self.built_index_type = snapshot.index_type
+            self.trained_size = snapshot.trained_size
+            self.next_id = snapshot.next_id
+            self.version = snapshot.version
+            self.chunks = ChunkTable(snapshot)
+            # 세대에 합쳐 저장된 BM25 역색인을 기준으로 다시 시작
+            self._sparse = None
+            self._sparse_base = None
+            self._sparse_segments = []
+            self._sparse_removed = set()
+            self.documents = {
+                doc['doc_id']: {
+                    'name': doc['name'],
+                    'start': doc['start'],
+                    'end': doc['end'],
+                    'text': None,
+                    'content_hash': doc.get('content_hash')
+                }
+                for doc in snapshot.documents
+            }
+
+    @classmethod
+    def open(cls, snapshot):
+        """디스크 세대를 연다 (manifest만 읽으며 인덱스/청크는 지연 로드)"""
+        manager = cls(snapshot.dimension, snapshot.target_index_type, snapshot.index_params)
+        manager.attach(snapshot)
+        return manager
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def is_dirty(self):
+        """디스크 세대에 저장되지 않은 변경이 있는지"""
+        if self.snapshot is None:
+            return bool(self.documents)
+        return bool(len(self.chunks.added) or self.chunks.removed)
+
+    def _index_bytes(self):
+        """메모리에 올라간 FAISS 인덱스 크기 추정 (벡터당 코드 크기 + ID)"""
+        index = self._index
+        if index is None:
+            return 0
+        d = index.d
+        if self.built_index_type == 'ivf_pq':
+            per_vector = faiss.extract_index_ivf(index).code_size + 8
+        elif self.built_index_type == 'hnsw':
+            per_vector = d * 4 + self.index_params.get('hnsw_m', 32) * 2 * 4 + 8
+        else:
+            per_vector = d * 4 + 8
+        if self._index_mmapped and self.built_index_type in ('ivf_flat', 'ivf_pq'):
+            # 역색인 리스트는 디스크(mmap)에 있고 coarse quantizer만 메모리에 있다
+            return faiss.extract_index_ivf(index).nlist * d * 4
+        return index.ntotal * per_vector
+
+    def memory_usage(self):
+        """
+        컬렉션 메모리 사용량 추정 (바이트)
+        resident_bytes는 프로세스 메모리에 올라간 부분, mapped_bytes는 mmap으로 연 세대 파일 크기
+        (mmap 부분은 운영체제가 필요할 때만 읽고 내보낼 수 있다).
+        """
+        with self.lock:
+            chunk_bytes = self.chunks.added.nbytes
+            sparse_bytes, mapped_bytes = 0, self.chunks.added.mapped_nbytes
+            segments = [self._sparse_base] if self._sparse_base is not None else []
+            for segment in segments + self._sparse_segments:
+                if isinstance(segment.terms, np.memmap):
+                    mapped_bytes += segment.nbytes
+                else:
+                    sparse_bytes += segment.nbytes
+            if self.snapshot is not None and self.snapshot._columns is not None:
+                for name, column in self.snapshot._columns.items():
+                    if column is not None:
+                        mapped_bytes += column.nbytes if hasattr(column, 'nbytes') else len(column)
+            index_bytes = self._index_bytes()
+            return {
+                'index_bytes': index_bytes,
+                'chunk_bytes': chunk_bytes,
+                'sparse_bytes': sparse_bytes,
+                'resident_bytes': index_bytes + chunk_bytes + sparse_bytes,
+                'mapped_bytes': mapped_bytes
+            }
+
+    @classmethod
+    def from_legacy(cls, index, chunks, doc_id="legacy", text="", index_type='flat'):
+        """
+        기존 IndexFlatL2 + chunks 리스트 (washing_machine.index / chunks.pkl)를
+        하나의 문서로 가져온다. 임베딩은 인덱스에서 복원하므로 재계산하지 않는다.
+        """
+        manager = cls(index.d, index_type)
+        n = min(index.ntotal, len(chunks))
+        if n == 0:
+            return manager
+        embeddings = index.reconstruct_n(0, n)
+        manager.add_document(doc_id, chunks[:n], embeddings, text=text)
+        return manager
@@ -0,0 +1,143 @@
+# 문서 수집(ingest) 백그라운드 작업
+# 추출/청킹/임베딩은 CPU를 오래 쓰므로 이벤트 루프가 아닌 작업자 스레드 풀에서 실행하고,
+# 작업 ID로 단계별 진행 상황을 조회할 수 있게 한다.
+
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+STAGES = ('extract', 'chunk', 'embed', 'index')
+
+
+class IngestJob:
+    """수집 작업 하나의 상태 (단계별 진행률 포함)"""
+
+    def __init__(self, description=""):
+        self.id = uuid.uuid4().hex
+        self.description = description
+        self.status = 'queued'  # queued / running / done / failed
+        self.stages = {stage: {'status': 'pending', 'done': 0, 'total': None} for stage in STAGES}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.version = 0  # 상태가 바뀔 때마다 증가 (SSE 변경 감지용)
+        self.lock = threading.Lock()
+
+    def update(self, stage, done=None, total=None, status='running'):
+        """단계 진행 상황 갱신 (done/total은 주어진 값만 바꿈)"""
+        with self.lock:
+            info = self.stages[stage]
+            info['status'] = status
+            if done is not None:
+                info['done'] = done
+            if total is not None:
+                info['total'] = total
+            self.version += 1
+
+    def add_total(self, stage, count):
+        """단계 전체 처리량 증가 (문서를 하나씩 준비하면서 합산)"""
+        with self.lock:
+            info = self.stages[stage]
+            info['total'] = (info['total'] or 0) + count
+            self.version += 1
+
+    def advance(self, stage, count=1):
+        """단계 처리량 증가"""
+        with self.lock:
+            info = self.stages[stage]
+            info['status'] = 'running'
+            info['done'] += count
+            self.version += 1
+
+    def finish_stage(self, stage):
+        with self.lock:
+            info = self.stages[stage]
+            info['status'] = 'done'
+            if info['total'] is None:
+                info['total'] = info['done']
+            self.version += 1
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'job_id': self.id,
+                'description': self.description,
+                'status': self.status,
+                'stages': {stage: dict(info) for stage, info in self.stages.items()},
+                'result': self.result,
+                'error': self.error,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'version': self.version
+            }
+
+
+class JobManager:
+    """
+    수집 작업 관리자
+    - 작업자 스레드 풀에서 작업 실행 (이벤트 루프를 막지 않음)
+    - 완료된 작업은 max_finished개까지만 보관
+    """
+
+    def __init__(self, max_workers=1, max_finished=100):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ingest')
+        self.jobs = {}
+        self.max_finished = max_finished
+        self.lock = threading.Lock()
+
+    def submit(self, func, *args, description="", **kwargs):
+        """
+        func(job, *args, **kwargs)를 백그라운드에서 실행
+
+        Returns:
+            (IngestJob, concurrent.futures.Future)
+        """
+        job = IngestJob(description)
+        with self.lock:
+            self.jobs[job.id] = job
+            self._prune()
+
+        def run():
+            with job.lock:
+                job.status = 'running'
+                job.started_at = time.time()
+                job.version += 1
+            try:
+                result = func(job, *args, **kwargs)
+                with job.lock:
+                    job.result = result
+                    job.status = 'done'
+            except Exception as e:
+                traceback.print_exc()
+                with job.lock:
+                    job.error = str(e)
+                    job.status = 'failed'
+                    for info in job.stages.values():
+                        if info['status'] == 'running':
+                            info['status'] = 'failed'
+            finally:
+                with job.lock:
+                    job.finished_at = time.time()
+                    job.version += 1
+            return job
+
+        return job, self.executor.submit(run)
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def _prune(self):
+        finished = [job for job in self.jobs.values() if job.status in ('done', 'failed')]
+        excess = len(finished) - self.max_finished
+        if excess > 0:
+            for job in sorted(finished, key=lambda j: j.finished_at or 0)[:excess]:
+                self.jobs.pop(job.id, None)
@@ -0,0 +1,247 @@
+# 스트리밍 수집 파이프라인
+# 페이지 -> 문장 -> 청크 -> 임베딩 배치 -> 인덱스 순으로 흘려보내며,
+# 단계마다 별도 스레드에서 실행하고 단계 사이는 크기가 정해진 Queue로 연결한다.
+# 느린 단계(보통 임베딩)가 있으면 앞 단계가 기다리므로, 메모리에 올라가는 중간 결과는
+# 문서 크기가 아니라 배치 크기 x 큐 크기에 비례한다.
+# 문서 하나의 결과는 DocumentSpool(임시 디렉터리)에 이어 쓰고, 인덱스 반영 때 순서대로 읽는다.
+# 인덱스에 반영된 스풀 파일은 다음 저장까지 코퍼스가 그대로 참조하며, 참조가 모두 사라지면 지운다.
+
+import mmap
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import weakref
+from array import array
+import numpy as np
+
+_DONE = object()
+
+
+class _Failure:
+    """앞 단계에서 난 예외를 다음 단계로 전달"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def batched(items, size):
+    """반복자를 size개씩 리스트로 묶음"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def pipeline(source, *stages, maxsize=2):
+    """
+    source -> stages[0] -> stages[1] -> ... 를 단계마다 별도 스레드에서 실행하는 제너레이터
+
+    Args:
+        source: 첫 단계가 읽을 반복자 (첫 단계 스레드에서 소비됨)
+        stages: 반복자를 받아 반복자를 돌려주는 함수들
+        maxsize: 단계 사이 큐 크기 (단계당 메모리에 대기하는 항목 수 상한)
+
+    어느 단계에서든 예외가 나면 마지막 단계를 소비하는 쪽에서 다시 발생하며,
+    소비를 중간에 멈추면(close/예외) 모든 단계 스레드가 종료된다.
+    """
+    stop = threading.Event()
+
+    def put(out, item):
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def drain(inbox):
+        while True:
+            try:
+                item = inbox.get(timeout=0.1)
+            except queue.Empty:
+                if stop.is_set():
+                    return
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+
+    def run(items, out):
+        try:
+            for item in items:
+                if not put(out, item):
+                    return
+            put(out, _DONE)
+        except BaseException as e:
+            put(out, _Failure(e))
+        finally:
+            close = getattr(items, 'close', None)
+            if close is not None:
+                close()
+
+    upstream = iter(source)
+    for index, stage in enumerate(stages):
+        out = queue.Queue(maxsize)
+        threading.Thread(target=run, args=(stage(upstream), out), name=f'ingest-stage-{index}',
+                         daemon=True).start()
+        upstream = drain(out)
+
+    try:
+        yield from upstream
+    finally:
+        stop.set()
+
+
+class SpoolDirectory:
+    """스풀 임시 디렉터리 (이 객체를 참조하는 곳이 모두 사라지면 삭제)"""
+
+    def __init__(self, root):
+        os.makedirs(root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix='doc-', dir=root)
+        weakref.finalize(self, shutil.rmtree, self.path, True)
+
+
+class SpooledText:
+    """DocumentSpool의 원문 (메모리에 올리지 않고 필요할 때 파일에서 읽음)"""
+
+    def __init__(self, path, owner):
+        self.path = path
+        self.owner = owner  # 파일이 있는 스풀 디렉터리를 살려 둠
+
+    def read(self):
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            return f.read()
+
+    def copy_to(self, f):
+        """UTF-8 바이트를 f에 그대로 복사하고 복사한 바이트 수 반환"""
+        with open(self.path, 'rb') as src:
+            shutil.copyfileobj(src, f)
+        return os.path.getsize(self.path)
+
+
+class SpooledChunks:
+    """DocumentSpool의 청크를 순서대로 읽는 시퀀스 (len과 반복만 지원)"""
+
+    def __init__(self, spool):
+        self.spool = spool
+
+    def __len__(self):
+        return len(self.spool)
+
+    def __iter__(self):
+        spool = self.spool
+        with open(os.path.join(spool.path, 'content.bin'), 'rb') as f:
+            for i in range(len(spool)):
+                content = f.read(spool.offsets[i + 1] - spool.offsets[i]).decode('utf-8')
+                yield {
+                    'id': i,
+                    'page': spool.pages[i],
+                    'title': content[:50],
+                    'content': content,
+                    'token_count': spool.tokens[i]
+                }
+
+    def columns(self):
+        """
+        청크 열 (ChunkColumns.append가 청크 dict를 만들지 않고 스풀 파일을 그대로 참조할 때 사용)
+        content는 content.bin의 읽기 전용 mmap, owner는 스풀 디렉터리다.
+        """
+        spool = self.spool
+        path = os.path.join(spool.path, 'content.bin')
+        if os.path.getsize(path) == 0:
+            content = b''
+        else:
+            with open(path, 'rb') as f:
+                content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return {
+            'pages': np.asarray(spool.pages, dtype='int32'),
+            'tokens': np.asarray(spool.tokens, dtype='int32'),
+            'offsets': np.asarray(spool.offsets, dtype='int64'),
+            'content': content,
+            'owner': spool.owner
+        }
+
+
+class DocumentSpool:
+    """
+    문서 하나의 수집 결과를 임시 디렉터리에 순서대로 기록
+    원문은 text.txt, 청크 본문은 content.bin, 임베딩은 embeddings.f32에 이어 쓰고
+    메모리에는 청크별 페이지/토큰 수/오프셋 정수만 둔다.
+
+    Args:
+        root: 임시 디렉터리를 만들 위치
+    """
+
+    def __init__(self, root):
+        self.owner = SpoolDirectory(root)
+        self.path = self.owner.path
+        self._text = open(os.path.join(self.path, 'text.txt'), 'w', encoding='utf-8', newline='')
+        self._content = open(os.path.join(self.path, 'content.bin'), 'wb')
+        self._vectors = open(os.path.join(self.path, 'embeddings.f32'), 'wb')
+        self.pages = array('i')
+        self.tokens = array('i')
+        self.offsets = array('q', [0])
+        self.dimension = None
+
+    def __len__(self):
+        return len(self.pages)
+
+    def write_text(self, text):
+        self._text.write(text)
+
+    def add(self, chunks, embeddings):
+        """청크 배치와 그 임베딩을 이어 씀"""
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+        if len(embeddings) != len(chunks):
+            raise ValueError("청크 수와 임베딩 수가 일치하지 않습니다.")
+        if len(chunks) == 0:
+            return
+        if self.dimension is None:
+            self.dimension = embeddings.shape[1]
+        self._vectors.write(embeddings.tobytes())
+        for chunk in chunks:
+            data = chunk['content'].encode('utf-8')
+            self._content.write(data)
+            self.offsets.append(self.offsets[-1] + len(data))
+            self.pages.append(chunk['page'])
+            self.tokens.append(chunk.get('token_count', 0))
+
+    def finish(self):
+        """쓰기 종료 (이후 읽기 가능)"""
+        for f in (self._text, self._content, self._vectors):
+            f.close()
+
+    def text(self):
+        """원문 (파일에 남겨 두고 참조하는 SpooledText)"""
+        return SpooledText(os.path.join(self.path, 'text.txt'), self.owner)
+
+    def text_head(self, n):
+        with open(os.path.join(self.path, 'text.txt'), 'r', encoding='utf-8', newline='') as f:
+            return f.read(n)
+
+    def chunks(self):
+        return SpooledChunks(self)
+
+    def embeddings(self):
+        """(청크 수, 차원) float32 memmap"""
+        if not len(self):
+            return np.zeros((0, self.dimension or 0), dtype='float32')
+        return np.memmap(os.path.join(self.path, 'embeddings.f32'), dtype='float32', mode='r',
+                         shape=(len(self), self.dimension))
+
+    def close(self):
+        """
+        쓰기를 끝내고 스풀 디렉터리 참조를 놓는다
+        인덱스에 반영되지 않았으면 바로 지워지고, 반영되었으면 코퍼스가 저장되어 참조를 놓을 때 지워진다.
+        """
+        self.finish()
+        self.owner = None
@@ -0,0 +1,113 @@
+# LLM 프롬프트 접두어 KV 캐시
+# /chat, /generate 프롬프트는 같은 지시문으로 시작하므로 (prompts.PROMPT_PREFIXES)
+# 접두어를 한 번만 평가해 Llama.save_state()로 KV 상태를 저장해 두고,
+# 요청 전에 load_state()로 복원해서 검색 문맥과 질문 부분만 평가하게 한다.
+#
+# llama-cpp는 직전 입력과 겹치는 앞부분을 자동으로 재사용하므로,
+# 컨텍스트에 이미 같은 접두어가 남아 있으면 복원하지 않는다.
+# (예: /chat 다음 /generate가 오면 접두어가 달라 복원, /chat이 연속이면 그대로 사용)
+
+import threading
+import time
+import numpy as np
+
+
+class PromptPrefixCache:
+    """
+    Llama 인스턴스별 고정 접두어 KV 상태 캐시
+
+    Args:
+        prefixes: 이름 -> 접두어 텍스트
+    """
+
+    def __init__(self, prefixes):
+        self.prefixes = dict(prefixes)
+        self.lock = threading.Lock()
+        self.states = {}  # (Llama, 이름) -> (접두어 토큰 배열, LlamaState)
+        self.resident = 0   # 컨텍스트에 접두어가 이미 남아 있던 횟수
+        self.restored = 0   # load_state로 복원한 횟수
+        self.misses = 0     # 해당하는 접두어가 없던 프롬프트 수
+        self.restore_ms = 0.0
+        self.info = {}  # 이름 -> 토큰 수, 접두어 평가 시간(복원 1회당 절약되는 시간의 추정치), 상태 크기
+
+    @staticmethod
+    def _tokenize(model, text):
+        # create_completion과 같은 방식으로 토큰화 (BOS 포함)
+        return np.array(model.tokenize(text.encode('utf-8'), add_bos=True, special=True), dtype=np.intc)
+
+    def _build(self, model, name):
+        tokens = self._tokenize(model, self.prefixes[name])
+        start = time.perf_counter()
+        model.reset()
+        model.eval(tokens.tolist())
+        state = model.save_state()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.states[(model, name)] = (tokens, state)
+            self.info[name] = {
+                'tokens': len(tokens),
+                'eval_ms': elapsed_ms,
+                'state_bytes': state.llama_state_size
+            }
+        return tokens, state
+
+    def warm(self, models):
+        """모든 컨텍스트에 대해 접두어 상태를 미리 계산"""
+        for model in models:
+            for name in self.prefixes:
+                self._build(model, name)
+
+    def prepare(self, model, prompt):
+        """
+        prompt가 등록된 접두어로 시작하면 model의 KV 캐시를 접두어 상태로 맞춘다.
+        model은 호출자가 독점하고 있어야 한다 (LLMScheduler 대여 중).
+
+        Returns:
+            사용한 접두어 이름 또는 None
+        """
+        names = [name for name, text in self.prefixes.items() if prompt.startswith(text)]
+        if not names:
+            with self.lock:
+                self.misses += 1
+            return None
+        name = max(names, key=lambda n: len(self.prefixes[n]))
+
+        with self.lock:
+            cached = self.states.get((model, name))
+        if cached is None:
+            # 처음 쓰는 컨텍스트: 접두어를 평가하면 그 상태가 그대로 컨텍스트에 남는다
+            self._build(model, name)
+            with self.lock:
+                self.resident += 1
+            return name
+
+        tokens, state = cached
+        n = len(tokens)
+        # 접두어 경계에서 토큰이 합쳐지면 재사용할 수 없다
+        prompt_tokens = self._tokenize(model, prompt)
+        if len(prompt_tokens) < n or not np.array_equal(prompt_tokens[:n], tokens):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        if model.n_tokens >= n and np.array_equal(model.input_ids[:n], tokens):
+            with self.lock:
+                self.resident += 1
+            return name
+
+        start = time.perf_counter()
+        model.load_state(state)
+        with self.lock:
+            self.restored += 1
+            self.restore_ms += (time.perf_counter() - start) * 1000
+        return name
+
+    def stats(self):
+        with self.lock:
+            return {
+                'prefixes': {name: dict(info) for name, info in self.info.items()},
+                'resident': self.resident,
+                'restored': self.restored,
+                'misses': self.misses,
+                'avg_restore_ms': self.restore_ms / self.restored if self.restored else None
+            }
@@ -0,0 +1,168 @@
+# LLM 추론 스케줄러
+# 하나의 llama.cpp 컨텍스트를 여러 요청 스레드가 동시에 쓰지 않도록
+# 컨텍스트 풀 + 선착순(FIFO) 대기열로 요청을 조율한다.
+# - 대기열이 가득 차면 즉시 거절 (HTTP 429)
+# - 대기 시간 초과 시 거절, 생성 시간 초과 시 생성을 중단
+# - 대기/생성 시간 지표 수집
+
+import threading
+import time
+from collections import deque
+from llama_cpp import StoppingCriteriaList
+
+
+class SchedulerBusy(Exception):
+    """대기열이 가득 찼거나 대기 시간이 초과됨 (HTTP 429로 응답)"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LLMLease:
+    """
+    대여한 LLM 컨텍스트
+    스트리밍 응답처럼 요청 함수가 끝난 뒤에도 생성이 이어지는 경우를 위해
+    with 블록 대신 release()로 직접 반납할 수도 있다 (중복 호출은 무시).
+    """
+
+    def __init__(self, scheduler, model, wait_ms, generation_timeout):
+        self.scheduler = scheduler
+        self.model = model
+        self.wait_ms = wait_ms
+        self.started_at = time.perf_counter()
+        self.deadline = self.started_at + generation_timeout if generation_timeout else None
+        self.timed_out = False
+        self._released = False
+
+    def stopping_criteria(self):
+        """생성 시간 초과 시 토큰 생성을 멈추는 llama-cpp stopping_criteria"""
+        def past_deadline(input_ids, logits):
+            if self.deadline is not None and time.perf_counter() > self.deadline:
+                self.timed_out = True
+                return True
+            return False
+        return StoppingCriteriaList([past_deadline])
+
+    def wrap(self, events):
+        """이터레이터를 끝까지 (또는 클라이언트 연결 종료까지) 소비한 뒤 반납하는 제너레이터"""
+        try:
+            yield from events
+        finally:
+            self.release()
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self.scheduler._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class LLMScheduler:
+    """
+    LLM 컨텍스트 풀 스케줄러
+
+    Args:
+        models: Llama 인스턴스 목록 (컨텍스트마다 별도 KV 캐시/메모리 사용)
+        max_queue: 대기 가능한 최대 요청 수 (초과 시 SchedulerBusy)
+        queue_timeout: 컨텍스트를 기다리는 최대 시간(초)
+        generation_timeout: 요청 하나의 최대 생성 시간(초)
+    """
+
+    def __init__(self, models, max_queue=8, queue_timeout=30.0, generation_timeout=120.0, window=1000):
+        self.free = list(models)
+        self.pool_size = len(self.free)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.generation_timeout = generation_timeout
+        self.cond = threading.Condition()
+        self.waiters = deque()
+        self.wait_ms = deque(maxlen=window)
+        self.generation_ms = deque(maxlen=window)
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.generation_timeouts = 0
+
+    def acquire(self, timeout=None):
+        """
+        사용 가능한 컨텍스트를 선착순으로 대여
+
+        Raises:
+            SchedulerBusy: 대기열이 가득 찼거나 timeout 안에 컨텍스트를 얻지 못함
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+        start = time.perf_counter()
+        with self.cond:
+            if not self.free or self.waiters:
+                if len(self.waiters) >= self.max_queue:
+                    self.rejected += 1
+                    raise SchedulerBusy(f"요청이 많아 처리할 수 없습니다. (대기 {len(self.waiters)}건)")
+
+            ticket = object()
+            self.waiters.append(ticket)
+            deadline = start + timeout
+            while not (self.free and self.waiters[0] is ticket):
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self.waiters.remove(ticket)
+                    self.timeouts += 1
+                    self.cond.notify_all()
+                    raise SchedulerBusy(f"대기 시간({timeout:.0f}초)이 초과되었습니다.", retry_after=int(timeout))
+                self.cond.wait(remaining)
+
+            self.waiters.popleft()
+            model = self.free.pop()
+            self.cond.notify_all()
+
+        wait_ms = (time.perf_counter() - start) * 1000
+        self.wait_ms.append(wait_ms)
+        return LLMLease(self, model, wait_ms, self.generation_timeout)
+
+    def _release(self, lease):
+        generation_ms = (time.perf_counter() - lease.started_at) * 1000
+        with self.cond:
+            self.free.append(lease.model)
+            self.generation_ms.append(generation_ms)
+            self.completed += 1
+            if lease.timed_out:
+                self.generation_timeouts += 1
+            self.cond.notify_all()
+
+    def metrics(self):
+        with self.cond:
+            wait_ms = list(self.wait_ms)
+            generation_ms = list(self.generation_ms)
+            return {
+                'pool_size': self.pool_size,
+                'in_use': self.pool_size - len(self.free),
+                'queue_depth': len(self.waiters),
+                'max_queue': self.max_queue,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'queue_timeouts': self.timeouts,
+                'generation_timeouts': self.generation_timeouts,
+                'queue_wait_ms': {
+                    'p50': _percentile(wait_ms, 0.50),
+                    'p95': _percentile(wait_ms, 0.95),
+                    'max': max(wait_ms) if wait_ms else None
+                },
+                'generation_ms': {
+                    'p50': _percentile(generation_ms, 0.50),
+                    'p95': _percentile(generation_ms, 0.95),
+                    'max': max(generation_ms) if generation_ms else None
+                }
+            }
@@ -0,0 +1,117 @@
+# LLM 토큰 스트리밍 (Server-Sent Events)
+# CPU 생성은 답변 하나에 수 초가 걸리므로, llama-cpp의 stream=True 출력을
+# 토큰 단위로 바로 전송하고 마지막 이벤트에 첫 토큰 지연/초당 토큰 수를 보고한다.
+
+import json
+import time
+
+
+def sse_event(data, event=None):
+    """Server-Sent Events 형식 문자열"""
+    payload = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+    if event:
+        return f"event: {event}\n" + payload
+    return payload
+
+
+class AnswerStreamFormatter:
+    """
+    비스트리밍 응답의 후처리(answer.strip(), ~ -> - 치환)를 토큰 단위로 적용
+    - 앞쪽 공백은 버리고
+    - 뒤쪽 공백은 다음에 공백이 아닌 글자가 올 때까지 보류 (마지막 공백은 버림)
+    """
+
+    def __init__(self, replace_tilde=False):
+        self.replace_tilde = replace_tilde
+        self.started = False
+        self.pending_space = ""
+
+    def feed(self, text):
+        """토큰 텍스트를 받아 지금 보낼 수 있는 텍스트 반환"""
+        if self.replace_tilde:
+            # 물결표를 하이픈으로 변환 (마크다운 취소선 방지)
+            text = text.replace('~', '-')
+        if not self.started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self.started = True
+
+        stripped = text.rstrip()
+        if not stripped:
+            self.pending_space += text
+            return ""
+        out = self.pending_space + stripped
+        self.pending_space = text[len(stripped):]
+        return out
+
+
+def stream_answer(completion, sources, replace_tilde=False, context=None, on_complete=None):
+    """
+    llama-cpp 스트리밍 결과를 SSE 이벤트로 변환하는 제너레이터
+    이벤트 순서: sources -> token (여러 번) -> done (전체 답변과 속도 지표)
+
+    Args:
+        completion: llm_model(..., stream=True)가 반환한 이터레이터
+        context: 프롬프트에 넣은 문맥 보고서 (done 이벤트에 포함)
+        on_complete: 생성이 오류 없이 끝나면 전체 답변으로 호출 (답변 캐시 저장용)
+    """
+    formatter = AnswerStreamFormatter(replace_tilde=replace_tilde)
+    start = time.perf_counter()
+    first_token_at = None
+    n_tokens = 0
+    parts = []
+
+    yield sse_event({"sources": sources}, event="sources")
+
+    try:
+        for chunk in completion:
+            token_text = chunk['choices'][0]['text']
+            n_tokens += 1
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            text = formatter.feed(token_text)
+            if text:
+                parts.append(text)
+                yield sse_event({"text": text}, event="token")
+    except Exception as e:
+        print(f"스트리밍 생성 오류: {e}")
+        yield sse_event({"success": False, "error": str(e)}, event="error")
+        return
+
+    end = time.perf_counter()
+    answer = "".join(parts)
+    if on_complete is not None:
+        on_complete(answer)
+
+    decode_sec = end - first_token_at if first_token_at is not None else 0.0
+    yield sse_event({
+        "success": True,
+        "answer": answer,
+        "sources": sources,
+        "context": context,
+        "tokens": n_tokens,
+        "time_to_first_token_ms": (first_token_at - start) * 1000 if first_token_at is not None else None,
+        "total_ms": (end - start) * 1000,
+        # 첫 토큰 이후 디코딩 속도 (프롬프트 처리 시간 제외)
+        "tokens_per_sec": (n_tokens - 1) / decode_sec if n_tokens > 1 and decode_sec > 0 else None,
+        "cached": False
+    }, event="done")
+
+
+def stream_cached_answer(answer, sources, context=None):
+    """답변 캐시 적중 시 stream_answer와 같은 이벤트 순서로 저장된 답변을 한 번에 전송"""
+    yield sse_event({"sources": sources}, event="sources")
+    if answer:
+        yield sse_event({"text": answer}, event="token")
+    yield sse_event({
+        "success": True,
+        "answer": answer,
+        "sources": sources,
+        "context": context,
+        "tokens": 0,
+        "time_to_first_token_ms": 0.0,
+        "total_ms": 0.0,
+        "tokens_per_sec": None,
+        "cached": True
+    }, event="done")
@@ -0,0 +1,43 @@
+# RAG 프롬프트 템플릿
+# 프롬프트 앞부분(지시문)은 요청마다 같으므로 고정 접두어로 분리해 두고,
+# LLM 접두어 KV 캐시(llm_prefix_cache)가 이 부분의 계산 결과를 재사용한다.
+
+CHAT_PROMPT_PREFIX = """당신은 문서 전문 상담원입니다.
+아래 문서를 참고하여 질문에 정확하고 친절하게 한국어로 답변하세요.
+
+문서 내용:
+"""
+
+GENERATE_PROMPT_PREFIX = """당신은 문서 전문 상담원입니다.
+아래 제공된 문서 내용을 바탕으로 질문에 정확하고 친절하게 한국어로 답변하세요.
+
+**중요 지침:**
+1. 반드시 제공된 문서 내용만을 사용하여 답변하세요.
+2. 문서에 없는 내용은 추측하거나 만들어내지 마세요.
+3. 문서에 해당 정보가 없는 경우 "문서에 해당 정보가 없습니다"라고 답변하세요.
+4. 답변은 구체적이고 명확하게 작성하세요.
+5. 시간 범위를 표시할 때는 물결표(~) 대신 하이픈(-)을 사용하세요 (예: 12:30-14:30).
+
+문서 내용:
+"""
+
+PROMPT_PREFIXES = {
+    'chat': CHAT_PROMPT_PREFIX,
+    'generate': GENERATE_PROMPT_PREFIX,
+}
+
+
+def chat_prompt(context, query):
+    return f"""{CHAT_PROMPT_PREFIX}{context}
+
+질문: {query}
+
+답변:"""
+
+
+def generate_prompt(context, query):
+    return f"""{GENERATE_PROMPT_PREFIX}{context}
+
+질문: {query}
+
+답변:"""
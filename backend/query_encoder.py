@@ -0,0 +1,148 @@
+# 검색 질의 임베딩
+# - 자주 묻는 질문은 다시 인코딩하지 않도록 (모델 키, 정규화 질의) LRU 캐시
+# - 동시에 들어온 질의는 몇 ms 동안 모아서 한 번의 model.encode로 처리 (micro-batching)
+
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+import numpy as np
+from embedding_cache import normalize_text
+
+
+class QueryEncoderTimeout(Exception):
+    """배치 인코더가 제한 시간 안에 응답하지 않음 (HTTP 503으로 응답)"""
+
+
+class QueryEncoder:
+    """
+    질의 임베딩 캐시 + 마이크로 배치 인코더
+
+    Args:
+        model: SentenceTransformer (encode 메서드)
+        model_key: 모델 이름/리비전 (캐시 키에 포함)
+        cache_size: LRU 캐시 최대 항목 수
+        max_batch: 마이크로 배치로 모을 최대 질의 수 (model.encode의 batch_size)
+        max_wait_ms: 첫 질의가 들어온 뒤 다른 질의를 기다리는 최대 시간
+        timeout: 인코딩 결과를 기다리는 최대 시간 (초과하면 QueryEncoderTimeout)
+    """
+
+    def __init__(self, model, model_key, cache_size=10000, max_batch=32, max_wait_ms=5.0, timeout=30.0):
+        self.model = model
+        self.model_key = model_key
+        self.cache_size = cache_size
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.timeout = timeout
+        self.cache = OrderedDict()  # (모델 키, 정규화 질의) -> float32 벡터
+        self.lock = threading.Lock()
+        self.pending = queue.Queue()  # (질의 목록, Future)
+        self.worker = None
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.batched_queries = 0
+
+    def encode(self, queries):
+        """
+        model.encode(queries)와 같은 (len(queries), dim) float32 행렬 반환
+        캐시에 없는 질의만 배치 인코더로 보내고 결과를 기다린다.
+        """
+        texts = [normalize_text(q) for q in queries]
+        keys = [(self.model_key, text) for text in texts]
+        vectors = [None] * len(texts)
+        missing = []
+        with self.lock:
+            for i, key in enumerate(keys):
+                vector = self.cache.get(key)
+                if vector is not None:
+                    self.cache.move_to_end(key)
+                    vectors[i] = vector
+                else:
+                    missing.append(i)
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            future = Future()
+            self._ensure_worker()
+            self.pending.put(([texts[i] for i in missing], future))
+            try:
+                encoded = future.result(timeout=self.timeout)
+            except FutureTimeout:
+                future.cancel()
+                raise QueryEncoderTimeout(f"질의 인코딩이 {self.timeout:g}초 안에 끝나지 않았습니다.")
+            with self.lock:
+                for i, vector in zip(missing, encoded):
+                    vectors[i] = vector
+                    self.cache[keys[i]] = vector
+                    self.cache.move_to_end(keys[i])
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+        return np.vstack(vectors).astype('float32', copy=False)
+
+    def _ensure_worker(self):
+        with self.lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run, name='query-encoder', daemon=True)
+                self.worker.start()
+
+    def _collect(self):
+        """첫 요청을 받은 뒤 max_wait 동안 또는 max_batch개가 될 때까지 요청을 모은다"""
+        batch = [self.pending.get()]
+        count = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while count < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self.pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            count += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # 워커 스레드가 죽으면 이후 질의가 모두 멈추므로 어떤 예외든 해당 배치의 Future로 넘긴다
+            try:
+                self._encode_batch(batch)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _encode_batch(self, batch):
+        # 시간 초과로 포기한 요청은 건너뜀
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        # 같은 질의가 동시에 여러 번 들어오면 한 번만 인코딩
+        unique = list(dict.fromkeys(text for texts, _ in batch for text in texts))
+        encoded = self.model.encode(unique, batch_size=self.max_batch, show_progress_bar=False)
+        encoded = np.asarray(encoded, dtype='float32')
+        rows = {text: encoded[i] for i, text in enumerate(unique)}
+        with self.lock:
+            self.batches += 1
+            self.batched_queries += len(unique)
+        for texts, future in batch:
+            future.set_result([rows[text] for text in texts])
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'model_key': self.model_key,
+                'entries': len(self.cache),
+                'max_entries': self.cache_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'batches': self.batches,
+                'avg_batch_size': self.batched_queries / self.batches if self.batches else 0.0
+            }
@@ -1,126 +1,122 @@
 import pdfplumber
+import os
 import re
+import time
+import hashlib
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import faiss
-from sentence_transformers import SentenceTransformer
+from embedding_backend import encode_length_sorted
 
-def add_basic_spacing(text):
-    """
-    띄어쓰기가 없는 한국어 텍스트에 기본적인 띄어쓰기 추가
-    주요 조사와 어미 패턴을 인식하여 단어 경계 추정
-    """
-    if not text or len(text.strip()) == 0:
-        return text
-    
-    # 이미 띄어쓰기가 충분히 있는 경우 (전체 길이의 10% 이상이 공백)
-    space_ratio = text.count(' ') / len(text) if len(text) > 0 else 0
-    if space_ratio > 0.1:
-        return text
-    
-    result = text
-    
-    # 1. 문장 부호 뒤에 띄어쓰기
-    result = re.sub(r'([.!?])([가-힣A-Za-z0-9])', r'\1 \2', result)
-    result = re.sub(r'([,;:])([가-힣A-Za-z0-9])', r'\1 \2', result)
-    
-    # 2. 한국어 조사 및 어미 패턴
-    # 주격 조사: 이, 가
-    result = re.sub(r'([가-힣])([이가])([가-힣])', lambda m: m.group(1) + m.group(2) + ' ' + m.group(3) if m.group(3) not in '가나다라마바사아자차카타파하' else m.group(0), result)
+def clean_text(text):
+    """PDF 추출 텍스트 정리 (cid 패턴, 깨진 제목, 반복 문자 제거)"""
+    if not text:
+        return ""
+    # Remove (cid:숫자) patterns
+    text = re.sub(r'\(cid:\d+\)', '', text)
+    # Remove UUnnttiittlleedd patterns
+    text = re.sub(r'UUnnttiittlleedd.*', '', text)
     
-    # 목적격 조사: 을, 를
-    result = re.sub(r'([가-힣])([을를])([가-힣])', lambda m: m.group(1) + m.group(2) + ' ' + m.group(3), result)
+    # Remove consecutive duplicate characters (e.g., "경경경" -> "경")
+    # This pattern matches any character repeated 3 or more times consecutively
+    def deduplicate_chars(match):
+        return match.group(1)
     
-    # 관형격 조사: 의
-    result = re.sub(r'([가-힣])의([가-힣])', r'\1의 \2', result)
+    # Pattern: captures a character and matches if it repeats 2+ more times
+    text = re.sub(r'(.)\1{2,}', deduplicate_chars, text)
     
-    # 부사격 조사: 에, 에서, 에게, 로, 으로
-    result = re.sub(r'([가-힣])(에서|에게|에도|에만|로서|으로)([가-힣])', r'\1\2 \3', result)
-    result = re.sub(r'([가-힣])([에로])([가-힣])', lambda m: m.group(1) + m.group(2) + ' ' + m.group(3), result)
+    # 자동 띄어쓰기 추가 (비활성화: 규칙 기반 띄어쓰기가 오히려 품질 저하 가능)
+    # text = add_basic_spacing(text)
     
-    # 접속 조사: 와, 과, 하고
-    result = re.sub(r'([가-힣])(와|과|하고)([가-힣])', r'\1\2 \3', result)
-    
-    # 보조사: 은, 는, 도, 만, 까지
-    result = re.sub(r'([가-힣])([은는도만])([가-힣])', lambda m: m.group(1) + m.group(2) + ' ' + m.group(3), result)
-    result = re.sub(r'([가-힣])(까지)([가-힣])', r'\1\2 \3', result)
-    
-    # 3. 용언 어미
-    # -다 (종결어미)
-    result = re.sub(r'([가-힣])(다)([\.!?])', r'\1\2\3 ', result)
-    result = re.sub(r'([가-힣])(했다|됐다|였다|이다)([\.!?,])', r'\1\2\3 ', result)
-    
-    # -고, -며, -면서 (연결어미)
-    result = re.sub(r'([가-힣])(고|며|면서|지만|는데)([가-힣])', r'\1\2 \3', result)
-    
-    # -한, -된, -인 (관형사형 어미)
-    result = re.sub(r'([가-힣])(한|된|인|은|를)([가-힣])', lambda m: m.group(1) + m.group(2) + ' ' + m.group(3) if len(m.group(1)) > 1 else m.group(0), result)
+    return text
+
+def _extract_page(page, page_num):
+    """pdfplumber 페이지 하나에서 본문과 표 텍스트 추출"""
+    parts = [clean_text(page.extract_text())]
     
-    # 4. 숫자와 한글 사이
-    result = re.sub(r'([0-9])([가-힣])', r'\1 \2', result)
-    result = re.sub(r'([가-힣])([0-9])', r'\1 \2', result)
+    tables = page.extract_tables()
+    if tables:
+        parts.append("\n[표 발견]\n")
+        for table in tables:
+            for row in table:
+                cleaned_row = [clean_text(str(cell)) if cell else "" for cell in row]
+                parts.append(" | ".join(cleaned_row))
+                parts.append("\n")
     
-    # 5. 영문자와 한글 사이
-    result = re.sub(r'([A-Za-z])([가-힣])', r'\1 \2', result)
-    result = re.sub(r'([가-힣])([A-Za-z])', r'\1 \2', result)
+    return {
+        'page': page_num,
+        'text': "".join(parts)
+    }
+
+def _extract_page_range(pdf_path, start, end):
+    """[start, end) 페이지 범위 추출 (프로세스 풀 작업 단위)"""
+    with pdfplumber.open(pdf_path) as pdf:
+        return [_extract_page(pdf.pages[i], i + 1) for i in range(start, end)]
+
+# 이 페이지 수 미만이면 프로세스 풀 기동 비용이 더 크므로 단일 프로세스로 처리
+PARALLEL_MIN_PAGES = 16
+
+def iter_pdf_pages(pdf_path, workers=None, shard_size=8):
+    """
+    PDF 페이지를 순서대로 하나씩 yield하는 제너레이터
+    추출이 끝나기 전에 청킹/임베딩을 시작할 수 있다.
+
+    Args:
+        workers: 프로세스 수 (None이면 CPU 수, 1이면 단일 프로세스)
+        shard_size: 한 프로세스 작업이 맡는 연속 페이지 수
+    """
+    workers = workers or os.cpu_count() or 1
     
-    # 6. 괄호 처리
-    result = re.sub(r'([가-힣])(<|>|\(|\)|\[|\])([가-힣])', r'\1\2 \3', result)
-    result = re.sub(r'(<|>|\(|\)|\[|\])([가-힣])', r'\1 \2', result)
+    with pdfplumber.open(pdf_path) as pdf:
+        num_pages = len(pdf.pages)
+        if workers <= 1 or num_pages < PARALLEL_MIN_PAGES:
+            for i, page in enumerate(pdf.pages):
+                yield _extract_page(page, i + 1)
+                # 처리한 페이지의 파싱 캐시 해제 (메모리 유지)
+                page.flush_cache()
+            return
     
-    # 연속된 공백 제거
-    result = re.sub(r'\s+', ' ', result)
+    # pdfplumber는 순수 Python(CPU 바운드)이므로 페이지 범위를 여러 프로세스에 나눠 처리
+    shards = [(start, min(start + shard_size, num_pages)) for start in range(0, num_pages, shard_size)]
+    max_in_flight = workers * 2  # 아직 소비되지 않은 결과가 메모리에 쌓이지 않도록 제한
     
-    return result.strip()
-
-
-def extract_text_from_pdf(pdf_path):
-    """PDF에서 텍스트 추출"""
-    def clean_text(text):
-        if not text:
-            return ""
-        # Remove (cid:숫자) patterns
-        text = re.sub(r'\(cid:\d+\)', '', text)
-        # Remove UUnnttiittlleedd patterns
-        text = re.sub(r'UUnnttiittlleedd.*', '', text)
-        
-        # Remove consecutive duplicate characters (e.g., "경경경" -> "경")
-        # This pattern matches any character repeated 3 or more times consecutively
-        def deduplicate_chars(match):
-            return match.group(1)
-        
-        # Pattern: captures a character and matches if it repeats 2+ more times
-        text = re.sub(r'(.)\1{2,}', deduplicate_chars, text)
-        
-        # 자동 띄어쓰기 추가 (비활성화: 규칙 기반 띄어쓰기가 오히려 품질 저하 가능)
-        # text = add_basic_spacing(text)
-        
-        return text
-
+    # fork는 부모의 스레드(모델 추론, 작업 큐)가 잡고 있던 락까지 복사하므로 spawn으로 새 프로세스를 띄운다
+    mp_context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards)), mp_context=mp_context) as pool:
+        pending = deque()
+        next_shard = 0
+        while next_shard < len(shards) or pending:
+            while next_shard < len(shards) and len(pending) < max_in_flight:
+                start, end = shards[next_shard]
+                pending.append(pool.submit(_extract_page_range, pdf_path, start, end))
+                next_shard += 1
+            # 페이지 순서를 유지하기 위해 제출 순서대로 결과를 꺼낸다
+            for page_data in pending.popleft().result():
+                yield page_data
 
-    full_text = ""
-    pages_content = []
-    
+def count_pdf_pages(pdf_path):
+    """PDF 페이지 수 (텍스트는 추출하지 않음)"""
     with pdfplumber.open(pdf_path) as pdf:
-        for i, page in enumerate(pdf.pages):
-            page_text = ""
-            raw_text = page.extract_text()
-            page_text += clean_text(raw_text)
-            
-            tables = page.extract_tables()
-            if tables:
-                page_text += "\n[표 발견]\n"
-                for table in tables:
-                    for row in table:
-                        cleaned_row = [clean_text(str(cell)) if cell else "" for cell in row]
-                        page_text += " | ".join(cleaned_row)
-                        page_text += "\n"
-            
-            pages_content.append({
-                'page': i + 1,
-                'text': page_text
-            })
-            full_text += f"\n--- 페이지 {i+1} ---\n{page_text}\n"
-            
+        return len(pdf.pages)
+
+def format_page_text(page_data):
+    """페이지 하나를 '--- 페이지 n ---' 구분자가 붙은 텍스트로"""
+    return f"\n--- 페이지 {page_data['page']} ---\n{page_data['text']}\n"
+
+def format_pages_text(pages_content):
+    """페이지 목록을 '--- 페이지 n ---' 구분자가 있는 전체 텍스트로 합침"""
+    return "".join(format_page_text(p) for p in pages_content)
+
+def extract_text_from_pdf(pdf_path, workers=1):
+    """
+    PDF에서 텍스트 추출
+    workers > 1이면 페이지 범위를 여러 프로세스에 나눠 추출한다 (iter_pdf_pages 참고).
+    """
+    pages_content = list(iter_pdf_pages(pdf_path, workers=workers))
+    full_text = format_pages_text(pages_content)
     return full_text, pages_content
 
 def extract_text_from_txt(txt_path):
@@ -147,14 +143,94 @@ def split_into_sentences(text):
     sentences = re.split(r'(?<=[.!?])\s*', text)
     return [s.strip() for s in sentences if s.strip()]
 
-def chunk_text(pages_content, tokenizer_model):
+class TokenCounter:
+    """
+    문장 토큰 수 계산기
+    - 페이지의 문장들을 한 번의 배치 호출로 토큰화 (fast tokenizer는 Rust에서 일괄 처리)
+    - 머리말/꼬리말/경고문처럼 반복되는 문장은 LRU 캐시(문장 해시 -> 토큰 수)에서 바로 반환
+    """
+
+    def __init__(self, tokenizer, cache_size=100000):
+        self.tokenizer = tokenizer
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(sentence):
+        # 문장 원문 대신 8바이트 해시를 키로 사용 (캐시 메모리 절약)
+        return hashlib.blake2b(sentence.encode('utf-8'), digest_size=8).digest()
+
+    def count(self, sentences):
+        """문장 리스트의 토큰 수 리스트 (special token 제외)"""
+        keys = [self._key(sentence) for sentence in sentences]
+        counts = [None] * len(sentences)
+        missing = {}  # key -> 문장 (배치 안의 중복 제거)
+
+        with self.lock:
+            for i, key in enumerate(keys):
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    counts[i] = self.cache[key]
+                    self.hits += 1
+                elif key not in missing:
+                    missing[key] = sentences[i]
+                    self.misses += 1
+                else:
+                    self.hits += 1
+
+        if missing:
+            encoded = self.tokenizer(
+                list(missing.values()),
+                add_special_tokens=False,
+                return_attention_mask=False,
+                return_token_type_ids=False
+            )['input_ids']
+            new_counts = dict(zip(missing.keys(), (len(ids) for ids in encoded)))
+            with self.lock:
+                for key, value in new_counts.items():
+                    self.cache[key] = value
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            for i, key in enumerate(keys):
+                if counts[i] is None:
+                    counts[i] = new_counts[key]
+
+        return counts
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'cache_size': len(self.cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+_token_counters = {}
+
+def get_token_counter(tokenizer_model):
+    """모델(토크나이저)별 TokenCounter 공유 인스턴스"""
+    tokenizer = tokenizer_model.tokenizer
+    counter = _token_counters.get(id(tokenizer))
+    if counter is None or counter.tokenizer is not tokenizer:
+        counter = TokenCounter(tokenizer)
+        _token_counters[id(tokenizer)] = counter
+    return counter
+
+def iter_chunks(pages_content, tokenizer_model, token_counter=None):
     """
     새로운 청킹 알고리즘:
     n 문장의 총 토큰수가 100이하인 최대 n
     단, n이 1인데도 100 토큰을 초과하는 경우 n=1로 한다.
+    토큰 수는 페이지 단위로 한 번에 계산한다 (TokenCounter 참고).
+    페이지를 받는 대로 청크를 하나씩 yield한다 (문서 전체를 메모리에 모으지 않음).
     """
-    chunks = []
     chunk_id = 0
+    if token_counter is None:
+        token_counter = get_token_counter(tokenizer_model)
     
     for page_data in pages_content:
         page_num = page_data['page']
@@ -167,35 +243,34 @@ def chunk_text(pages_content, tokenizer_model):
         current_chunk_sentences = []
         current_tokens = 0
         
-        for sentence in sentences:
-            # 토큰 수 계산 (tokenizer_model.tokenizer.encode는 list 반환)
-            # len(tokenizer_model.tokenizer.encode(sentence))가 정확한 토큰 수
-            sentence_token_count = len(tokenizer_model.tokenizer.encode(sentence, add_special_tokens=False))
-            
+        # 페이지의 모든 문장 토큰 수를 한 번에 계산 (special token 제외)
+        sentence_token_counts = token_counter.count(sentences)
+        
+        for sentence, sentence_token_count in zip(sentences, sentence_token_counts):
             # 1. 현재 문장 하나만으로도 100토큰이 넘는 경우
             if sentence_token_count > 100:
                 # 만약 이전에 모아둔 문장들이 있다면 먼저 저장
                 if current_chunk_sentences:
                     chunk_content = " ".join(current_chunk_sentences)
-                    chunks.append({
+                    yield {
                         'id': chunk_id,
                         'page': page_num,
                         'title': chunk_content[:50], # 제목은 첫 부분으로 대체
                         'content': chunk_content,
                         'token_count': current_tokens
-                    })
+                    }
                     chunk_id += 1
                     current_chunk_sentences = []
                     current_tokens = 0
                 
                 # 긴 문장 하나를 독립된 청크로 저장 (규칙: n=1인데도 100초과시 n=1)
-                chunks.append({
+                yield {
                     'id': chunk_id,
                     'page': page_num,
                     'title': sentence[:50],
                     'content': sentence,
                     'token_count': sentence_token_count
-                })
+                }
                 chunk_id += 1
                 continue
             
@@ -203,13 +278,13 @@ def chunk_text(pages_content, tokenizer_model):
             if current_tokens + sentence_token_count > 100:
                 # 넘으면 지금까지 모은 것을 저장
                 chunk_content = " ".join(current_chunk_sentences)
-                chunks.append({
+                yield {
                     'id': chunk_id,
                     'page': page_num,
                     'title': chunk_content[:50],
                     'content': chunk_content,
                     'token_count': current_tokens
-                })
+                }
                 chunk_id += 1
                 
                 # 현재 문장으로 새로운 청크 시작
@@ -223,28 +298,277 @@ def chunk_text(pages_content, tokenizer_model):
         # 페이지의 마지막 남은 청크 저장
         if current_chunk_sentences:
             chunk_content = " ".join(current_chunk_sentences)
-            chunks.append({
+            yield {
                 'id': chunk_id,
                 'page': page_num,
                 'title': chunk_content[:50],
                 'content': chunk_content,
                 'token_count': current_tokens
-            })
+            }
             chunk_id += 1
-            
-    return chunks
 
-def build_index(chunks, model):
-    """FAISS 인덱스 생성"""
+def chunk_text(pages_content, tokenizer_model, token_counter=None):
+    """청크 목록 (iter_chunks 참고)"""
+    return list(iter_chunks(pages_content, tokenizer_model, token_counter))
+
+
+# 청크 임베딩 배치 설정
+# 배치는 가장 긴 청크 길이로 패딩되므로 토큰 길이 순으로 정렬해 비슷한 길이끼리 묶는다.
+# 인코딩 중 활성값 메모리는 (배치 크기 x 패딩된 길이)에 비례하므로 이 값에 상한을 두어
+# 긴 청크만 모인 배치는 더 작게 나눈다 (짧은 청크는 EMBED_BATCH_SIZE까지 한 번에).
+EMBED_BATCH_SIZE = 64
+EMBED_MAX_BATCH_TOKENS = 4096
+
+class LengthBucketEncoder:
+    """
+    토큰 길이 순 배치 인코더 (model.encode와 같은 인터페이스, 결과는 입력 순서 그대로)
+    - 토큰 수가 비슷한 청크끼리 batch_size개씩 묶되, 배치 크기 x 최장 길이가 max_batch_tokens를 넘지 않게 함
+    - 실제 토큰 수 대비 패딩 토큰 비율을 누적 집계 (문서 순서로 배치했을 때와 비교)
+
+    Args:
+        model: SentenceTransformer 등 encode/tokenizer를 가진 모델
+        batch_size: 배치 최대 청크 수 (encode 호출 시 넘긴 batch_size 대신 사용)
+        max_batch_tokens: 배치 크기 x 패딩된 길이 상한 (None이면 제한 없음)
+    """
+
+    def __init__(self, model, batch_size=EMBED_BATCH_SIZE, max_batch_tokens=EMBED_MAX_BATCH_TOKENS):
+        self.model = model
+        self.tokenizer = model.tokenizer
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_seq_length = getattr(model, 'max_seq_length', None)
+        self.lock = threading.Lock()
+        self.texts = 0
+        self.batches = 0
+        self.tokens = 0
+        self.padded_tokens = 0
+        self.unsorted_padded_tokens = 0
+
+    def lengths(self, texts):
+        """
+        모델 입력 토큰 수 (special token 2개 포함, max_seq_length에서 잘림)
+        청크가 문장 TokenCounter 캐시를 밀어내지 않도록 캐시 없이 한 번의 배치 호출로 센다
+        (반복되는 청크는 EmbeddingCache가 이미 걸러낸다).
+        """
+        encoded = self.tokenizer(
+            list(texts),
+            add_special_tokens=False,
+            return_attention_mask=False,
+            return_token_type_ids=False
+        )['input_ids']
+        lengths = np.fromiter((len(ids) for ids in encoded), dtype='int64', count=len(encoded)) + 2
+        if self.max_seq_length:
+            lengths = np.minimum(lengths, self.max_seq_length)
+        return lengths
+
+    def encode(self, texts, batch_size=None, show_progress_bar=False, **kwargs):
+        if len(texts) == 0:
+            return np.zeros((0, 0), dtype='float32')
+        lengths = self.lengths(texts)
+        embeddings, buckets = encode_length_sorted(
+            lambda bucket: self.model.encode([texts[i] for i in bucket], batch_size=len(bucket),
+                                             show_progress_bar=False),
+            lengths, self.batch_size, self.max_batch_tokens
+        )
+        padded = sum(len(bucket) * int(lengths[bucket].max()) for bucket in buckets)
+
+        # 같은 배치 크기로 문서 순서대로 묶었을 때의 패딩 (비교용)
+        unsorted = sum(
+            len(part) * int(part.max())
+            for part in (lengths[start:start + self.batch_size] for start in range(0, len(lengths), self.batch_size))
+        )
+        with self.lock:
+            self.texts += len(texts)
+            self.batches += len(buckets)
+            self.tokens += int(lengths.sum())
+            self.padded_tokens += padded
+            self.unsorted_padded_tokens += unsorted
+        return embeddings
+
+    def stats(self):
+        with self.lock:
+            return {
+                'batch_size': self.batch_size,
+                'max_batch_tokens': self.max_batch_tokens,
+                'texts': self.texts,
+                'batches': self.batches,
+                'tokens': self.tokens,
+                'padded_tokens': self.padded_tokens,
+                # 실제 토큰 대비 패딩 토큰 비율 (정렬 배치 / 문서 순서 배치)
+                'padding_overhead': self.padded_tokens / self.tokens - 1 if self.tokens else 0.0,
+                'unsorted_padding_overhead': self.unsorted_padded_tokens / self.tokens - 1 if self.tokens else 0.0
+            }
+
+def embed_chunks(chunks, model, cache=None):
+    """
+    청크 내용을 임베딩하여 float32 행렬로 반환
+    토큰 길이 순 배치로 인코딩한다 (model이 LengthBucketEncoder가 아니면 기본 설정으로 감쌈).
+    cache(EmbeddingCache)를 주면 중복/이미 본 텍스트는 다시 인코딩하지 않는다.
+    """
+    chunk_texts = [chunk['content'] for chunk in chunks]
+    if not isinstance(model, LengthBucketEncoder):
+        model = LengthBucketEncoder(model)
+    if cache is not None:
+        return cache.encode(chunk_texts, model)
+    return model.encode(chunk_texts)
+
+# 지원하는 인덱스 종류
+# - flat:     IndexFlatL2 전수 탐색 (정확, 기본값)
+# - ivf_flat: IVF 역색인 + 원본 벡터 (nprobe로 정확도/속도 조절)
+# - ivf_pq:   IVF 역색인 + PQ 압축 벡터 (메모리 절약, 근사 거리)
+# - hnsw:     HNSW 그래프 (학습 불필요, efSearch로 정확도/속도 조절)
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+
+def default_nlist(n_vectors):
+    """IVF 클러스터 수 기본값: 약 4*sqrt(N)"""
+    return int(max(1, min(65536, 4 * np.sqrt(max(n_vectors, 1)))))
+
+def default_pq_m(dimension):
+    """PQ 서브벡터 수 기본값: 서브벡터당 16차원이 되도록 (768차원 -> 48)"""
+    for m in range(max(1, dimension // 16), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+# k-means가 클러스터를 안정적으로 잡으려면 클러스터당 약 39개 이상의 학습 벡터가 필요하다
+# (FAISS도 이보다 적으면 경고를 낸다)
+MIN_POINTS_PER_CENTROID = 39
+
+def min_training_size(index_type, nlist):
+    """인덱스 학습에 필요한 최소 벡터 수 (학습이 필요 없으면 0)"""
+    if index_type == 'ivf_flat':
+        return MIN_POINTS_PER_CENTROID * nlist
+    if index_type == 'ivf_pq':
+        return max(MIN_POINTS_PER_CENTROID * nlist, 256)  # PQ 8비트 코드북 = 256 centroid
+    return 0
+
+def sample_training_vectors(embeddings, max_size, seed=0):
+    """학습용 벡터 샘플링 (max_size보다 많으면 무작위 추출)"""
+    if len(embeddings) <= max_size:
+        return np.ascontiguousarray(embeddings, dtype='float32')
+    rng = np.random.default_rng(seed)
+    picked = np.sort(rng.choice(len(embeddings), max_size, replace=False))
+    return np.ascontiguousarray(embeddings[picked], dtype='float32')
+
+def create_index(dimension, index_type='flat', training_vectors=None,
+                 nlist=None, pq_m=None, hnsw_m=32, ef_construction=80,
+                 max_training_size=100000):
+    """
+    인덱스 종류에 맞는 FAISS 인덱스를 생성하고 필요하면 학습까지 수행
+
+    Args:
+        dimension: 임베딩 차원
+        index_type: INDEX_TYPES 중 하나
+        training_vectors: IVF 계열 학습용 벡터 (max_training_size개까지 샘플링)
+        nlist: IVF 클러스터 수 (None이면 학습 벡터 수 기준 자동)
+        pq_m: PQ 서브벡터 수 (None이면 자동)
+        hnsw_m: HNSW 이웃 수
+        ef_construction: HNSW 구축 시 탐색 폭
+
+    Returns:
+        벡터가 비어있는 (학습 완료된) 인덱스
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"지원하지 않는 인덱스 종류입니다: {index_type} (지원: {', '.join(INDEX_TYPES)})")
+
+    if index_type == 'flat':
+        return faiss.IndexFlatL2(dimension)
+
+    if index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+        return index
+
+    n_train = 0 if training_vectors is None else len(training_vectors)
+    nlist = nlist or default_nlist(n_train)
+    required = min_training_size(index_type, nlist)
+    if n_train < required:
+        raise ValueError(f"{index_type} 학습에는 최소 {required}개의 벡터가 필요합니다 (현재 {n_train}개).")
+
+    quantizer = faiss.IndexFlatL2(dimension)
+    if index_type == 'ivf_flat':
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+    else:
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m or default_pq_m(dimension), 8)
+    # 학습 벡터 샘플링 (k-means 비용은 학습 벡터 수에 비례, 최소 학습 벡터 수보다 줄이지는 않음)
+    index.train(sample_training_vectors(training_vectors, max(max_training_size, required)))
+    # 기본 탐색 클러스터 수 (요청별로 nprobe를 넘겨 조절 가능)
+    index.nprobe = min(nlist, 8)
+    return index
+
+def search_params(index, nprobe=None, ef_search=None):
+    """
+    요청별 탐색 파라미터 생성 (인덱스 종류에 맞지 않는 값은 무시)
+    IndexIDMap으로 감싼 인덱스도 내부 인덱스 종류를 기준으로 판단한다.
+    """
+    inner = faiss.downcast_index(index.index) if hasattr(index, 'id_map') else index
+    if nprobe and isinstance(inner, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=int(nprobe))
+    if ef_search and isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search))
+    return None
+
+def evaluate_recall(index, embeddings, queries, k=10, ids=None, params=None):
+    """
+    Flat(전수 탐색) 기준 대비 recall@k 측정
+
+    Args:
+        index: 평가할 인덱스
+        embeddings: 인덱스에 들어있는 원본 벡터
+        queries: 질의 벡터
+        ids: embeddings 각 행의 인덱스 ID (None이면 행 번호)
+        params: search_params()로 만든 탐색 파라미터
+
+    Returns:
+        recall@k와 질의당 평균 지연시간(ms)
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    queries = np.ascontiguousarray(queries, dtype='float32')
+
+    baseline = faiss.IndexFlatL2(embeddings.shape[1])
+    baseline.add(embeddings)
+    start = time.perf_counter()
+    _, exact = baseline.search(queries, k)
+    flat_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    if ids is not None:
+        exact = np.where(exact >= 0, np.asarray(ids)[exact], -1)
+
+    start = time.perf_counter()
+    if params is not None:
+        _, approx = index.search(queries, k, params=params)
+    else:
+        _, approx = index.search(queries, k)
+    index_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    hits = sum(
+        len(set(exact_row[exact_row >= 0]) & set(approx_row[approx_row >= 0]))
+        for exact_row, approx_row in zip(exact, approx)
+    )
+    total = int((exact >= 0).sum())
+    return {
+        'k': k,
+        'n_queries': len(queries),
+        f'recall@{k}': hits / total if total else 0.0,
+        'flat_latency_ms': flat_ms,
+        'index_latency_ms': index_ms
+    }
+
+def build_index(chunks, model, index_type='flat', **index_params):
+    """
+    FAISS 인덱스 생성
+    index_type에 따라 Flat / IVF-Flat / IVF-PQ / HNSW 인덱스를 만든다 (create_index 참고).
+    """
     if not chunks:
         return None, None
         
-    chunk_texts = [chunk['content'] for chunk in chunks]
-    embeddings = model.encode(chunk_texts, show_progress_bar=False)
-    embeddings = np.array(embeddings).astype('float32')
+    encoder = model if isinstance(model, LengthBucketEncoder) else LengthBucketEncoder(model)
+    embeddings = embed_chunks(chunks, encoder)
+    report = encoder.stats()
+    print(f"임베딩 배치 {report['batches']}개, 패딩 토큰 {report['padding_overhead']:.1%} "
+          f"(문서 순서 배치 {report['unsorted_padding_overhead']:.1%})")
     
     dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
+    index = create_index(dimension, index_type, training_vectors=embeddings, **index_params)
     index.add(embeddings)
     
     return index, embeddings
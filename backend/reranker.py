@@ -0,0 +1,103 @@
+# 검색 후보 재정렬 (cross-encoder)
+# 1차 검색(임베딩/BM25)으로 후보를 넉넉히 뽑은 뒤, 질의-청크 쌍을 함께 보는 작은
+# cross-encoder로 다시 점수를 매겨 상위 k개만 프롬프트에 넣는다.
+# CPU에서는 쌍 하나에도 수 ms가 걸리므로 요청마다 시간 예산(budget_ms)을 두고,
+# 다음 배치가 예산을 넘길 것 같으면 거기서 멈춘다 (1차 검색 순위가 높은 후보부터 채점).
+
+import threading
+import time
+from collections import deque
+import numpy as np
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Reranker:
+    """
+    cross-encoder 재정렬기
+
+    Args:
+        model: sentence_transformers.CrossEncoder (predict 메서드)
+        batch_size: 한 번에 채점할 (질의, 청크) 쌍 수
+        budget_ms: 요청 하나의 재정렬 시간 상한 (p95 지연을 이 값 아래로 유지)
+    """
+
+    def __init__(self, model, batch_size=16, budget_ms=300.0, window=1000):
+        self.model = model
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        self.lock = threading.Lock()
+        self.pair_ms = None  # 쌍 하나당 채점 시간 추정치 (지수 이동 평균)
+        self.latency_ms = deque(maxlen=window)
+        self.runs = 0
+        self.truncated = 0
+        self.pairs_scored = 0
+
+    def rerank(self, query, ids, texts, k):
+        """
+        후보를 cross-encoder 점수로 다시 정렬
+
+        Args:
+            ids: 후보 청크 ID (1차 검색 순위 순)
+            texts: 후보 본문 (ids와 같은 순서)
+
+        Returns:
+            (점수 배열, 청크 ID 배열) - 점수 내림차순 상위 k개
+            예산 때문에 채점하지 못한 후보는 채점한 후보 뒤에 1차 순위대로 붙는다
+            (점수는 채점한 후보의 최저 점수).
+        """
+        start = time.perf_counter()
+        deadline = start + self.budget_ms / 1000
+        scores = []
+        for batch_start in range(0, len(texts), self.batch_size):
+            batch = texts[batch_start:batch_start + self.batch_size]
+            # 첫 배치는 항상 채점하고, 이후 배치는 예상 시간이 예산 안일 때만
+            if scores and self.pair_ms is not None:
+                if time.perf_counter() + self.pair_ms * len(batch) / 1000 > deadline:
+                    break
+            batch_start_time = time.perf_counter()
+            batch_scores = self.model.predict([(query, text) for text in batch],
+                                              batch_size=len(batch), show_progress_bar=False)
+            elapsed_ms = (time.perf_counter() - batch_start_time) * 1000
+            with self.lock:
+                per_pair = elapsed_ms / len(batch)
+                self.pair_ms = per_pair if self.pair_ms is None else 0.8 * self.pair_ms + 0.2 * per_pair
+            scores.extend(float(s) for s in np.ravel(batch_scores))
+
+        n_scored = len(scores)
+        order = sorted(range(n_scored), key=lambda i: -scores[i])
+        ranked_ids = [ids[i] for i in order] + list(ids[n_scored:])
+        floor = min(scores) if scores else 0.0
+        ranked_scores = [scores[i] for i in order] + [floor] * (len(ids) - n_scored)
+
+        with self.lock:
+            self.runs += 1
+            self.pairs_scored += n_scored
+            if n_scored < len(ids):
+                self.truncated += 1
+            self.latency_ms.append((time.perf_counter() - start) * 1000)
+
+        return (np.array(ranked_scores[:k], dtype='float32'),
+                np.array(ranked_ids[:k], dtype='int64'))
+
+    def stats(self):
+        with self.lock:
+            latency = list(self.latency_ms)
+            return {
+                'budget_ms': self.budget_ms,
+                'batch_size': self.batch_size,
+                'runs': self.runs,
+                'truncated': self.truncated,
+                'avg_pairs_scored': self.pairs_scored / self.runs if self.runs else 0.0,
+                'pair_ms': self.pair_ms,
+                'latency_ms': {
+                    'p50': _percentile(latency, 0.50),
+                    'p95': _percentile(latency, 0.95),
+                    'max': max(latency) if latency else None
+                }
+            }
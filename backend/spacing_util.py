@@ -1,50 +1,238 @@
-# 자동 띄어쓰기 추가 기능 (선택사항)
-# PyKoSpacing을 사용하여 띄어쓰기 없는 한국어 텍스트에 자동으로 띄어쓰기 추가
+# 한국어 띄어쓰기 보정
+# PDF에서 띄어쓰기 없이 추출된 한국어 텍스트에 띄어쓰기를 넣는다.
+# - 규칙 기반 (add_basic_spacing): 조사/어미 정규식. 패턴은 모듈을 읽을 때 한 번만 컴파일하고,
+#   서로 영향을 주지 않는 패스는 하나로 합쳤다
+# - 모델 기반 (add_spacing_to_texts): PyKoSpacing. 모델은 한 번만 로드하고,
+#   여러 텍스트의 창(window)을 모아 한 번에 예측한다
+# 처리량은 benchmark_spacing.py로 측정한다.
 
 """
-설치 방법:
+설치 방법 (모델 기반만 필요):
 pip install pykospacing
 
 사용 방법:
-rag_pipeline.py의 extract_text_from_pdf 함수에서
-clean_text 함수 내부에 add_spacing 호출 추가
+rag_pipeline.py의 clean_text 함수 내부에서 add_basic_spacing 또는 add_spacing_to_text 호출
 """
 
-from pykospacing import Spacing
+import re
+import threading
+
+_SPACE_RATIO = 0.1  # 공백 비율이 이보다 크면 이미 띄어쓰기가 되어 있다고 본다
+
+_HANGUL = '[가-힣]'
+_NO_SPACE_AFTER_SUBJECT = '가나다라마바사아자차카타파하'
+
+
+class _SpaceRule:
+    """
+    띄어쓰기 규칙 한 패스
+    그룹이 없는 패턴은 빈 매치 위치마다 공백을 넣고, 그룹이 있는 패턴은 첫 그룹 뒤에 공백을 넣는다.
+    re.sub의 그룹 템플릿/콜백은 매치마다 파이썬 함수를 부르므로, split으로 나눈 조각을 join으로 잇는다.
+
+    Args:
+        pattern: 정규식 ('C'는 한글 한 글자)
+        keep: 두 번째 그룹이 이 문자들 중 하나면 공백을 넣지 않음
+    """
+
+    def __init__(self, pattern, keep=None):
+        self.pattern = re.compile(pattern.replace('C', _HANGUL))
+        self.keep = keep
+
+    def apply(self, text):
+        parts = self.pattern.split(text)
+        groups = self.pattern.groups
+        if groups == 0:
+            return ' '.join(parts)
+        step = groups + 1
+        heads = parts[1::step]
+        if self.keep is None:
+            parts[1::step] = [head + ' ' for head in heads]
+        else:
+            parts[1::step] = [head if tail in self.keep else head + ' '
+                              for head, tail in zip(heads, parts[2::step])]
+        return ''.join(parts)
+
+
+# 원래는 re.sub 21개 패스(콜백 5개)였다. 조사/어미 패스는 앞 패스가 넣은 공백과 소비한 글자에 따라
+# 결과가 달라지므로 원래 순서대로 두고, 공백만 넣는 경계 규칙끼리 합쳤다.
+# (관형사형 어미 -한/-된/-인 규칙은 앞 글자가 항상 한 글자라 아무것도 바꾸지 않아 뺐다)
+_RULES = [
+    # 1. 문장 부호 뒤에 띄어쓰기
+    _SpaceRule(r'(?<=[.!?,;:])(?=[가-힣A-Za-z0-9])'),
+    # 2. 조사: 주격(이/가, 다음 글자가 '가나다...'면 단어 일부로 보고 그대로 둠), 목적격(을/를),
+    #    관형격(의), 부사격(에서, 에게, 로, 으로 ...), 접속(와, 과, 하고), 보조사(은, 는, 도, 만, 까지)
+    _SpaceRule(r'(C[이가])(C)', keep=_NO_SPACE_AFTER_SUBJECT),
+    _SpaceRule(r'(C[을를])(C)'),
+    _SpaceRule(r'(C의)(C)'),
+    _SpaceRule(r'(C(?:에서|에게|에도|에만|로서|으로))(C)'),
+    _SpaceRule(r'(C[에로])(C)'),
+    _SpaceRule(r'(C(?:와|과|하고))(C)'),
+    _SpaceRule(r'(C[은는도만])(C)'),
+    _SpaceRule(r'(C까지)(C)'),
+    # 3. 용언 어미: 종결어미(-다), 연결어미(-고, -며, -면서 ...)
+    _SpaceRule(r'(C다[.!?])'),
+    _SpaceRule(r'(C(?:했다|됐다|였다|이다)[.!?,])'),
+    _SpaceRule(r'(C(?:고|며|면서|지만|는데))(C)'),
+    # 4. 숫자/영문자/괄호와 한글 사이 (삽입 위치가 겹치지 않아 한 패스로 처리)
+    _SpaceRule(r'(?<=[0-9A-Za-z<>()\[\]])(?=C)|(?<=C)(?=[0-9A-Za-z])'),
+]
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def add_basic_spacing(text):
+    """
+    띄어쓰기가 없는 한국어 텍스트에 기본적인 띄어쓰기 추가
+    주요 조사와 어미 패턴을 인식하여 단어 경계 추정
+    """
+    if not text or len(text.strip()) == 0:
+        return text
+
+    # 이미 띄어쓰기가 충분히 있는 경우 (전체 길이의 10% 이상이 공백)
+    if text.count(' ') / len(text) > _SPACE_RATIO:
+        return text
+
+    for rule in _RULES:
+        text = rule.apply(text)
+    # 연속된 공백 제거
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+# 여러 텍스트를 한 번에 처리할 때 쓰는 구분 문자 (어떤 규칙에도, \s에도 걸리지 않음)
+_SEPARATOR = '\x00'
+
+
+def add_basic_spacing_many(texts):
+    """
+    여러 텍스트에 add_basic_spacing 적용 (입력 순서대로 반환)
+    띄어쓰기가 필요한 텍스트를 구분 문자로 이어붙여 패스마다 정규식을 한 번만 돌린다.
+    """
+    results = list(texts)
+    targets = []
+    for i, text in enumerate(results):
+        if not text or len(text.strip()) == 0 or text.count(' ') / len(text) > _SPACE_RATIO:
+            continue
+        if _SEPARATOR in text:
+            results[i] = add_basic_spacing(text)  # 구분 문자가 들어 있는 텍스트는 따로 처리
+        else:
+            targets.append(i)
+    if not targets:
+        return results
+
+    joined = _SEPARATOR.join(results[i] for i in targets)
+    for rule in _RULES:
+        joined = rule.apply(joined)
+    joined = _WHITESPACE.sub(' ', joined)
+    for i, text in zip(targets, joined.split(_SEPARATOR)):
+        results[i] = text.strip()
+    return results
+
+
+class ModelSpacing:
+    """
+    PyKoSpacing 모델 띄어쓰기 (모델은 처음 사용할 때 한 번만 로드)
+    텍스트를 모델 입력 길이(max_len) 창으로 나누고, 여러 텍스트의 창을 모아 batch_size개씩 예측한다.
+    같은 창이 여러 번 나오면 한 번만 예측한다.
+
+    Args:
+        batch_size: 한 번에 예측할 창 수
+    """
+
+    MAX_LEN = 198  # PyKoSpacing 입력 길이 (앞뒤 경계 문자 포함 200)
+
+    def __init__(self, batch_size=64):
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self._spacer = None
+
+    @property
+    def spacer(self):
+        with self.lock:
+            if self._spacer is None:
+                from pykospacing import Spacing
+                self._spacer = Spacing()
+            return self._spacer
+
+    @property
+    def max_len(self):
+        return getattr(self.spacer, 'max_len', self.MAX_LEN)
+
+    def _windows(self, text):
+        max_len = self.max_len
+        return [text[start:start + max_len] for start in range(0, len(text), max_len)]
+
+    def _predict(self, windows):
+        """창 목록 -> 띄어쓰기된 창 목록"""
+        spacer = self.spacer
+        try:
+            from pykospacing.embedding_maker import encoding_and_padding
+            model, w2idx = spacer._model, spacer._w2idx
+        except (ImportError, AttributeError):
+            # 내부 구조가 다른 버전이면 창마다 공개 API 호출
+            return [spacer(window) for window in windows]
+
+        # Spacing.get_spaced_sent와 같은 전처리를 창 여러 개에 한 번에 적용
+        sents = ["«" + window.replace(' ', '^') + "»" for window in windows]
+        results = []
+        for start in range(0, len(sents), self.batch_size):
+            batch = sents[start:start + self.batch_size]
+            mat_in = encoding_and_padding(word2idx_dic=w2idx, sequences=batch, maxlen=self.max_len + 2,
+                                          padding='post', truncating='post')
+            probs = model.predict(mat_in, batch_size=len(batch), verbose=0)
+            for sent, row in zip(batch, probs):
+                preds = ['1' if p > 0.5 else '0' for p in row[:len(sent)]]
+                results.append(spacer.make_pred_sents(sent, preds))
+        return results
+
+    def __call__(self, texts):
+        """
+        여러 텍스트에 띄어쓰기 추가 (입력 순서대로 반환, 실패 시 원본 반환)
+        """
+        texts = list(texts)
+        targets = [i for i, text in enumerate(texts) if text and text.strip()]
+        if not targets:
+            return texts
+
+        try:
+            windows = [self._windows(texts[i]) for i in targets]
+            unique = list(dict.fromkeys(window for text_windows in windows for window in text_windows))
+            spaced = dict(zip(unique, self._predict(unique)))
+        except Exception as e:
+            print(f"띄어쓰기 추가 실패: {e}")
+            return texts  # 실패 시 원본 반환
+
+        results = list(texts)
+        for i, text_windows in zip(targets, windows):
+            results[i] = ''.join(spaced[window] for window in text_windows).strip()
+        return results
+
+
+_model_spacing = ModelSpacing()
+
+
+def add_spacing_to_texts(texts):
+    """여러 텍스트에 모델 기반 띄어쓰기 추가 (한 번에 예측)"""
+    return _model_spacing(texts)
+
 
 def add_spacing_to_text(text):
     """
     띄어쓰기가 없는 한국어 텍스트에 자동으로 띄어쓰기 추가
-    
+
     Args:
         text: 띄어쓰기가 없는 텍스트
-        
+
     Returns:
         띄어쓰기가 추가된 텍스트
     """
-    if not text or len(text.strip()) == 0:
-        return text
-    
-    try:
-        spacing = Spacing()
-        # 긴 텍스트는 청크로 나눠서 처리 (메모리 효율)
-        max_length = 500
-        if len(text) > max_length:
-            chunks = [text[i:i+max_length] for i in range(0, len(text), max_length)]
-            spaced_chunks = [spacing(chunk) for chunk in chunks]
-            return ' '.join(spaced_chunks)
-        else:
-            return spacing(text)
-    except Exception as e:
-        print(f"띄어쓰기 추가 실패: {e}")
-        return text  # 실패 시 원본 반환
+    return add_spacing_to_texts([text])[0]
 
 
 # 테스트 예시
 if __name__ == "__main__":
     # 띄어쓰기 없는 텍스트
     test_text = "시민들의오락을위해건설한곳이다.관중석계단의돌들은로마시민들이주워다집짓는데사용하고자부심을가졌다고하는데,지금은형체조차없다."
-    
+
     print("원본 텍스트:")
     print(test_text)
     print("\n띄어쓰기 추가 후:")
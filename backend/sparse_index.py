@@ -0,0 +1,313 @@
+# 희소(BM25) 검색 인덱스
+# 띄어쓰기가 깨진 한국어 PDF 텍스트에서는 임베딩 검색이 약하므로 (compare_spacing.py 참고)
+# 공백/문장부호를 지운 문자 bigram과 영숫자 토큰(모델명, 부품 번호, 오류 코드)으로
+# 역색인을 만들고 BM25로 점수를 매긴다. 밀집(FAISS) 결과와는 RRF로 합친다.
+#
+# 용어는 모두 uint64 정수:
+#   문자 bigram  = (앞 글자 코드포인트 << 21) | 뒤 글자 코드포인트   (< 2^42, 해시 충돌 없음)
+#   영숫자 토큰  = blake2b 64비트 해시 | 2^63                        (bigram과 겹치지 않음)
+# 역색인은 배열 몇 개로만 구성 (Python dict/list 없음):
+#   terms    정렬된 용어 (uint64, V)
+#   offsets  용어별 posting 시작 위치 (int64, V+1)
+#   rows     posting의 행 번호 (int32, 용어 안에서 오름차순)
+#   tfs      행 안에서의 용어 빈도 (uint16)
+#   row_ids  행 번호 -> 청크 고정 ID (int64)
+#   doc_len  행별 용어 수 (float32, BM25 길이 정규화)
+
+import hashlib
+import os
+import re
+import unicodedata
+import numpy as np
+
+SPARSE_FILES = ('terms', 'offsets', 'rows', 'tfs', 'row_ids', 'doc_len')
+
+_SEPARATORS = re.compile(r'[\W_]+')
+_ALNUM_TOKEN = re.compile(r'[0-9a-z]+(?:[-./][0-9a-z]+)*')
+_TOKEN_FLAG = np.uint64(1 << 63)
+
+
+def text_terms(text):
+    """텍스트 -> 용어 배열 (uint64, 중복 포함)"""
+    text = unicodedata.normalize('NFC', text).lower()
+
+    # 띄어쓰기에 영향받지 않도록 공백/문장부호를 모두 지운 뒤 bigram
+    compact = _SEPARATORS.sub('', text)
+    codes = np.frombuffer(compact.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    if len(codes) >= 2:
+        grams = (codes[:-1] << np.uint64(21)) | codes[1:]
+    else:
+        grams = codes
+
+    # 부품 번호/오류 코드는 토큰 전체로도 색인 (정확히 일치하는 질의에 가중)
+    tokens = _ALNUM_TOKEN.findall(text)
+    if not tokens:
+        return grams
+    hashed = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+         for token in tokens),
+        dtype=np.uint64, count=len(tokens)
+    ) | _TOKEN_FLAG
+    return np.concatenate([grams, hashed])
+
+
+class SparseIndex:
+    """
+    배열 기반 BM25 역색인 (읽기 전용; 코퍼스가 바뀌면 SegmentedSparseIndex로 세그먼트를 덧붙인다)
+
+    Args:
+        k1, b: BM25 파라미터
+    """
+
+    def __init__(self, terms, offsets, rows, tfs, row_ids, doc_len, k1=1.2, b=0.75):
+        self.terms = terms
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+        self.row_ids = row_ids
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        avg_len = float(doc_len.mean()) if len(doc_len) else 0.0
+        # BM25 분모의 길이 정규화 항 (질의마다 다시 계산하지 않도록 미리 계산)
+        self.length_norm = k1 * (1 - b + b * np.asarray(doc_len) / (avg_len or 1.0))
+
+    @classmethod
+    def build(cls, ids, texts):
+        """
+        청크 ID와 본문으로 역색인 생성
+
+        Args:
+            ids: 청크 고정 ID 목록 (texts와 같은 순서)
+        """
+        uniques, counts = [], []
+        for text in texts:
+            terms, tf = np.unique(text_terms(text), return_counts=True)
+            uniques.append(terms)
+            counts.append(tf)
+
+        row_ids = np.asarray(ids, dtype='int64')
+        if not uniques:
+            return cls(np.zeros(0, dtype=np.uint64), np.zeros(1, dtype='int64'),
+                       np.zeros(0, dtype='int32'), np.zeros(0, dtype='uint16'),
+                       row_ids, np.zeros(0, dtype='float32'))
+
+        all_terms = np.concatenate(uniques)
+        all_tfs = np.concatenate(counts)
+        lengths = np.array([len(u) for u in uniques], dtype='int64')
+        all_rows = np.repeat(np.arange(len(uniques), dtype='int32'), lengths)
+        doc_len = np.bincount(all_rows, weights=all_tfs, minlength=len(uniques)).astype('float32')
+
+        # 용어 순으로 정렬 (stable이라 같은 용어 안에서는 행 번호 오름차순 유지)
+        order = np.argsort(all_terms, kind='stable')
+        sorted_terms = all_terms[order]
+        terms, starts = np.unique(sorted_terms, return_index=True)
+        offsets = np.append(starts, len(sorted_terms)).astype('int64')
+        return cls(
+            terms,
+            offsets,
+            all_rows[order],
+            np.minimum(all_tfs[order], np.iinfo('uint16').max).astype('uint16'),
+            row_ids,
+            doc_len
+        )
+
+    def search(self, text, k):
+        """
+        BM25 상위 k개
+
+        Returns:
+            (점수 배열, 청크 ID 배열) - 점수 내림차순, 일치하는 용어가 없는 청크는 제외
+        """
+        query = np.unique(text_terms(text))
+        if len(query) == 0 or len(self.terms) == 0:
+            return np.zeros(0, dtype='float32'), np.zeros(0, dtype='int64')
+        pos = np.searchsorted(self.terms, query)
+        found = pos < len(self.terms)
+        found[found] = self.terms[pos[found]] == query[found]
+        pos = pos[found]
+        if len(pos) == 0:
+            return np.zeros(0, dtype='float32'), np.zeros(0, dtype='int64')
+
+        n_rows = len(self.row_ids)
+        scores = np.zeros(n_rows, dtype='float32')
+        for p in pos:
+            start, end = int(self.offsets[p]), int(self.offsets[p + 1])
+            df = end - start
+            idf = np.log(1 + (n_rows - df + 0.5) / (df + 0.5))
+            rows = self.rows[start:end]
+            tf = self.tfs[start:end].astype('float32')
+            # 한 용어의 posting 안에서 행은 중복되지 않으므로 fancy index += 사용 가능
+            scores[rows] += idf * tf * (self.k1 + 1) / (tf + self.length_norm[rows])
+
+        k = min(k, n_rows)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        top = top[scores[top] > 0]
+        return scores[top], self.row_ids[top]
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in SPARSE_FILES)
+
+    def stats(self):
+        return {
+            'terms': len(self.terms),
+            'postings': len(self.rows),
+            'chunks': len(self.row_ids),
+            'size_bytes': int(self.nbytes)
+        }
+
+    def save(self, path):
+        for name in SPARSE_FILES:
+            np.save(os.path.join(path, f'sparse_{name}.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """세대 디렉터리에서 읽기 (파일이 없으면 None)"""
+        files = [os.path.join(path, f'sparse_{name}.npy') for name in SPARSE_FILES]
+        if not all(os.path.exists(f) for f in files):
+            return None
+        return cls(*(np.load(f, mmap_mode=mmap_mode) for f in files))
+
+
+class SegmentedSparseIndex:
+    """
+    SparseIndex 여러 개(디스크 세대 + 이후 추가된 문서별 세그먼트)를 하나의 BM25 역색인처럼 검색
+    청크가 바뀔 때마다 전체를 다시 만들지 않도록, 추가된 문서는 세그먼트로 붙이고
+    삭제된 청크는 tombstone(청크 ID)으로 건너뛴다. 문서 수/df/평균 길이는 살아 있는 행 전체로 계산하므로
+    SparseIndex.build로 다시 만든 것과 같은 점수가 나온다.
+    merged()는 텍스트를 다시 토큰화하지 않고 배열만 합쳐 SparseIndex 하나로 만든다 (저장 시 사용).
+
+    Args:
+        segments: SparseIndex 목록
+        removed: 삭제된 청크 ID 목록
+    """
+
+    def __init__(self, segments, removed=(), k1=1.2, b=0.75):
+        self.segments = list(segments)
+        self.k1 = k1
+        self.b = b
+        removed = np.fromiter(removed, dtype='int64')
+        self.alive = [
+            ~np.isin(segment.row_ids, removed) if len(removed) else np.ones(len(segment.row_ids), dtype=bool)
+            for segment in self.segments
+        ]
+        self.n_rows = int(sum(alive.sum() for alive in self.alive))
+        total_len = sum(float(np.asarray(segment.doc_len)[alive].sum())
+                        for segment, alive in zip(self.segments, self.alive))
+        self.avg_len = total_len / self.n_rows if self.n_rows else 0.0
+
+    def search(self, text, k):
+        """BM25 상위 k개 (SparseIndex.search와 같은 형식)"""
+        query = np.unique(text_terms(text))
+        if len(query) == 0 or self.n_rows == 0:
+            return np.zeros(0, dtype='float32'), np.zeros(0, dtype='int64')
+
+        # 세그먼트마다 질의 용어의 posting을 찾아 살아 있는 행만 남기고 df를 합산
+        df = np.zeros(len(query), dtype='int64')
+        postings = []
+        for seg, (segment, alive) in enumerate(zip(self.segments, self.alive)):
+            if len(segment.terms) == 0:
+                continue
+            pos = np.searchsorted(segment.terms, query)
+            found = pos < len(segment.terms)
+            found[found] = segment.terms[pos[found]] == query[found]
+            for q in np.flatnonzero(found):
+                start, end = int(segment.offsets[pos[q]]), int(segment.offsets[pos[q] + 1])
+                rows = segment.rows[start:end]
+                keep = alive[rows]
+                df[q] += int(keep.sum())
+                postings.append((seg, q, rows[keep], segment.tfs[start:end][keep]))
+        if not postings:
+            return np.zeros(0, dtype='float32'), np.zeros(0, dtype='int64')
+
+        idf = np.log(1 + (self.n_rows - df + 0.5) / (df + 0.5))
+        scores = [np.zeros(len(segment.row_ids), dtype='float32') for segment in self.segments]
+        for seg, q, rows, tf in postings:
+            tf = tf.astype('float32')
+            doc_len = np.asarray(self.segments[seg].doc_len)[rows]
+            length_norm = self.k1 * (1 - self.b + self.b * doc_len / (self.avg_len or 1.0))
+            scores[seg][rows] += idf[q] * tf * (self.k1 + 1) / (tf + length_norm)
+
+        scores = np.concatenate(scores)
+        row_ids = np.concatenate([segment.row_ids for segment in self.segments])
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        top = top[scores[top] > 0]
+        return scores[top], row_ids[top]
+
+    def merged(self):
+        """살아 있는 행만 모아 SparseIndex 하나로 합침 (용어 순, 용어 안에서는 행 번호 순)"""
+        terms, rows, tfs, row_ids, doc_len = [], [], [], [], []
+        base = 0
+        for segment, alive in zip(self.segments, self.alive):
+            new_row = (np.cumsum(alive) - 1 + base).astype('int32')
+            seg_rows = np.asarray(segment.rows)
+            keep = alive[seg_rows]
+            terms.append(np.repeat(np.asarray(segment.terms), np.diff(segment.offsets))[keep])
+            rows.append(new_row[seg_rows[keep]])
+            tfs.append(np.asarray(segment.tfs)[keep])
+            row_ids.append(np.asarray(segment.row_ids)[alive])
+            doc_len.append(np.asarray(segment.doc_len)[alive])
+            base += int(alive.sum())
+        if not terms:
+            return SparseIndex.build([], [])
+
+        all_terms = np.concatenate(terms)
+        all_rows = np.concatenate(rows)
+        order = np.lexsort((all_rows, all_terms))
+        sorted_terms = all_terms[order]
+        unique_terms, starts = np.unique(sorted_terms, return_index=True)
+        return SparseIndex(
+            unique_terms,
+            np.append(starts, len(sorted_terms)).astype('int64'),
+            all_rows[order],
+            np.concatenate(tfs)[order],
+            np.concatenate(row_ids),
+            np.concatenate(doc_len),
+            self.k1,
+            self.b
+        )
+
+    @property
+    def nbytes(self):
+        return sum(segment.nbytes for segment in self.segments)
+
+    def stats(self):
+        return {
+            'terms': int(sum(len(segment.terms) for segment in self.segments)),  # 세그먼트별 합 (중복 포함)
+            'postings': int(sum(len(segment.rows) for segment in self.segments)),
+            'chunks': self.n_rows,
+            'segments': len(self.segments),
+            'tombstones': int(sum(len(alive) - alive.sum() for alive in self.alive)),
+            'size_bytes': int(self.nbytes)
+        }
+
+    def save(self, path):
+        self.merged().save(path)
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=60):
+    """
+    여러 검색 결과 순위를 RRF로 합침: score(id) = sum 1 / (rrf_k + rank)
+
+    Args:
+        rankings: 청크 ID 목록들 (각각 좋은 순서, -1은 무시)
+
+    Returns:
+        (점수 배열, 청크 ID 배열) - 점수 내림차순 상위 k개
+    """
+    fused = {}
+    for ranking in rankings:
+        rank = 0
+        for chunk_id in ranking:
+            chunk_id = int(chunk_id)
+            if chunk_id < 0:
+                continue
+            rank += 1
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+    ordered = sorted(fused.items(), key=lambda item: -item[1])[:k]
+    return (np.array([score for _, score in ordered], dtype='float32'),
+            np.array([chunk_id for chunk_id, _ in ordered], dtype='int64'))
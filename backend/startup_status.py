@@ -0,0 +1,91 @@
+# 모델 초기화 상태 추적
+# 서버는 바로 요청을 받기 시작하고, 모델은 백그라운드 스레드에서 단계별로 로드한다.
+# 구성 요소마다 상태와 소요 시간을 기록해 /health, /ready에서 보여주고,
+# 요청 처리 쪽은 필요한 구성 요소가 준비되었는지 확인하거나 준비될 때까지 기다린다.
+#
+# 상태: pending(대기) -> loading(로드 중) -> ready(준비) / failed(실패)
+#       disabled(설정상 사용하지 않음, 예: 재정렬 모델 미설정, GGUF 파일 없음)
+
+import threading
+import time
+
+
+class StartupStatus:
+    """
+    초기화 단계별 상태와 소요 시간
+
+    Args:
+        components: 구성 요소 이름 목록 (로드 순서)
+    """
+
+    def __init__(self, components):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.finished = None
+        self.components = {
+            name: {'state': 'pending', 'seconds': None, 'error': None}
+            for name in components
+        }
+        self.events = {name: threading.Event() for name in components}
+
+    def run(self, name, load):
+        """
+        load()를 실행하고 상태/소요 시간 기록 (예외는 failed로 기록하고 삼킨다)
+
+        Returns:
+            성공 여부
+        """
+        with self.lock:
+            if self.components[name]['state'] == 'disabled':
+                return False
+            self.components[name]['state'] = 'loading'
+        start = time.perf_counter()
+        try:
+            load()
+        except Exception as e:
+            print(f"⚠️ {name} 초기화 실패: {e}")
+            self._finish(name, 'failed', time.perf_counter() - start, str(e))
+            return False
+        self._finish(name, 'ready', time.perf_counter() - start)
+        return True
+
+    def disable(self, name, reason):
+        self._finish(name, 'disabled', None, reason)
+
+    def _finish(self, name, state, seconds, error=None):
+        with self.lock:
+            self.components[name].update(
+                state=state,
+                seconds=round(seconds, 3) if seconds is not None else None,
+                error=error
+            )
+        self.events[name].set()
+
+    def done(self):
+        """모든 단계가 끝났음을 기록 (끝나지 않은 단계는 failed로)"""
+        for name, event in self.events.items():
+            if not event.is_set():
+                self._finish(name, 'failed', None, "초기화가 중단되었습니다.")
+        with self.lock:
+            self.finished = time.time()
+
+    def state(self, name):
+        with self.lock:
+            return self.components[name]['state']
+
+    def is_ready(self, *names):
+        return all(self.state(name) == 'ready' for name in names)
+
+    def wait(self, name, timeout=None):
+        """구성 요소가 준비되거나 실패/비활성화될 때까지 대기 (준비되었으면 True)"""
+        self.events[name].wait(timeout)
+        return self.state(name) == 'ready'
+
+    def snapshot(self):
+        with self.lock:
+            end = self.finished or time.time()
+            return {
+                'initializing': self.finished is None,
+                'elapsed_seconds': round(end - self.started, 3),
+                'components': {name: dict(info) for name, info in self.components.items()}
+            }
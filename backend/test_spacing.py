@@ -1,6 +1,6 @@
 import sys
 sys.path.append('.')
-from rag_pipeline import add_basic_spacing
+from spacing_util import add_basic_spacing
 
 # 테스트 텍스트 (띄어쓰기 없음)
 test_texts = [